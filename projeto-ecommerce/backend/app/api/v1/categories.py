@@ -1,64 +1,130 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+from datetime import datetime
 from bson import ObjectId
 from app.models.category import Category, CategoryCreate, CategoryUpdate
 from app.core.database import get_collection
+from app.core.singleflight import SingleFlight, make_key
+from app.core.projection import (
+    parse_fields,
+    mongo_projection,
+    partial_response,
+    parse_object_ids,
+    ids_query,
+    in_requested_order
+)
+from app.services.category_cleanup import (
+    create_deletion_job,
+    get_deletion_job,
+    schedule_category_cleanup
+)
 
 router = APIRouter()
+category_reads = SingleFlight("list_categories")
 
 @router.post("/", response_model=Category)
 async def create_category(category: CategoryCreate):
     collection = await get_collection("categories")
     category_dict = category.model_dump()
     new_category = await collection.insert_one(category_dict)
+    # Listagens iniciadas antes da escrita não são mais compartilhadas
+    category_reads.invalidate()
     created_category = await collection.find_one({"_id": new_category.inserted_id})
     return created_category
 
+FIELDS_DESCRIPTION = "Campos separados por vírgula; o id sempre é incluído"
+
+IDS_DESCRIPTION = "Ids separados por vírgula: retorna só essas categorias, na ordem pedida"
+
 @router.get("/", response_model=List[Category])
-async def list_categories():
-    collection = await get_collection("categories")
-    categories = await collection.find().to_list(1000)
+async def list_categories(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION)
+):
+    selected = parse_fields(fields, Category)
+    object_ids = parse_object_ids(ids)
+    collection = await get_collection("categories", budget="read")
+    query = {**ids_query(object_ids), "deleted": {"$ne": True}}
+    categories = await category_reads.do(
+        make_key("list_categories", fields=selected, ids=object_ids),
+        lambda: collection.find(query, mongo_projection(selected)).to_list(1000)
+    )
+    # O resultado é compartilhado pelo single-flight: a reordenação gera uma lista nova
+    categories = in_requested_order(categories, object_ids)
+    if selected is not None:
+        return partial_response(Category, selected, categories)
     return categories
 
 @router.get("/{category_id}", response_model=Category)
-async def get_category(category_id: str):
-    collection = await get_collection("categories")
-    if (category := await collection.find_one({"_id": ObjectId(category_id)})) is not None:
-        return category
-    raise HTTPException(status_code=404, detail="Category not found")
+async def get_category(category_id: str, fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)):
+    selected = parse_fields(fields, Category)
+    collection = await get_collection("categories", budget="read")
+    category = await collection.find_one(
+        {"_id": ObjectId(category_id), "deleted": {"$ne": True}},
+        mongo_projection(selected)
+    )
+    if category is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    if selected is not None:
+        return partial_response(Category, selected, category)
+    return category
 
 @router.put("/{category_id}", response_model=Category)
 async def update_category(category_id: str, category: CategoryUpdate):
     collection = await get_collection("categories")
     update_result = await collection.update_one(
-        {"_id": ObjectId(category_id)},
+        {"_id": ObjectId(category_id), "deleted": {"$ne": True}},
         {"$set": category.model_dump()}
     )
 
     if update_result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    category_reads.invalidate()
 
     return await collection.find_one({"_id": ObjectId(category_id)})
 
-@router.delete("/{category_id}", response_model=dict)
+@router.delete("/{category_id}", response_model=dict, status_code=202)
 async def delete_category(category_id: str):
     categories_collection = await get_collection("categories")
-    products_collection = await get_collection("products")
+    category_oid = ObjectId(category_id)
 
-    category = await categories_collection.find_one({"_id": ObjectId(category_id)})
+    category = await categories_collection.find_one({"_id": category_oid})
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    await products_collection.update_many(
-        {"category_ids": ObjectId(category_id)},
-        {"$pull": {"category_ids": ObjectId(category_id)}}
-    )
+    job = await get_deletion_job(category_oid)
+    if not category.get("deleted") or job is None or job["status"] == "failed":
+        # A categoria some das listagens imediatamente; a limpeza dos
+        # produtos acontece em lotes no job em segundo plano
+        await categories_collection.update_one(
+            {"_id": category_oid},
+            {"$set": {"deleted": True, "deleted_at": datetime.utcnow()}}
+        )
+        category_reads.invalidate()
+        job = await create_deletion_job(category_oid)
 
-    delete_result = await categories_collection.delete_one({"_id": ObjectId(category_id)})
+    schedule_category_cleanup(category_oid)
 
-    if delete_result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Category not found")
+    return {
+        "message": "Category marked as deleted, removal from products in progress",
+        "status_url": f"/api/v1/categories/{category_id}/deletion",
+        "status": job["status"],
+        "total": job["total"],
+        "processed": job["processed"]
+    }
+
+@router.get("/{category_id}/deletion", response_model=dict)
+async def get_category_deletion_status(category_id: str):
+    job = await get_deletion_job(ObjectId(category_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
 
     return {
-        "message": "Category deleted successfully and removed from all products"
+        "category_id": category_id,
+        "status": job["status"],
+        "total": job["total"],
+        "processed": job["processed"],
+        "started_at": job["started_at"],
+        "finished_at": job.get("finished_at"),
+        "error": job.get("error")
     }
\ No newline at end of file
@@ -1,23 +1,42 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import PyMongoError
+import asyncio
+import json
 from app.core.database import get_collection
+from app.core.config import settings
+from app.core.singleflight import SingleFlight, make_key
+from app.services.live_metrics import get_live_hub
+from app.core import metrics as app_metrics
+from app.services import approx_sales, order_archive, orders_timeseries, sales_counters
 
 router = APIRouter()
+sales_reads = SingleFlight("get_sales_metrics")
 
-@router.get("/sales")
-async def get_sales_metrics(
+EMPTY_METRICS = {
+    "total_orders": 0,
+    "total_revenue": 0,
+    "avg_order_value": 0,
+    "min_order_value": 0,
+    "max_order_value": 0
+}
+
+async def build_match_stage(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    category_ids: Optional[List[str]] = Query(None),
-    product_ids: Optional[List[str]] = Query(None)
-):
-    orders_collection = await get_collection("orders")
-    products_collection = await get_collection("products")
-
+    category_ids: Optional[List[str]] = None,
+    product_ids: Optional[List[str]] = None
+) -> Optional[dict]:
+    """
+    Monta o $match de pedidos a partir dos filtros do dashboard.
+    Com product_ids o filtro é pelos produtos (que também precisam estar nas
+    categorias, se informadas); só com category_ids, pelo campo category_ids
+    dos pedidos. Retorna None quando nenhum produto atende aos filtros.
+    """
     match_stage = {}
-    product_object_ids = None
 
     if start_date or end_date:
         date_filter = {}
@@ -27,63 +46,33 @@ async def get_sales_metrics(
             date_filter["$lte"] = end_date
         match_stage["date"] = date_filter
 
-    if product_ids or category_ids:
-        product_query = {}
-
-        if product_ids:
-            product_query["_id"] = {"$in": [ObjectId(pid) for pid in product_ids]}
+    if product_ids:
+        # A lista vem da requisição, então a consulta aos produtos é limitada
+        products_collection = await get_collection("products", "analytics", budget="dashboard")
+        product_query = {"_id": {"$in": [ObjectId(pid) for pid in product_ids]}}
 
         if category_ids:
             product_query["category_ids"] = {
                 "$in": [ObjectId(cid) for cid in category_ids]
             }
 
-        products = await products_collection.find(product_query).to_list(None)
+        products = await products_collection.find(product_query, {"_id": 1}).to_list(None)
         filtered_product_ids = [p["_id"] for p in products]
 
-        if filtered_product_ids:
-            match_stage["product_ids"] = {"$in": filtered_product_ids}
-        else:
-            return {
-                "metrics": {
-                    "total_orders": 0,
-                    "total_revenue": 0,
-                    "avg_order_value": 0,
-                    "min_order_value": 0,
-                    "max_order_value": 0
-                },
-                "time_series": [],
-                "top_products": []
-            }
+        if not filtered_product_ids:
+            return None
 
-    top_products_pipeline = [
-        {"$match": match_stage},
-        {"$unwind": "$product_ids"},
-    ]
+        match_stage["product_ids"] = {"$in": filtered_product_ids}
+    elif category_ids:
+        # Categorias desnormalizadas nos pedidos: o filtro roda no banco,
+        # sem carregar os produtos da categoria
+        match_stage["category_ids"] = {"$in": [ObjectId(cid) for cid in category_ids]}
 
-    if "product_ids" in match_stage:
-        top_products_pipeline.append({
-            "$match": {
-                "product_ids": match_stage["product_ids"]
-            }
-        })
-
-    pipeline = [
-        {"$match": match_stage},
-        {
-            "$group": {
-                "_id": None,
-                "total_orders": {"$sum": 1},
-                "total_revenue": {"$sum": "$total"},
-                "avg_order_value": {"$avg": "$total"},
-                "min_order_value": {"$min": "$total"},
-                "max_order_value": {"$max": "$total"}
-            }
-        }
-    ]
+    return match_stage
 
-    time_series_pipeline = [
-        {"$match": match_stage},
+def time_series_stages() -> List[dict]:
+    """Agrupa pedidos por dia; usado pelo dashboard e pela exportação"""
+    return [
         {
             "$group": {
                 "_id": {
@@ -112,56 +101,282 @@ async def get_sales_metrics(
         {"$sort": {"date": 1}}
     ]
 
-    top_products_pipeline.extend([
-        {
-            "$group": {
-                "_id": "$product_ids",
-                "order_count": {"$sum": 1},
-                "total_revenue": {"$sum": "$total"}
-            }
-        },
-        {"$sort": {"order_count": -1}},
-        {"$limit": 5},
+@router.get("/sales")
+async def get_sales_metrics(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category_ids: Optional[List[str]] = Query(None),
+    product_ids: Optional[List[str]] = Query(None),
+    approx: bool = False
+):
+    """
+    Com approx=true as métricas e a série são estimadas por amostragem, com
+    intervalos de confiança; intervalos pequenos continuam exatos.
+    """
+    compute = compute_approx_sales_metrics if approx else compute_sales_metrics
+
+    # Dashboards abertos ao mesmo tempo compartilham a mesma agregação
+    return await sales_reads.do(
+        make_key(
+            "get_sales_metrics",
+            start_date=start_date,
+            end_date=end_date,
+            category_ids=category_ids,
+            product_ids=product_ids,
+            approx=approx
+        ),
+        lambda: compute(start_date, end_date, category_ids, product_ids)
+    )
+
+async def compute_sales_metrics(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    category_ids: Optional[List[str]],
+    product_ids: Optional[List[str]]
+) -> dict:
+    match_stage = await build_match_stage(start_date, end_date, category_ids, product_ids)
+    if match_stage is None:
+        return {
+            "metrics": dict(EMPTY_METRICS),
+            "time_series": [],
+            "top_products": []
+        }
+
+    return await exact_sales_metrics(match_stage, start_date, end_date)
+
+async def compute_approx_sales_metrics(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    category_ids: Optional[List[str]],
+    product_ids: Optional[List[str]]
+) -> dict:
+    match_stage = await build_match_stage(start_date, end_date, category_ids, product_ids)
+    if match_stage is None:
+        return {
+            "metrics": dict(EMPTY_METRICS),
+            "time_series": [],
+            "top_products": [],
+            "approximate": False
+        }
+
+    orders_collection = await get_collection(settings.DASHBOARD_ORDERS_COLLECTION, "analytics", budget="dashboard")
+    source_match = orders_timeseries.adapt_match(match_stage, settings.DASHBOARD_ORDERS_COLLECTION)
+
+    try:
+        if await approx_sales.is_small_range(orders_collection, source_match):
+            app_metrics.inc("dashboard_approx_requests_total", mode="exact")
+            result = await exact_sales_metrics(match_stage, start_date, end_date)
+            return {**result, "approximate": False}
+
+        app_metrics.inc("dashboard_approx_requests_total", mode="sampled")
+        hits, sample_size, population = await approx_sales.sample_orders(orders_collection, source_match)
+        z = approx_sales.z_score(settings.DASHBOARD_APPROX_CONFIDENCE)
+
+        metrics, intervals = approx_sales.estimate_metrics(hits, sample_size, population, z)
+        time_series = approx_sales.estimate_time_series(hits, sample_size, population, z)
+        filtered_product_ids = match_stage["product_ids"]["$in"] if "product_ids" in match_stage else None
+        category_filter = match_stage.get("category_ids")
+
+        # Dias arquivados respondem exatamente pelos resumos: só o Mongo é amostrado
+        archived = await archived_sales(start_date, end_date, match_stage)
+        if archived:
+            metrics, intervals, time_series = approx_sales.add_exact_part(
+                metrics, intervals, time_series, archived
+            )
+
+        if settings.TOP_PRODUCTS_FROM_COUNTERS and sales_counters.covers_whole_days(start_date, end_date):
+            # Os contadores já respondem o top-N exato sem varrer pedidos
+            top_products = await sales_counters.top_products(
+                start_date, end_date, filtered_product_ids, category_filter
+            )
+        else:
+            # Com filtro por categoria o ranking considera todos os produtos da
+            # amostra e descarta os de outras categorias ao buscar os nomes
+            totals = approx_sales.estimate_top_products(
+                hits, sample_size, population, filtered_product_ids, limit=None
+            )
+            if archived:
+                totals = order_archive.merge_product_totals(
+                    totals, await sales_counters.product_totals(archived["days"], filtered_product_ids)
+                )
+            top_products = await rank_product_totals(totals, category_filter)
+    except (HTTPException, PyMongoError):
+        # Timeouts e indisponibilidade viram 504/503 nos handlers de resilience
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "metrics": metrics,
+        "time_series": time_series,
+        "top_products": top_products,
+        "approximate": True,
+        "confidence": settings.DASHBOARD_APPROX_CONFIDENCE,
+        "sample_size": sample_size,
+        "sample_matches": len(hits),
+        "intervals": intervals
+    }
+
+async def load_product_names(product_ids: list, category_filter: Optional[dict] = None) -> dict:
+    products_collection = await get_collection("products", "analytics", budget="dashboard")
+    query = {"_id": {"$in": product_ids}}
+    if category_filter:
+        query["category_ids"] = category_filter
+    products = await products_collection.find(query, {"name": 1}).to_list(None)
+    return {p["_id"]: p["name"] for p in products}
+
+async def archived_sales(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    match_stage: dict
+) -> Optional[dict]:
+    """Parte do intervalo que já foi arquivada (None se o arquivamento está desligado)"""
+    if not settings.ORDERS_ARCHIVE_ENABLED:
+        return None
+
+    product_ids = match_stage["product_ids"]["$in"] if "product_ids" in match_stage else None
+    category_ids = match_stage["category_ids"]["$in"] if "category_ids" in match_stage else None
+    return await order_archive.archived_sales(
+        start_date,
+        end_date,
+        [str(pid) for pid in product_ids] if product_ids else None,
+        [str(cid) for cid in category_ids] if category_ids else None
+    )
+
+async def rank_product_totals(totals: List[dict], category_filter: Optional[dict] = None, limit: int = 5) -> List[dict]:
+    """Top-N a partir de totais por produto já ordenados, com os nomes dos produtos"""
+    candidates = totals if category_filter else totals[:limit]
+    names = await load_product_names([p["_id"] for p in candidates], category_filter)
+    return [
         {
-            "$lookup": {
-                "from": "products",
-                "localField": "_id",
-                "foreignField": "_id",
-                "as": "product_info"
+            "product_id": str(p["_id"]),
+            "name": names[p["_id"]],
+            "order_count": p["order_count"],
+            "total_revenue": p["total_revenue"]
+        }
+        for p in candidates
+        if p["_id"] in names
+    ][:limit]
+
+async def exact_sales_metrics(
+    match_stage: dict,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> dict:
+    # "orders" ou a cópia time-series (mesmos campos, categorias em meta.*)
+    orders_collection = await get_collection(settings.DASHBOARD_ORDERS_COLLECTION, "analytics", budget="dashboard")
+    source_match = orders_timeseries.adapt_match(match_stage, settings.DASHBOARD_ORDERS_COLLECTION)
+
+    top_products_pipeline = [
+        {"$match": source_match},
+        {"$unwind": "$product_ids"},
+    ]
+
+    if "product_ids" in match_stage:
+        top_products_pipeline.append({
+            "$match": {
+                "product_ids": match_stage["product_ids"]
             }
-        },
-        {"$unwind": "$product_info"},
+        })
+
+    pipeline = [
+        {"$match": source_match},
         {
-            "$project": {
-                "_id": 0,
-                "product_id": {"$toString": "$_id"},
-                "name": "$product_info.name",
-                "order_count": 1,
-                "total_revenue": 1
+            "$group": {
+                "_id": None,
+                "total_orders": {"$sum": 1},
+                "total_revenue": {"$sum": "$total"},
+                "avg_order_value": {"$avg": "$total"},
+                "min_order_value": {"$min": "$total"},
+                "max_order_value": {"$max": "$total"}
             }
         }
-    ])
+    ]
+
+    time_series_pipeline = [{"$match": source_match}] + time_series_stages()
+
+    top_products_pipeline.append({
+        "$group": {
+            "_id": "$product_ids",
+            "order_count": {"$sum": 1},
+            "total_revenue": {"$sum": "$total"}
+        }
+    })
+    filtered_product_ids = match_stage["product_ids"]["$in"] if "product_ids" in match_stage else None
 
     try:
         metrics = await orders_collection.aggregate(pipeline).to_list(1)
         time_series = await orders_collection.aggregate(time_series_pipeline).to_list(None)
-        top_products = await orders_collection.aggregate(top_products_pipeline).to_list(None)
-
-        metrics = metrics[0] if metrics else {
-            "total_orders": 0,
-            "total_revenue": 0,
-            "avg_order_value": 0,
-            "min_order_value": 0,
-            "max_order_value": 0
-        }
+        archived = await archived_sales(start_date, end_date, match_stage)
+
+        if settings.TOP_PRODUCTS_FROM_COUNTERS and sales_counters.covers_whole_days(start_date, end_date):
+            # Contadores diários por produto: evita desmontar todos os pedidos
+            top_products = await sales_counters.top_products(
+                start_date,
+                end_date,
+                filtered_product_ids,
+                match_stage.get("category_ids")
+            )
+        elif archived:
+            # Dias arquivados só existem nos contadores: junta os dois agrupamentos
+            live_totals = await orders_collection.aggregate(top_products_pipeline).to_list(None)
+            archived_totals = await sales_counters.product_totals(archived["days"], filtered_product_ids)
+            top_products = await rank_product_totals(
+                order_archive.merge_product_totals(live_totals, archived_totals),
+                match_stage.get("category_ids")
+            )
+        else:
+            top_products = await orders_collection.aggregate(
+                top_products_pipeline + sales_counters.rank_products_stages(match_stage.get("category_ids"))
+            ).to_list(None)
+
+        metrics = metrics[0] if metrics else dict(EMPTY_METRICS)
 
         if "_id" in metrics:
             del metrics["_id"]
 
+        if archived:
+            metrics = order_archive.combine_metrics(metrics, archived["metrics"])
+            time_series = order_archive.combine_time_series(time_series, archived["time_series"])
+
         return {
             "metrics": metrics,
             "time_series": time_series,
             "top_products": top_products
         }
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/sales/stream")
+async def stream_sales_metrics(request: Request):
+    """
+    Server-Sent Events com as métricas globais de vendas.
+    Todos os clientes compartilham um único change stream em "orders":
+    o primeiro evento é um "snapshot" completo e os seguintes são "update"
+    com as métricas e apenas os dias da série que mudaram.
+    """
+    hub = get_live_hub()
+    queue = await hub.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(
+                        queue.get(), timeout=settings.LIVE_DASHBOARD_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Comentário SSE mantém a conexão aberta em proxies
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
@@ -0,0 +1,137 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from datetime import datetime, timedelta, timezone
+from app.core.database import get_collection
+from app.api.v1.dashboard import build_match_stage, time_series_stages
+from app.services.order_archive import archive_watermark
+from app.services.export_stream import (
+    decode_cursor,
+    encode_cursor,
+    gzip_stream,
+    serialize_rows
+)
+
+router = APIRouter()
+
+ORDER_COLUMNS = ["_id", "date", "total", "status", "customer_name", "product_ids", "cursor"]
+TIME_SERIES_COLUMNS = ["date", "revenue", "orders", "cursor"]
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+def export_response(chunks, name: str, export_format: str, gzip: bool) -> StreamingResponse:
+    filename = f"{name}.{export_format}"
+    media_type = MEDIA_TYPES[export_format]
+
+    if gzip:
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def parse_cursor(cursor: str):
+    try:
+        return decode_cursor(cursor)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor token")
+
+async def reject_archived_range(start_date: Optional[datetime]):
+    """
+    Pedidos arquivados (scripts/archive_orders.py) não estão mais no Mongo:
+    um intervalo que alcança esses dias seria exportado incompleto.
+    """
+    watermark = await archive_watermark()
+    if watermark is None:
+        return
+    if start_date and start_date.tzinfo:
+        start_date = start_date.astimezone(timezone.utc).replace(tzinfo=None)
+    if start_date is None or start_date < watermark:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Orders before {watermark:%Y-%m-%d} are archived and cannot be exported; "
+                   f"use start_date >= {watermark:%Y-%m-%d}"
+        )
+
+@router.get("/orders")
+async def export_orders(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category_ids: Optional[List[str]] = Query(None),
+    product_ids: Optional[List[str]] = Query(None),
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    cursor: Optional[str] = None
+):
+    """
+    Exporta pedidos ordenados por (date, _id) direto do cursor do Mongo.
+    Cada linha traz um token "cursor"; se a conexão cair, basta repetir a
+    chamada com o token da última linha recebida para continuar dali.
+    """
+    await reject_archived_range(start_date)
+    match_stage = await build_match_stage(start_date, end_date, category_ids, product_ids)
+    query = match_stage if match_stage is not None else {"_id": {"$exists": False}}
+
+    if cursor:
+        last_date, last_id = parse_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"date": {"$gt": last_date}},
+            {"date": last_date, "_id": {"$gt": last_id}}
+        ]}]}
+
+    collection = await get_collection("orders", "analytics")
+    mongo_cursor = collection.find(query).sort([("date", 1), ("_id", 1)]).batch_size(EXPORT_BATCH_SIZE)
+
+    async def rows():
+        async for order in mongo_cursor:
+            order["cursor"] = encode_cursor(order["date"], order["_id"])
+            yield order
+
+    return export_response(serialize_rows(rows(), ORDER_COLUMNS, format), "orders", format, gzip)
+
+@router.get("/sales/time-series")
+async def export_sales_time_series(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category_ids: Optional[List[str]] = Query(None),
+    product_ids: Optional[List[str]] = Query(None),
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    cursor: Optional[str] = None
+):
+    """Exporta a série diária de vendas com os mesmos filtros de /dashboard/sales"""
+    if cursor:
+        # Retoma a partir do dia seguinte ao último dia exportado
+        last_day, _ = parse_cursor(cursor)
+        resume_from = last_day + timedelta(days=1)
+        if start_date and start_date.tzinfo:
+            start_date = start_date.astimezone(timezone.utc).replace(tzinfo=None)
+        start_date = max(start_date, resume_from) if start_date else resume_from
+
+    await reject_archived_range(start_date)
+    match_stage = await build_match_stage(start_date, end_date, category_ids, product_ids)
+    query = match_stage if match_stage is not None else {"_id": {"$exists": False}}
+
+    collection = await get_collection("orders", "analytics")
+    mongo_cursor = collection.aggregate(
+        [{"$match": query}] + time_series_stages(),
+        allowDiskUse=True,
+        batchSize=EXPORT_BATCH_SIZE
+    )
+
+    async def rows():
+        async for day in mongo_cursor:
+            day["cursor"] = encode_cursor(day["date"])
+            yield day
+
+    return export_response(
+        serialize_rows(rows(), TIME_SERIES_COLUMNS, format), "sales-time-series", format, gzip
+    )
@@ -1,20 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Header
+from typing import List, Optional, Tuple
 from datetime import datetime
 from bson import ObjectId
-from app.models.order import Order, OrderCreate, OrderUpdate
+from pymongo import ReturnDocument
+from app.models.order import Order, OrderCreate, OrderUpdate, OrderWithProducts
 from app.core.database import get_collection
-import boto3
+from app.core.aws import get_lambda_client
+from app.core.resilience import lambda_breaker
+from app.core.config import settings
+from app.core import tracing
+from app.core.projection import parse_fields, mongo_projection, partial_response, parse_expand
+from app.services import idempotency, orders_timeseries, sales_counters
+from app.services.order_categories import order_category_ids
+from app.services.order_ingestion import get_order_buffer
 import json
 router = APIRouter()
 
-async def validate_products(product_ids: List[str]) -> float:
+async def validate_products(product_ids: List[str]) -> Tuple[float, List[ObjectId]]:
     """
     Valida se os produtos existem e calcula o total do pedido
-    Retorna o total calculado
+    Retorna o total calculado e as categorias dos produtos
     """
     total = 0
-    collection = await get_collection("products")
+    products = []
+    # Validação de pedido sempre lê do primário
+    collection = await get_collection("products", "transactional", budget="write")
 
     for prod_id in product_ids:
         product = await collection.find_one({"_id": ObjectId(prod_id)})
@@ -24,88 +34,176 @@ async def validate_products(product_ids: List[str]) -> float:
                 detail=f"Product with id {prod_id} does not exist"
             )
         total += product['price']
+        products.append(product)
 
-    return total
+    return total, order_category_ids(products)
 
 @router.post("/", response_model=Order)
-async def create_order(order: OrderCreate):
+async def create_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Com o cabeçalho Idempotency-Key, repetições da mesma requisição (ex.:
+    retentativas após timeout) recebem o pedido já criado, sem validar ou gravar de novo
+    """
+    if idempotency_key is None:
+        return await insert_order(order)
+
+    async def handler():
+        created_order = await insert_order(order)
+        return Order.model_validate(created_order).model_dump(mode="json", by_alias=True)
+
+    return await idempotency.execute(
+        "create_order",
+        idempotency_key,
+        order.model_dump(mode="json"),
+        handler
+    )
+
+async def insert_order(order: OrderCreate) -> dict:
     collection = await get_collection("orders")
 
-    total = await validate_products(order.product_ids)
+    total, category_ids = await validate_products(order.product_ids)
 
     order_dict = order.model_dump()
     order_dict['product_ids'] = [ObjectId(id) for id in order.product_ids]
     order_dict['total'] = total
+    order_dict['category_ids'] = category_ids
+
+    if settings.ORDER_INGESTION_BUFFER_ENABLED:
+        # O documento gravado é o próprio order_dict: dispensa a releitura
+        await get_order_buffer().submit(order_dict)
+        return order_dict
 
     new_order = await collection.insert_one(order_dict)
+    await sales_counters.apply_safely("create", sales_counters.apply_order(order_dict))
+    await orders_timeseries.mirror_insert(order_dict)
     created_order = await collection.find_one({"_id": new_order.inserted_id})
     return created_order
 
-@router.get("/", response_model=List[Order])
-async def list_orders():
-    collection = await get_collection("orders")
-    orders = await collection.find().to_list(1000)
+FIELDS_DESCRIPTION = "Campos separados por vírgula (ex.: date,total); o id sempre é incluído"
+EXPAND_DESCRIPTION = "products: inclui os produtos do pedido (campo products) na mesma resposta"
+EXPAND_OPTIONS = {"products"}
+
+def expand_products_stages() -> List[dict]:
+    """$lookup pelos product_ids: os produtos vêm na mesma agregação dos pedidos"""
+    return [{
+        "$lookup": {
+            "from": "products",
+            "localField": "product_ids",
+            "foreignField": "_id",
+            "as": "products"
+        }
+    }]
+
+async def read_orders(match: dict, fields: Optional[str], expand: Optional[str], limit: int):
+    """
+    Pedidos com projeção (fields) e, com expand=products, os produtos de
+    todos eles resolvidos em uma única agregação em vez de um GET por produto.
+    Retorna os documentos e o modelo de resposta.
+    """
+    expanded = "products" in parse_expand(expand, EXPAND_OPTIONS)
+    model = OrderWithProducts if expanded else Order
+    selected = parse_fields(fields, model)
+    collection = await get_collection("orders", budget="read")
+
+    if not expanded:
+        orders = await collection.find(match, mongo_projection(selected)).to_list(limit)
+        return orders, model, selected
+
+    pipeline = [{"$match": match}, {"$limit": limit}] + expand_products_stages()
+    if selected is not None:
+        pipeline.append({"$project": mongo_projection(selected)})
+    orders = await collection.aggregate(pipeline).to_list(None)
+    return orders, model, selected
+
+@router.get("/", response_model=List[OrderWithProducts], response_model_exclude_unset=True)
+async def list_orders(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION)
+):
+    orders, model, selected = await read_orders({}, fields, expand, 1000)
+    if selected is not None:
+        return partial_response(model, selected, orders)
     return orders
 
-@router.get("/{order_id}", response_model=Order)
-async def get_order(order_id: str):
-    collection = await get_collection("orders")
-    if (order := await collection.find_one({"_id": ObjectId(order_id)})) is not None:
-        return order
-    raise HTTPException(status_code=404, detail="Order not found")
+@router.get("/{order_id}", response_model=OrderWithProducts, response_model_exclude_unset=True)
+async def get_order(
+    order_id: str,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION)
+):
+    orders, model, selected = await read_orders({"_id": ObjectId(order_id)}, fields, expand, 1)
+    if not orders:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if selected is not None:
+        return partial_response(model, selected, orders[0])
+    return orders[0]
 
 @router.put("/{order_id}", response_model=Order)
 async def update_order(order_id: str, order: OrderUpdate):
-    collection = await get_collection("orders")
+    collection = await get_collection("orders", budget="write")
 
-    total = await validate_products(order.product_ids)
+    total, category_ids = await validate_products(order.product_ids)
 
     update_data = order.model_dump()
     update_data['product_ids'] = [ObjectId(id) for id in order.product_ids]
     update_data['total'] = total
+    update_data['category_ids'] = category_ids
 
-    update_result = await collection.update_one(
+    # O documento anterior é necessário para desfazer os contadores antigos
+    previous_order = await collection.find_one_and_update(
         {"_id": ObjectId(order_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
 
-    if update_result.modified_count == 0:
+    if previous_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    return await collection.find_one({"_id": ObjectId(order_id)})
+    updated_order = {**previous_order, **update_data}
+    await sales_counters.apply_safely("update", sales_counters.apply_order_change(previous_order, updated_order))
+    await orders_timeseries.mirror_replace(updated_order)
+
+    return updated_order
 
 @router.delete("/{order_id}", response_model=dict)
 async def delete_order(order_id: str):
-    collection = await get_collection("orders")
-    delete_result = await collection.delete_one({"_id": ObjectId(order_id)})
+    collection = await get_collection("orders", budget="write")
+    deleted_order = await collection.find_one_and_delete({"_id": ObjectId(order_id)})
 
-    if delete_result.deleted_count == 0:
+    if deleted_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    await sales_counters.apply_safely("delete", sales_counters.apply_order(deleted_order, -1))
+    await orders_timeseries.mirror_delete(deleted_order)
+
     return {"message": "Order deleted successfully"}
 
 
+def invoke(payload: dict, **kwargs):
+    """
+    Invoca a Lambda de pedidos. Roda no threadpool dentro do span do circuit
+    breaker: o traceparent vai no payload e o handler continua o mesmo trace.
+    """
+    trace_context = tracing.inject()
+    if trace_context:
+        payload = {**payload, "trace_context": trace_context}
+    return get_lambda_client().invoke(
+        FunctionName=settings.LAMBDA_FUNCTION_NAME,
+        Payload=json.dumps(payload),
+        **kwargs
+    )
+
 @router.post("/test-lambda/{order_id}")
 async def test_lambda(order_id: str):
     try:
-        lambda_client = boto3.client(
-            'lambda',
-            endpoint_url='http://localstack:4566',
-            region_name='us-east-1',
-            aws_access_key_id='test',
-            aws_secret_access_key='test',
-            verify=False
-        )
-
         payload = {
             "order_id": order_id
         }
 
-        response = lambda_client.invoke(
-            FunctionName='hub-xp-orders-dev-processOrder',
-            InvocationType='RequestResponse',
-            Payload=json.dumps(payload)
-        )
+        response = await lambda_breaker.run(invoke, payload, InvocationType='RequestResponse')
 
         response_payload = json.loads(response['Payload'].read())
 
@@ -113,32 +211,25 @@ async def test_lambda(order_id: str):
             "message": "Lambda invocada com sucesso",
             "response": response_payload
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/process-order/{order_id}")
 async def process_order(order_id: str):
     try:
-        lambda_client = boto3.client(
-            'lambda',
-            endpoint_url='http://localstack:4566',
-            region_name='us-east-1',
-            aws_access_key_id='test',
-            aws_secret_access_key='test',
-            verify=False
-        )
-
         payload = {
             "order_id": order_id
         }
 
         print(f"Invocando Lambda com payload: {payload}")
 
-        response = lambda_client.invoke(
-            FunctionName='hub-xp-orders-dev-processOrder',
+        response = await lambda_breaker.run(
+            invoke,
+            payload,
             InvocationType='RequestResponse',
-            LogType='Tail',  # Importante para capturar logs
-            Payload=json.dumps(payload)
+            LogType='Tail'  # Importante para capturar logs
         )
 
         if 'LogResult' in response:
@@ -157,6 +248,8 @@ async def process_order(order_id: str):
 
         return json.loads(response_payload['body'])
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Erro na rota process_order: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
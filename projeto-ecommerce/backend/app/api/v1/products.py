@@ -1,42 +1,173 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query
 from fastapi.responses import JSONResponse
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from bson import ObjectId
-import boto3
+from pymongo import ReturnDocument
+from PIL import UnidentifiedImageError
+import asyncio
+import hashlib
 import json
-from app.models.product import Product, ProductCreate, ProductUpdate
+import re
+import uuid
+import os
+from app.models.product import (
+    Product,
+    ProductCreate,
+    ProductUpdate,
+    RelatedProduct,
+    ProductBulkUpdate,
+    ProductBulkUpdateResponse,
+    PresignedUploadRequest,
+    PresignedUpload,
+    ImageUploadConfirm
+)
 from app.core.database import get_collection
 from app.core.config import settings
+from app.core.aws import get_s3_client
+from app.core.resilience import s3_breaker
+from app.core.singleflight import SingleFlight, make_key
+from app.core.projection import (
+    parse_fields,
+    mongo_projection,
+    partial_response,
+    parse_object_ids,
+    ids_query,
+    in_requested_order
+)
+from app.services.images import CONTENT_TYPES, build_variants, variant_extension
+from app.services.order_categories import schedule_refresh_for_product
+from app.services.related_products import get_related
+from app.services.product_bulk import apply_bulk_update
 
 router = APIRouter()
+product_reads = SingleFlight("get_product")
 
-async def upload_file_to_s3(file: UploadFile) -> str:
-    s3 = boto3.client(
-        's3',
-        endpoint_url=settings.AWS_ENDPOINT_URL,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name='us-east-1',
-        verify=False
+# As chaves mudam junto com o conteúdo, então o objeto pode ser cacheado para sempre
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+HASH_CHUNK_SIZE = 1024 * 1024
+# Chaves geradas por create_presigned_upload: products/<uuid>-<nome>
+PRESIGNED_KEY_PATTERN = re.compile(r"^products/[0-9a-f]{32}-")
+
+def object_url(file_name: str) -> str:
+    return f"{settings.AWS_ENDPOINT_URL}/{settings.S3_BUCKET_NAME}/{file_name}"
+
+def content_key(digest: str) -> str:
+    # Só o hash: o mesmo conteúdo com outro nome ou extensão reaproveita o objeto.
+    # O tipo de mídia vai no ContentType do objeto
+    return f"products/{digest}"
+
+async def content_hash(file: UploadFile) -> str:
+    """Calcula o SHA-256 do upload em blocos, sem carregar o arquivo inteiro"""
+    digest = hashlib.sha256()
+    await file.seek(0)
+    while chunk := await file.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+async def object_exists(s3, file_name: str) -> bool:
+    # Import tardio: botocore só é carregado junto com o cliente S3
+    from botocore.exceptions import ClientError
+
+    try:
+        await s3_breaker.run(s3.head_object, Bucket=settings.S3_BUCKET_NAME, Key=file_name)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+async def put_object_to_s3(s3, file_name: str, content, content_type: str):
+    # boto3 é bloqueante: o envio roda no threadpool para não travar o event loop
+    await s3_breaker.run(
+        s3.put_object,
+        Bucket=settings.S3_BUCKET_NAME,
+        Key=file_name,
+        Body=content,
+        ContentType=content_type,
+        CacheControl=IMMUTABLE_CACHE_CONTROL
     )
 
+async def upload_bytes_to_s3(s3, file_name: str, content, content_type: str) -> str:
+    """
+    Envia o conteúdo para uma chave endereçada por hash.
+    Se o objeto já existe o upload custa apenas um HEAD.
+    """
+    if not await object_exists(s3, file_name):
+        await put_object_to_s3(s3, file_name, content, content_type)
+
+    return object_url(file_name)
+
+async def upload_file_to_s3(file: UploadFile) -> str:
+    s3 = get_s3_client()
+
+    try:
+        file_name = content_key(await content_hash(file))
+        return await upload_bytes_to_s3(s3, file_name, file.file, file.content_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
+
+def variant_keys(digest: str) -> Dict[str, str]:
+    # O tamanho faz parte da chave: mudar a configuração gera novos objetos
+    extension = variant_extension(settings.IMAGE_VARIANT_FORMAT)
+    return {
+        name: f"products/variants/{digest}/{name}-{size}.{extension}"
+        for name, size in settings.IMAGE_VARIANTS.items()
+    }
+
+async def upload_image_with_variants(file: UploadFile) -> Tuple[str, Dict[str, str]]:
+    """
+    Envia a imagem original e as variantes redimensionadas ao S3.
+    Imagens repetidas são detectadas pelo hash e não são decodificadas de novo;
+    nos demais casos a imagem é decodificada uma única vez e os envios são concorrentes.
+    """
+    s3 = get_s3_client()
+    digest = await content_hash(file)
+    original_key = content_key(digest)
+    keys = variant_keys(digest)
+    names = list(keys)
+
     try:
-        file_content = await file.read()
-        bucket_name = settings.S3_BUCKET_NAME
-        file_name = f"products/{file.filename}"
-
-        s3.put_object(
-            Bucket=bucket_name,
-            Key=file_name,
-            Body=file_content,
-            ContentType=file.content_type
+        existing = await asyncio.gather(
+            object_exists(s3, original_key),
+            *[object_exists(s3, keys[name]) for name in names]
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
+
+    urls = (object_url(original_key), {name: object_url(keys[name]) for name in names})
+    if all(existing):
+        return urls
+
+    file_content = await file.read()
+
+    try:
+        variants = await build_variants(file_content)
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image")
+
+    content_type = CONTENT_TYPES.get(settings.IMAGE_VARIANT_FORMAT.upper(), "application/octet-stream")
+    uploads = [(original_key, file_content, file.content_type)] + [
+        (keys[name], variants[name], content_type) for name in names
+    ]
 
-        url = f"{settings.AWS_ENDPOINT_URL}/{bucket_name}/{file_name}"
-        return url
+    try:
+        await asyncio.gather(*[
+            put_object_to_s3(s3, key, body, body_type)
+            for (key, body, body_type), exists in zip(uploads, existing)
+            if not exists
+        ])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+    return urls
+
 @router.post("/", response_model=Product)
 async def create_product(
     name: str,
@@ -62,7 +193,9 @@ async def validate_categories(category_ids: List[str]) -> bool:
     collection = await get_collection("categories")
     for cat_id in category_ids:
         try:
-            category = await collection.find_one({"_id": ObjectId(cat_id)})
+            category = await collection.find_one(
+                {"_id": ObjectId(cat_id), "deleted": {"$ne": True}}
+            )
             if not category:
                 raise HTTPException(
                     status_code=400,
@@ -87,7 +220,7 @@ async def create_product_with_image(
         category_ids_list = json.loads(category_ids)
         await validate_categories(category_ids_list)
 
-        image_url = await upload_file_to_s3(image)
+        image_url, image_variants = await upload_image_with_variants(image)
 
         collection = await get_collection("products")
         product_data = {
@@ -95,47 +228,198 @@ async def create_product_with_image(
             "description": description,
             "price": price,
             "category_ids": [ObjectId(id) for id in category_ids_list],
-            "image_url": image_url
+            "image_url": image_url,
+            "image_variants": image_variants
         }
 
         new_product = await collection.insert_one(product_data)
         created_product = await collection.find_one({"_id": new_product.inserted_id})
         return created_product
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[Product])
-async def list_products():
+@router.post("/uploads/presign", response_model=PresignedUpload)
+async def create_presigned_upload(upload: PresignedUploadRequest):
+    """
+    Gera uma URL pré-assinada para o cliente enviar a imagem direto ao S3.
+    A API trafega apenas metadados; o objeto é vinculado ao produto no /confirm.
+    """
+    if not upload.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Only image uploads are allowed")
+    if upload.method == "PUT":
+        # A URL de PUT não aceita content-length-range: o tamanho exato vai na assinatura
+        if upload.size is None:
+            raise HTTPException(status_code=400, detail="size is required for PUT uploads")
+        if upload.size > settings.S3_MAX_UPLOAD_SIZE_BYTES:
+            raise HTTPException(status_code=400, detail="Uploaded image is too large")
+
+    file_name = os.path.basename(upload.filename).replace(" ", "_") or "image"
+    key = f"products/{uuid.uuid4().hex}-{file_name}"
+    bucket_name = settings.S3_BUCKET_NAME
+    expires_in = settings.S3_PRESIGN_EXPIRES_SECONDS
+
+    s3 = get_s3_client(settings.S3_PRESIGN_ENDPOINT_URL)
+
+    try:
+        if upload.method == "POST":
+            presigned = s3.generate_presigned_post(
+                Bucket=bucket_name,
+                Key=key,
+                Fields={"Content-Type": upload.content_type},
+                Conditions=[
+                    {"Content-Type": upload.content_type},
+                    ["content-length-range", 1, settings.S3_MAX_UPLOAD_SIZE_BYTES]
+                ],
+                ExpiresIn=expires_in
+            )
+            url, fields = presigned["url"], presigned["fields"]
+        else:
+            url = s3.generate_presigned_url(
+                "put_object",
+                Params={
+                    "Bucket": bucket_name,
+                    "Key": key,
+                    "ContentType": upload.content_type,
+                    "ContentLength": upload.size
+                },
+                ExpiresIn=expires_in
+            )
+            fields = {}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating presigned upload: {str(e)}")
+
+    return {
+        "key": key,
+        "url": url,
+        "method": upload.method,
+        "fields": fields,
+        "expires_in": expires_in
+    }
+
+@router.post("/{product_id}/image/confirm", response_model=Product)
+async def confirm_image_upload(product_id: str, upload: ImageUploadConfirm):
+    if not upload.key.startswith("products/") or ".." in upload.key:
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+
     collection = await get_collection("products")
-    products = await collection.find().to_list(1000)
+    if not await collection.find_one({"_id": ObjectId(product_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    from botocore.exceptions import ClientError
+
+    bucket_name = settings.S3_BUCKET_NAME
+    s3 = get_s3_client()
+
+    try:
+        head = await s3_breaker.run(s3.head_object, Bucket=bucket_name, Key=upload.key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise HTTPException(status_code=400, detail="Uploaded object not found")
+        raise HTTPException(status_code=500, detail=f"Error checking upload: {str(e)}")
+
+    rejection = None
+    if not head.get("ContentType", "").startswith("image/"):
+        rejection = "Uploaded object is not an image"
+    elif head.get("ContentLength", 0) > settings.S3_MAX_UPLOAD_SIZE_BYTES:
+        rejection = "Uploaded image is too large"
+    if rejection:
+        # O objeto recusado não fica órfão no bucket. Só chaves geradas pelo
+        # /uploads/presign são apagadas: as endereçadas por hash são compartilhadas
+        if PRESIGNED_KEY_PATTERN.match(upload.key):
+            await s3_breaker.run(s3.delete_object, Bucket=bucket_name, Key=upload.key)
+        raise HTTPException(status_code=400, detail=rejection)
+
+    # As variantes antigas pertencem à imagem anterior
+    await collection.update_one(
+        {"_id": ObjectId(product_id)},
+        {
+            "$set": {"image_url": f"{settings.AWS_ENDPOINT_URL}/{bucket_name}/{upload.key}"},
+            "$unset": {"image_variants": ""}
+        }
+    )
+    product_reads.invalidate()
+
+    return await collection.find_one({"_id": ObjectId(product_id)})
+
+FIELDS_DESCRIPTION = "Campos separados por vírgula (ex.: name,price,image_url); o id sempre é incluído"
+
+IDS_DESCRIPTION = "Ids separados por vírgula: retorna só esses documentos, na ordem pedida"
+
+@router.get("/", response_model=List[Product])
+async def list_products(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    ids: Optional[str] = Query(None, description=IDS_DESCRIPTION)
+):
+    selected = parse_fields(fields, Product)
+    object_ids = parse_object_ids(ids)
+    collection = await get_collection("products", budget="read")
+    products = await collection.find(ids_query(object_ids), mongo_projection(selected)).to_list(1000)
+    products = in_requested_order(products, object_ids)
+    if selected is not None:
+        return partial_response(Product, selected, products)
     return products
 
+@router.patch("/bulk", response_model=ProductBulkUpdateResponse)
+async def bulk_update_products(update: ProductBulkUpdate):
+    """
+    Atualizações parciais em massa, por id ou por filtro (ex.: +5% nos
+    produtos de uma categoria), com resultado por operação
+    """
+    response = await apply_bulk_update(update.operations)
+    # Leituras iniciadas antes da escrita não são mais compartilhadas
+    product_reads.invalidate()
+    return response
+
 @router.get("/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    collection = await get_collection("products")
-    if (product := await collection.find_one({"_id": ObjectId(product_id)})) is not None:
-        return product
-    raise HTTPException(status_code=404, detail="Product not found")
+async def get_product(product_id: str, fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)):
+    selected = parse_fields(fields, Product)
+    collection = await get_collection("products", budget="read")
+    product = await product_reads.do(
+        make_key("get_product", product_id=product_id, fields=selected),
+        lambda: collection.find_one({"_id": ObjectId(product_id)}, mongo_projection(selected))
+    )
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if selected is not None:
+        return partial_response(Product, selected, product)
+    return product
+
+@router.get("/{product_id}/related", response_model=List[RelatedProduct])
+async def list_related_products(product_id: str, limit: int = Query(10, ge=1, le=100)):
+    """
+    Produtos comprados junto com este, pré-calculados por
+    scripts/build_related_products.py; produtos sem dados retornam lista vazia
+    """
+    related = await get_related(ObjectId(product_id), limit)
+    return related["related"] if related else []
 
 @router.put("/{product_id}", response_model=Product)
 async def update_product(product_id: str, product: ProductUpdate):
-    collection = await get_collection("products")
+    collection = await get_collection("products", budget="write")
 
     update_data = product.model_dump()
 
     if update_data.get('category_ids'):
         update_data['category_ids'] = [ObjectId(id) for id in update_data['category_ids']]
 
-    update_result = await collection.update_one(
+    previous_product = await collection.find_one_and_update(
         {"_id": ObjectId(product_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
 
-    if update_result.modified_count == 0:
+    if previous_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_reads.invalidate()
 
-    return await collection.find_one({"_id": ObjectId(product_id)})
+    # Pedidos guardam as categorias dos produtos: recalcula se elas mudaram
+    if set(previous_product.get('category_ids', [])) != set(update_data.get('category_ids') or []):
+        schedule_refresh_for_product(previous_product['_id'])
+
+    return {**previous_product, **update_data}
 
 @router.delete("/{product_id}", response_model=dict)
 async def delete_product(product_id: str):
@@ -144,5 +428,8 @@ async def delete_product(product_id: str):
 
     if delete_result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_reads.invalidate()
+
+    schedule_refresh_for_product(ObjectId(product_id))
 
     return {"message": "Product deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core import metrics
+
+class AdmissionGate:
+    """
+    Limita a concorrência de uma classe de rotas.
+    Requisições acima do limite esperam numa fila limitada; com a fila cheia
+    ou após o timeout são rejeitadas imediatamente.
+    """
+
+    def __init__(self, name: str, limit: int, queue_depth: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        start = time.perf_counter()
+
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_depth:
+                metrics.inc("admission_rejected_total", route_class=self.name, reason="queue_full")
+                return False
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                metrics.inc("admission_rejected_total", route_class=self.name, reason="queue_timeout")
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        metrics.observe("admission_queue_wait_seconds", time.perf_counter() - start, route_class=self.name)
+        metrics.set_gauge("admission_in_flight", self.active, route_class=self.name)
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+        metrics.set_gauge("admission_in_flight", self.active, route_class=self.name)
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """Associa a requisição a uma classe de rotas (None = sem limite)"""
+    if path.startswith("/api/v1/dashboard/sales/stream"):
+        # Conexões SSE são longas e não consultam o banco por cliente
+        return None
+    if path.startswith("/api/v1/exports"):
+        # Exportações seguram a vaga durante todo o streaming: classe própria
+        # para não ocupar as vagas do dashboard
+        return "exports"
+    if path.startswith("/api/v1/dashboard"):
+        return "analytics"
+    if path.startswith("/api/v1/products/with-image") or path.endswith("/image/confirm"):
+        return "uploads"
+    if path.startswith("/api/v1/orders") and method != "GET":
+        return "order_writes"
+    if method == "GET" and path.startswith((
+        "/api/v1/products", "/api/v1/categories", "/api/v1/orders"
+    )):
+        return "catalog_reads"
+    return None
+
+class AdmissionControlMiddleware:
+    """
+    Middleware ASGI de admission control por classe de rotas.
+    Cada classe tem seu próprio limite, então picos de dashboard e uploads
+    não consomem a capacidade reservada para a criação de pedidos.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.gates: Dict[str, AdmissionGate] = {
+            name: AdmissionGate(
+                name,
+                limit,
+                settings.ADMISSION_QUEUE_DEPTH.get(name, 0),
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+            )
+            for name, limit in settings.ADMISSION_CONCURRENCY.items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_CONTROL_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify_request(scope["method"], scope["path"])
+        gate = self.gates.get(route_class)
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await gate.acquire():
+            await self._reject(send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "Service overloaded, please retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(settings.ADMISSION_RETRY_AFTER_SECONDS).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,65 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+
+# boto3 é importado apenas na primeira criação de cliente: não pesa no startup
+# nem no fork dos workers. Os clientes são thread-safe e reaproveitados por processo.
+_lock = threading.Lock()
+_clients: Dict[Tuple[int, str, str], object] = {}
+_session = None
+_session_pid = None
+
+def _get_session():
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        import boto3
+
+        _session = boto3.session.Session(
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_REGION
+        )
+        _session_pid = os.getpid()
+    return _session
+
+def _create_client(service: str, endpoint_url: str):
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=settings.AWS_READ_TIMEOUT_SECONDS,
+        tcp_keepalive=True,
+        # Poucas tentativas: com a dependência fora do ar o circuit breaker decide
+        retries={'max_attempts': settings.AWS_MAX_ATTEMPTS, 'mode': 'standard'},
+        # path-style e SigV4 para as URLs pré-assinadas funcionarem no LocalStack
+        signature_version='s3v4',
+        s3={'addressing_style': 'path'}
+    )
+    return _get_session().client(
+        service,
+        endpoint_url=endpoint_url,
+        verify=False,
+        config=config
+    )
+
+def get_client(service: str, endpoint_url: Optional[str] = None):
+    endpoint_url = endpoint_url or settings.AWS_ENDPOINT_URL
+    # O pid faz parte da chave: clientes não devem atravessar um fork
+    key = (os.getpid(), service, endpoint_url)
+
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _create_client(service, endpoint_url)
+                _clients[key] = client
+    return client
+
+def get_s3_client(endpoint_url: Optional[str] = None):
+    return get_client('s3', endpoint_url)
+
+def get_lambda_client():
+    return get_client('lambda')
@@ -1,10 +1,125 @@
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred
+)
 from .config import settings
+from .tracing import mongo_event_listeners
+
+# Modos que aceitam maxStalenessSeconds (todos exceto primary)
+READ_PREFERENCE_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest
+}
+
+def read_preference_for(subsystem: Optional[str]):
+    """
+    Read preference configurada para o subsistema em Settings.
+    Leituras transacionais (e subsistemas não configurados) ficam no primário.
+    """
+    mode = settings.MONGO_READ_PREFERENCES.get(subsystem or "transactional", "primary")
+    if mode not in READ_PREFERENCE_MODES:
+        return Primary()
+
+    max_staleness = settings.MONGO_MAX_STALENESS_SECONDS.get(subsystem, -1)
+    return READ_PREFERENCE_MODES[mode](max_staleness=max_staleness)
+
+class BudgetedCollection:
+    """
+    Coleção que aplica maxTimeMS a toda leitura (find e aggregate, contagens e
+    find_one_and_*) que não defina o seu. O servidor interrompe a operação ao
+    estourar o orçamento e a API responde 504 (veja app/core/resilience.py).
+    """
+
+    def __init__(self, collection, max_time_ms: int):
+        self._collection = collection
+        self.max_time_ms = max_time_ms
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def __getitem__(self, name):
+        return self._collection[name]
+
+    def with_options(self, **kwargs):
+        return BudgetedCollection(self._collection.with_options(**kwargs), self.max_time_ms)
+
+    def find(self, *args, **kwargs):
+        kwargs.setdefault("max_time_ms", self.max_time_ms)
+        return self._collection.find(*args, **kwargs)
+
+    def find_one(self, *args, **kwargs):
+        kwargs.setdefault("max_time_ms", self.max_time_ms)
+        return self._collection.find_one(*args, **kwargs)
+
+    def _with_budget(self, method: str, *args, **kwargs):
+        kwargs.setdefault("maxTimeMS", self.max_time_ms)
+        return getattr(self._collection, method)(*args, **kwargs)
+
+    def aggregate(self, *args, **kwargs):
+        return self._with_budget("aggregate", *args, **kwargs)
+
+    def count_documents(self, *args, **kwargs):
+        return self._with_budget("count_documents", *args, **kwargs)
+
+    def distinct(self, *args, **kwargs):
+        return self._with_budget("distinct", *args, **kwargs)
+
+    def find_one_and_update(self, *args, **kwargs):
+        return self._with_budget("find_one_and_update", *args, **kwargs)
+
+    def find_one_and_replace(self, *args, **kwargs):
+        return self._with_budget("find_one_and_replace", *args, **kwargs)
+
+    def find_one_and_delete(self, *args, **kwargs):
+        return self._with_budget("find_one_and_delete", *args, **kwargs)
 
 async def get_database():
-    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    client = AsyncIOMotorClient(
+        settings.MONGODB_URL,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=mongo_event_listeners()
+    )
     return client[settings.DATABASE_NAME]
 
-async def get_collection(collection_name: str):
+async def get_collection(collection_name: str, subsystem: Optional[str] = None, budget: Optional[str] = None):
+    """
+    budget escolhe o orçamento de tempo em Settings.MONGO_MAX_TIME_MS
+    ("read", "write", "dashboard"); sem budget não há limite.
+    """
     db = await get_database()
-    return db[collection_name]
\ No newline at end of file
+    collection = db[collection_name]
+    if subsystem is not None:
+        collection = collection.with_options(read_preference=read_preference_for(subsystem))
+    max_time_ms = settings.MONGO_MAX_TIME_MS.get(budget, 0) if budget else 0
+    if max_time_ms > 0:
+        collection = BudgetedCollection(collection, max_time_ms)
+    return collection
+
+async def ensure_indexes():
+    """Cria os índices usados pelas consultas da API (operação idempotente)"""
+    db = await get_database()
+    # Exportação paginada por (date, _id)
+    await db.orders.create_index([("date", ASCENDING), ("_id", ASCENDING)])
+    # Filtro por categoria do dashboard (category_ids desnormalizado, multikey)
+    await db.orders.create_index([("category_ids", ASCENDING), ("date", ASCENDING)])
+    # Recálculo das categorias dos pedidos quando um produto muda
+    await db.orders.create_index([("product_ids", ASCENDING)])
+    # Contadores diários de vendas por produto
+    await db.product_sales_daily.create_index([("product_id", ASCENDING), ("day", ASCENDING)], unique=True)
+    await db.product_sales_daily.create_index([("day", ASCENDING), ("product_id", ASCENDING)])
+    # Chaves de idempotência expiram sozinhas
+    await db.idempotency_keys.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    if settings.ORDERS_TIMESERIES_ENABLED:
+        from app.services.orders_timeseries import create_timeseries_collection
+        await create_timeseries_collection()
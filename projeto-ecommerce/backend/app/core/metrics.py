@@ -0,0 +1,60 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# Métricas simples em memória, expostas em /metrics no formato texto do Prometheus
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+_gauges: Dict[Tuple[str, tuple], float] = {}
+_summaries: Dict[Tuple[str, tuple], list] = {}
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name: str, value: float, **labels):
+    """Acumula count, sum e max de uma duração ou tamanho"""
+    with _lock:
+        summary = _summaries.setdefault(_key(name, labels), [0, 0.0, 0.0])
+        summary[0] += 1
+        summary[1] += value
+        summary[2] = max(summary[2], value)
+
+def get_counter(name: str, **labels) -> float:
+    return _counters.get(_key(name, labels), 0)
+
+def get_summary(name: str, **labels) -> dict:
+    count, total, maximum = _summaries.get(_key(name, labels), [0, 0.0, 0.0])
+    return {"count": count, "sum": total, "max": maximum}
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+
+def _format(name: str, labels: tuple, value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            lines.append(_format(name, labels, value))
+        for (name, labels), value in sorted(_gauges.items()):
+            lines.append(_format(name, labels, value))
+        for (name, labels), (count, total, maximum) in sorted(_summaries.items()):
+            lines.append(_format(f"{name}_count", labels, count))
+            lines.append(_format(f"{name}_sum", labels, total))
+            lines.append(_format(f"{name}_max", labels, maximum))
+    return "\n".join(lines) + "\n"
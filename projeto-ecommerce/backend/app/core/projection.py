@@ -0,0 +1,94 @@
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple, Type
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+# Sparse fieldsets: ?fields=name,price vira uma projeção no Mongo e um modelo
+# de resposta só com esses campos. O id sempre volta, como em find().
+# Também ficam aqui ?ids= (multi-get) e ?expand= das rotas de leitura.
+
+# Mesmo limite das listagens
+MAX_IDS = 1000
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """Valida a lista separada por vírgulas; None quando o parâmetro não foi usado"""
+    if fields is None:
+        return None
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    requested = {"id" if name == "_id" else name for name in requested}
+    if not requested:
+        return None
+
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return tuple(sorted(requested | {"id"}))
+
+def mongo_projection(fields: Optional[Tuple[str, ...]]) -> Optional[dict]:
+    if fields is None:
+        return None
+    return {name: 1 for name in fields if name != "id"}
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Modelo com apenas os campos pedidos, reaproveitando tipos e validadores do original"""
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(populate_by_name=True),
+        **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields}
+    )
+
+@lru_cache(maxsize=256)
+def _adapter(model: Type[BaseModel], fields: Tuple[str, ...], many: bool) -> TypeAdapter:
+    trimmed = partial_model(model, fields)
+    return TypeAdapter(List[trimmed] if many else trimmed)
+
+def partial_response(model: Type[BaseModel], fields: Tuple[str, ...], content) -> Response:
+    """
+    Serializa com o modelo reduzido, com aliases como o response_model das
+    rotas (o id sai como "_id"). Aceita um documento ou uma lista.
+    """
+    adapter = _adapter(model, fields, isinstance(content, list))
+    return Response(
+        content=adapter.dump_json(adapter.validate_python(content), by_alias=True),
+        media_type="application/json"
+    )
+
+def parse_object_ids(ids: Optional[str]) -> Optional[List[ObjectId]]:
+    """?ids=a,b,c para buscar vários documentos com um único $in"""
+    if ids is None:
+        return None
+
+    values = list(dict.fromkeys(value.strip() for value in ids.split(",") if value.strip()))
+    if len(values) > MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IDS} ids per request")
+    try:
+        return [ObjectId(value) for value in values]
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="ids must be valid ObjectIds")
+
+def ids_query(object_ids: Optional[List[ObjectId]]) -> dict:
+    return {"_id": {"$in": object_ids}} if object_ids is not None else {}
+
+def in_requested_order(documents: List[dict], object_ids: Optional[List[ObjectId]]) -> List[dict]:
+    """Resultados do $in na ordem dos ids pedidos; ids inexistentes são omitidos"""
+    if object_ids is None:
+        return documents
+    by_id = {document["_id"]: document for document in documents}
+    return [by_id[object_id] for object_id in object_ids if object_id in by_id]
+
+def parse_expand(expand: Optional[str], allowed: Set[str]) -> Set[str]:
+    requested = {name.strip() for name in (expand or "").split(",") if name.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown expand options: {', '.join(sorted(unknown))}"
+        )
+    return requested
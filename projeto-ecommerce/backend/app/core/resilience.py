@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, NetworkTimeout
+from app.core.config import settings
+from app.core import metrics, tracing
+
+# Falhas de dependências viram respostas rápidas em vez de requisições
+# acumuladas: 503 quando a dependência está indisponível (ou o circuito está
+# aberto) e 504 quando a operação estourou o orçamento de tempo.
+
+class DependencyUnavailable(HTTPException):
+    def __init__(self, dependency: str, retry_after: Optional[float] = None):
+        headers = {"Retry-After": str(max(1, round(retry_after)))} if retry_after else None
+        super().__init__(status_code=503, detail=f"{dependency} is temporarily unavailable", headers=headers)
+
+class DependencyTimeout(HTTPException):
+    def __init__(self, dependency: str):
+        super().__init__(status_code=504, detail=f"{dependency} did not respond within the time budget")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+AWS_THROTTLING_CODES = {
+    "Throttling", "ThrottlingException", "TooManyRequestsException",
+    "RequestLimitExceeded", "SlowDown", "ServiceUnavailable"
+}
+
+def aws_failure(error: Exception) -> bool:
+    """
+    Só indisponibilidade conta como falha: erros 5xx, throttling, conexão e
+    timeout. Respostas do cliente (ex.: 404 de um head_object) não abrem o circuito.
+    """
+    from botocore.exceptions import ClientError
+
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return status >= 500 or code in AWS_THROTTLING_CODES
+    return True
+
+def aws_timeout(error: Exception) -> bool:
+    from botocore.exceptions import ConnectTimeoutError, ReadTimeoutError
+
+    return isinstance(error, (ConnectTimeoutError, ReadTimeoutError))
+
+class CircuitBreaker:
+    """
+    Circuit breaker por taxa de erro: com ao menos min_calls chamadas na janela
+    e failure_rate delas falhando, o circuito abre e as chamadas falham na hora
+    com 503. Após open_seconds uma única chamada de teste é liberada (meio
+    aberto); se ela funcionar o circuito fecha, senão abre de novo.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float,
+        min_calls: int,
+        window_seconds: float,
+        open_seconds: float,
+        is_failure: Callable[[Exception], bool] = lambda error: True,
+        is_timeout: Callable[[Exception], bool] = lambda error: False
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.is_failure = is_failure
+        self.is_timeout = is_timeout
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.set_gauge("circuit_breaker_state", STATE_VALUES[state], dependency=self.name)
+
+    def before_call(self):
+        """Levanta DependencyUnavailable se o circuito não aceita a chamada agora"""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    metrics.inc("circuit_breaker_rejected_total", dependency=self.name)
+                    raise DependencyUnavailable(self.name, retry_after=remaining)
+                self._set_state(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    metrics.inc("circuit_breaker_rejected_total", dependency=self.name)
+                    raise DependencyUnavailable(self.name, retry_after=self.open_seconds)
+                self._trial_running = True
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        metrics.inc("dependency_calls_total", dependency=self.name, outcome="success" if success else "failure")
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trial_running = False
+                self._calls.clear()
+                if success:
+                    self._set_state(CLOSED)
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, success))
+            while self._calls and self._calls[0][0] < now - self.window_seconds:
+                self._calls.popleft()
+
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if (self.state == CLOSED and len(self._calls) >= self.min_calls
+                    and failures / len(self._calls) >= self.failure_rate):
+                self._open(now)
+
+    def release(self):
+        """Chamada sem resultado (ex.: cancelada): só libera a vaga da chamada de teste"""
+        with self._lock:
+            self._trial_running = False
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._set_state(OPEN)
+        metrics.inc("circuit_breaker_opened_total", dependency=self.name)
+
+    def _handle_error(self, error: Exception):
+        if not self.is_failure(error):
+            # A dependência respondeu: o erro é da requisição, não de disponibilidade
+            self.record(True)
+            return
+        self.record(False)
+        if self.is_timeout(error):
+            metrics.inc("dependency_timeouts_total", dependency=self.name)
+            raise DependencyTimeout(self.name) from error
+
+    def _span(self, fn: Callable[..., Any]):
+        # Um span por chamada, ex.: "s3.head_object" ou "lambda.invoke"
+        operation = getattr(fn, "__name__", "call")
+        return tracing.start_span(
+            f"{self.name}.{operation}",
+            tracing.KIND_CLIENT,
+            attributes={"peer.service": self.name, "rpc.method": operation, "circuit.state": self.state}
+        )
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Versão síncrona, para código que já roda fora do event loop"""
+        with self._span(fn):
+            self.before_call()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as error:
+                self._handle_error(error)
+                raise
+            except BaseException:
+                # CancelledError não é Exception: sem liberar a vaga, o circuito
+                # ficaria meio aberto recusando tudo até reiniciar o processo
+                self.release()
+                raise
+            self.record(True)
+            return result
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Executa a chamada bloqueante (boto3) no threadpool, protegida pelo circuito"""
+        with self._span(fn):
+            self.before_call()
+            try:
+                result = await run_in_threadpool(fn, *args, **kwargs)
+            except Exception as error:
+                self._handle_error(error)
+                raise
+            except BaseException:
+                # CancelledError não é Exception: sem liberar a vaga, o circuito
+                # ficaria meio aberto recusando tudo até reiniciar o processo
+                self.release()
+                raise
+            self.record(True)
+            return result
+
+def _aws_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_rate=settings.CIRCUIT_BREAKER_FAILURE_RATE,
+        min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+        window_seconds=settings.CIRCUIT_BREAKER_WINDOW_SECONDS,
+        open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+        is_failure=aws_failure,
+        is_timeout=aws_timeout
+    )
+
+s3_breaker = _aws_breaker("s3")
+lambda_breaker = _aws_breaker("lambda")
+
+async def _mongo_timeout(request: Request, exc: Exception):
+    metrics.inc("dependency_timeouts_total", dependency="mongo")
+    error = DependencyTimeout("mongo")
+    return JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+
+async def _mongo_unavailable(request: Request, exc: Exception):
+    metrics.inc("dependency_unavailable_total", dependency="mongo")
+    error = DependencyUnavailable("mongo", retry_after=settings.ADMISSION_RETRY_AFTER_SECONDS)
+    return JSONResponse(status_code=error.status_code, content={"detail": error.detail}, headers=error.headers)
+
+def install_exception_handlers(app: FastAPI):
+    """maxTimeMS estourado vira 504; Mongo fora do ar ou pool esgotado, 503"""
+    app.add_exception_handler(ExecutionTimeout, _mongo_timeout)
+    app.add_exception_handler(NetworkTimeout, _mongo_timeout)
+    app.add_exception_handler(ConnectionFailure, _mongo_unavailable)
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from app.core.config import settings
+from app.core import metrics
+
+def make_key(route: str, **params) -> tuple:
+    """Normaliza os parâmetros: ignora None e ordena listas e nomes"""
+    normalized = []
+    for name, value in sorted(params.items()):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(str(v) for v in value))
+        normalized.append((name, value))
+    return (route, tuple(normalized))
+
+class SingleFlight:
+    """
+    Coalesce leituras idênticas e concorrentes em uma única chamada ao banco.
+    A chamada roda em uma task própria: se o cliente que a iniciou desconectar,
+    as demais requisições continuam recebendo o resultado.
+    O resultado é compartilhado, então quem o recebe não deve alterá-lo.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await fn()
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            metrics.inc("singleflight_calls_total", group=self.name)
+        else:
+            metrics.inc("singleflight_coalesced_total", group=self.name)
+
+        return await asyncio.shield(task)
+
+    def invalidate(self):
+        """
+        Após uma escrita, leituras novas não devem se juntar a chamadas que
+        começaram antes dela; as chamadas em andamento terminam normalmente.
+        """
+        self._inflight.clear()
+        metrics.inc("singleflight_invalidations_total", group=self.name)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Evita o aviso de exceção não recuperada quando todos desistiram
+        if not task.cancelled():
+            task.exception()
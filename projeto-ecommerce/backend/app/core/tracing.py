@@ -0,0 +1,325 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Union
+from pymongo import monitoring
+from app.core.config import settings
+from app.core import metrics
+
+# Tracing no formato do OpenTelemetry sem depender do SDK: spans da requisição
+# (middleware), dos comandos Mongo (command listener) e das chamadas ao S3 e à
+# Lambda (circuit breakers). O contexto segue o padrão W3C Trace Context
+# (traceparent) e vai no payload da Lambda para o handler continuar o trace.
+# Spans amostrados são exportados em lote como OTLP/JSON, em arquivo ou via HTTP.
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class SpanContext(NamedTuple):
+    """Pai remoto, vindo de um traceparent"""
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+class Span:
+    def __init__(self, name: str, kind: int, parent: Optional[Union["Span", SpanContext]], attributes: Dict[str, Any]):
+        if parent is not None:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.sampled = parent.sampled
+        else:
+            # Raiz do trace: a decisão de amostragem vale para todos os filhos
+            self.trace_id = os.urandom(16).hex()
+            self.parent_id = None
+            self.sampled = settings.TRACING_ENABLED and random.random() < settings.TRACING_SAMPLE_RATE
+        self.span_id = os.urandom(8).hex()
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.status = 0
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, error: Union[BaseException, str]):
+        self.status = STATUS_ERROR
+        self.status_message = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.sampled:
+            get_exporter().add(self)
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+@contextmanager
+def start_span(
+    name: str,
+    kind: int = KIND_INTERNAL,
+    parent: Optional[Union[Span, SpanContext]] = None,
+    attributes: Optional[Dict[str, Any]] = None
+) -> Iterator[Span]:
+    """
+    Abre um span filho do span atual (ou de parent) e o torna o atual até o
+    fim do bloco. Exceções marcam o span com erro e seguem adiante.
+    """
+    span = Span(name, kind, parent or _current.get(), attributes or {})
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as error:
+        span.record_error(error)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+def extract(traceparent: Optional[str]) -> Optional[SpanContext]:
+    match = TRACEPARENT_PATTERN.match((traceparent or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+def inject() -> Dict[str, str]:
+    """Contexto do span atual para propagar a outro serviço; vazio sem tracing"""
+    span = _current.get()
+    if span is None or not settings.TRACING_ENABLED:
+        return {}
+    return {"traceparent": span.traceparent}
+
+def _attribute_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_payload(spans: List[Span]) -> dict:
+    """Lote de spans no formato OTLP/JSON (ExportTraceServiceRequest)"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": settings.TRACING_SERVICE_NAME}}
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "app.core.tracing"},
+                "spans": [
+                    {
+                        "traceId": span.trace_id,
+                        "spanId": span.span_id,
+                        **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                        "name": span.name,
+                        "kind": span.kind,
+                        "startTimeUnixNano": str(span.start_ns),
+                        "endTimeUnixNano": str(span.end_ns),
+                        "attributes": [
+                            {"key": key, "value": _attribute_value(value)}
+                            for key, value in span.attributes.items() if value is not None
+                        ],
+                        "status": {"code": span.status, **({"message": span.status_message} if span.status_message else {})}
+                    }
+                    for span in spans
+                ]
+            }]
+        }]
+    }
+
+def write_to_file(spans: List[Span]):
+    """Uma linha OTLP/JSON por lote, o formato lido pelo receiver otlpjsonfile do collector"""
+    path = settings.TRACING_FILE_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as output:
+        output.write(json.dumps(otlp_payload(spans)) + "\n")
+
+def post_to_collector(spans: List[Span]):
+    request = urllib.request.Request(
+        settings.TRACING_OTLP_ENDPOINT,
+        data=json.dumps(otlp_payload(spans)).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=settings.TRACING_EXPORT_TIMEOUT_SECONDS):
+        pass
+
+EXPORTERS = {"file": write_to_file, "otlp": post_to_collector}
+
+class SpanExporter:
+    """
+    Acumula os spans encerrados e exporta em lote numa thread em segundo plano,
+    a cada interval segundos ou quando batch_size spans se acumulam. Com a fila
+    cheia os spans novos são descartados: o tracing nunca segura a requisição.
+    """
+
+    def __init__(self, export, batch_size: int, interval: float, max_queue: int):
+        self.export = export
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue = max_queue
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def add(self, span: Span):
+        with self._lock:
+            if len(self._spans) >= self.max_queue:
+                metrics.inc("tracing_spans_dropped_total")
+                return
+            self._spans.append(span)
+            full = len(self._spans) >= self.batch_size
+            # A thread não sobrevive a um fork: cada worker inicia a sua
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._spans = self._spans, []
+        if not batch:
+            return
+        try:
+            with self._export_lock:
+                self.export(batch)
+            metrics.inc("tracing_spans_exported_total", len(batch))
+        except Exception as e:
+            metrics.inc("tracing_export_errors_total")
+            print(f"Erro ao exportar spans: {str(e)}", file=sys.stderr)
+
+_exporter: Optional[SpanExporter] = None
+_exporter_lock = threading.Lock()
+
+def get_exporter() -> SpanExporter:
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = SpanExporter(
+                    EXPORTERS[settings.TRACING_EXPORTER],
+                    settings.TRACING_EXPORT_BATCH_SIZE,
+                    settings.TRACING_EXPORT_INTERVAL_SECONDS,
+                    settings.TRACING_MAX_QUEUE_SIZE
+                )
+    return _exporter
+
+def shutdown_tracing():
+    """Exporta os spans pendentes no shutdown"""
+    if _exporter is not None:
+        _exporter.flush()
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Um span por comando enviado ao Mongo, filho do span atual. O Motor executa
+    o driver num executor que copia o contexto, então o span da requisição
+    está visível aqui. Comandos fora de uma requisição amostrada são ignorados.
+    """
+
+    def __init__(self):
+        self._spans: Dict[tuple, Span] = {}
+
+    def started(self, event):
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return
+        collection = event.command.get(event.command_name)
+        self._spans[(event.connection_id, event.request_id)] = Span(
+            f"mongo.{event.command_name}",
+            KIND_CLIENT,
+            parent,
+            {
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": collection if isinstance(collection, str) else None,
+                "server.address": f"{event.connection_id[0]}:{event.connection_id[1]}"
+            }
+        )
+
+    def succeeded(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.end()
+
+    def failed(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.record_error(str(event.failure.get("errmsg", event.failure)))
+            span.end()
+
+mongo_listener = MongoCommandListener()
+
+def mongo_event_listeners() -> list:
+    return [mongo_listener] if settings.TRACING_ENABLED else []
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que abre o span raiz de cada requisição, continuando o
+    trace de um traceparent recebido. O id do trace volta em X-Trace-Id para
+    achar a requisição no arquivo ou no collector.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        parent = extract(headers.get(b"traceparent", b"").decode("latin-1"))
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+
+        with start_span(f"{scope['method']} {scope['path']}", KIND_SERVER, parent, attributes) as span:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.record_error(f"HTTP {message['status']}")
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", span.trace_id.encode())
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+            # Nome pelo template da rota (ex.: /api/v1/orders/{order_id}), como nos backends de tracing
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                span.name = f"{scope['method']} {route.path}"
@@ -1,21 +1,63 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.products import router as products_router
 from app.api.v1.categories import router as categories_router
 from app.api.v1.orders import router as orders_router
 from app.api.v1.dashboard import router as dashboard_router
+from app.api.v1.exports import router as exports_router
+from app.core.database import ensure_indexes
+from app.core.admission import AdmissionControlMiddleware
+from app.core.resilience import install_exception_handlers
+from app.core.tracing import TracingMiddleware, shutdown_tracing
+from app.core import metrics
+from app.services.category_cleanup import resume_pending_cleanups
+from app.services.images import shutdown_process_pool
+from app.services.live_metrics import shutdown_live_hub
+from app.services.order_ingestion import shutdown_order_buffer
 
-app = FastAPI(title="E-commerce API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        print(f"Não foi possível criar os índices: {str(e)}")
 
+    # Retoma remoções de categoria interrompidas por um restart
+    try:
+        await resume_pending_cleanups()
+    except Exception as e:
+        print(f"Não foi possível retomar remoções de categoria: {str(e)}")
+    yield
+    await shutdown_order_buffer()
+    await shutdown_live_hub()
+    shutdown_process_pool()
+    shutdown_tracing()
+
+app = FastAPI(title="E-commerce API", lifespan=lifespan)
+install_exception_handlers(app)
+
+# Adicionado antes do CORS para que as respostas 503 também recebam os cabeçalhos CORS
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+# Por último: o span da requisição cobre também o admission control
+app.add_middleware(TracingMiddleware)
 
 app.include_router(products_router, prefix="/api/v1/products", tags=["products"])
 app.include_router(categories_router, prefix="/api/v1/categories", tags=["categories"])
 app.include_router(orders_router, prefix="/api/v1/orders", tags=["orders"])
-app.include_router(dashboard_router, prefix="/api/v1/dashboard", tags=["dashboard"])
\ No newline at end of file
+app.include_router(dashboard_router, prefix="/api/v1/dashboard", tags=["dashboard"])
+app.include_router(exports_router, prefix="/api/v1/exports", tags=["exports"])
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return metrics.render()
@@ -2,6 +2,7 @@ from typing import List, Optional, Annotated, Any
 from pydantic import BaseModel, Field, BeforeValidator
 from datetime import datetime
 from bson import ObjectId
+from app.models.product import Product
 
 def convert_object_id(id: Any) -> str:
     if isinstance(id, ObjectId):
@@ -27,4 +28,8 @@ class Order(OrderBase):
     id: PydanticObjectId = Field(default_factory=lambda: str(ObjectId()), alias="_id")
 
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+class OrderWithProducts(Order):
+    """Pedido com ?expand=products: cada produto distinto do pedido, uma vez"""
+    products: List[Product] = []
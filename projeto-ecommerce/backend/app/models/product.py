@@ -1,5 +1,5 @@
-from typing import List, Optional, Annotated, Any
-from pydantic import BaseModel, Field, BeforeValidator
+from typing import Dict, List, Literal, Optional, Annotated, Any
+from pydantic import BaseModel, Field, BeforeValidator, model_validator
 from datetime import datetime
 from bson import ObjectId
 
@@ -20,6 +20,7 @@ class ProductBase(BaseModel):
     price: float
     category_ids: List[PydanticObjectId] = []
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, str]] = None
 
 class ProductCreate(ProductBase):
     pass
@@ -31,4 +32,89 @@ class Product(ProductBase):
     id: PydanticObjectId = Field(default_factory=lambda: str(ObjectId()), alias="_id")
 
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+class ProductPatch(BaseModel):
+    """Campos substituídos pela atualização em massa; os ausentes não mudam"""
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = Field(None, ge=0)
+    category_ids: Optional[List[PydanticObjectId]] = None
+    image_url: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_required_fields(self):
+        for name in ("name", "description", "price", "category_ids"):
+            if name in self.model_fields_set and getattr(self, name) is None:
+                raise ValueError(f"{name} cannot be null")
+        return self
+
+class ProductBulkFilter(BaseModel):
+    ids: Optional[List[PydanticObjectId]] = None
+    category_ids: Optional[List[PydanticObjectId]] = None
+
+class ProductBulkOperation(BaseModel):
+    """
+    Uma alteração aplicada a um produto (id) ou a todos os que atendem ao
+    filtro. price_multiplier=1.05 aplica +5%; o preço é arredondado em 2 casas.
+    """
+    id: Optional[PydanticObjectId] = None
+    filter: Optional[ProductBulkFilter] = None
+    set: Optional[ProductPatch] = None
+    price_multiplier: Optional[float] = Field(None, gt=0)
+    price_increment: Optional[float] = None
+    add_category_ids: Optional[List[PydanticObjectId]] = None
+    remove_category_ids: Optional[List[PydanticObjectId]] = None
+
+    @model_validator(mode="after")
+    def check_operation(self):
+        if (self.id is None) == (self.filter is None):
+            raise ValueError("Provide exactly one of id or filter")
+        if self.filter is not None and not (self.filter.ids or self.filter.category_ids):
+            raise ValueError("filter must have ids or category_ids")
+
+        patch = self.set.model_dump(exclude_unset=True) if self.set else {}
+        reprices = self.price_multiplier is not None or self.price_increment is not None
+        recategorizes = bool(self.add_category_ids or self.remove_category_ids)
+        if "price" in patch and reprices:
+            raise ValueError("set.price cannot be combined with price_multiplier or price_increment")
+        if "category_ids" in patch and recategorizes:
+            raise ValueError("set.category_ids cannot be combined with add/remove_category_ids")
+        if not (patch or reprices or recategorizes):
+            raise ValueError("Operation has no changes")
+        return self
+
+class ProductBulkUpdate(BaseModel):
+    operations: List[ProductBulkOperation] = Field(..., min_length=1, max_length=10000)
+
+class ProductBulkResult(BaseModel):
+    index: int
+    status: Literal["updated", "not_found", "error"]
+    matched: int = 0
+    error: Optional[str] = None
+
+class ProductBulkUpdateResponse(BaseModel):
+    matched: int
+    modified: int
+    results: List[ProductBulkResult]
+
+class RelatedProduct(BaseModel):
+    product_id: PydanticObjectId
+    count: int
+
+class PresignedUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    method: Literal["PUT", "POST"] = "PUT"
+    # Obrigatório no PUT: o tamanho é assinado na URL e o S3 recusa outro valor
+    size: Optional[int] = Field(None, gt=0)
+
+class PresignedUpload(BaseModel):
+    key: str
+    url: str
+    method: Literal["PUT", "POST"]
+    fields: Dict[str, str] = {}
+    expires_in: int
+
+class ImageUploadConfirm(BaseModel):
+    key: str
\ No newline at end of file
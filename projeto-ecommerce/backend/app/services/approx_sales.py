@@ -0,0 +1,198 @@
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, time
+from statistics import NormalDist
+from typing import Iterable, List, Optional, Tuple
+from pymongo.errors import ExecutionTimeout
+from app.core.config import settings
+
+def z_score(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+def sum_interval(values: Iterable[float], sample_size: int, population: int, z: float) -> Tuple[float, List[float]]:
+    """
+    Estima a soma de uma variável na população a partir de uma amostra aleatória
+    simples: `values` são os valores dos itens amostrados que atendem ao filtro
+    (os demais valem zero). Contagens são o caso particular com valores iguais a 1.
+    Retorna a estimativa e o intervalo de confiança (aproximação normal, com
+    correção de população finita).
+    """
+    values = list(values)
+    if sample_size == 0:
+        return 0, [0, 0]
+
+    mean = sum(values) / sample_size
+    estimate = population * mean
+    if sample_size < 2:
+        return estimate, [estimate, estimate]
+
+    variance = (sum(v * v for v in values) - sample_size * mean * mean) / (sample_size - 1)
+    fpc = (population - sample_size) / (population - 1) if population > 1 else 0
+    margin = z * population * math.sqrt(max(variance, 0) / sample_size * max(fpc, 0))
+
+    # Os itens amostrados existem de fato: o limite inferior não fica abaixo deles
+    observed = sum(values)
+    return estimate, [max(estimate - margin, observed), estimate + margin]
+
+def mean_interval(values: List[float], z: float) -> Tuple[float, List[float]]:
+    if not values:
+        return 0, [0, 0]
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, [mean, mean]
+    variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+    margin = z * math.sqrt(variance / len(values))
+    return mean, [mean - margin, mean + margin]
+
+def estimate_metrics(hits: List[dict], sample_size: int, population: int, z: float) -> Tuple[dict, dict]:
+    """
+    Métricas gerais a partir dos pedidos amostrados que atendem ao filtro.
+    min e max são os observados na amostra, sem intervalo: extremos não
+    podem ser estimados por amostragem.
+    """
+    totals = [order["total"] for order in hits]
+    total_orders, orders_interval = sum_interval([1] * len(hits), sample_size, population, z)
+    total_revenue, revenue_interval = sum_interval(totals, sample_size, population, z)
+    avg_order_value, avg_interval = mean_interval(totals, z)
+
+    metrics = {
+        "total_orders": round(total_orders),
+        "total_revenue": total_revenue,
+        "avg_order_value": avg_order_value,
+        "min_order_value": min(totals) if totals else 0,
+        "max_order_value": max(totals) if totals else 0
+    }
+    intervals = {
+        "total_orders": [math.floor(orders_interval[0]), math.ceil(orders_interval[1])],
+        "total_revenue": revenue_interval,
+        "avg_order_value": avg_interval
+    }
+    return metrics, intervals
+
+def estimate_time_series(hits: List[dict], sample_size: int, population: int, z: float) -> List[dict]:
+    """Série diária estimada, no mesmo formato da exata mais os intervalos"""
+    days = defaultdict(list)
+    for order in hits:
+        days[datetime.combine(order["date"].date(), time.min)].append(order["total"])
+
+    series = []
+    for day in sorted(days):
+        orders, orders_interval = sum_interval([1] * len(days[day]), sample_size, population, z)
+        revenue, revenue_interval = sum_interval(days[day], sample_size, population, z)
+        series.append({
+            "date": day,
+            "revenue": revenue,
+            "orders": round(orders),
+            "revenue_interval": revenue_interval,
+            "orders_interval": [math.floor(orders_interval[0]), math.ceil(orders_interval[1])]
+        })
+    return series
+
+def estimate_top_products(
+    hits: List[dict],
+    sample_size: int,
+    population: int,
+    product_ids: Optional[list] = None,
+    limit: int = 5
+) -> List[dict]:
+    """Top produtos da amostra com a mesma semântica do pipeline exato, escalados para a população"""
+    allowed = set(product_ids) if product_ids is not None else None
+    counts = Counter()
+    revenue = defaultdict(float)
+    for order in hits:
+        for product_id in order.get("product_ids", []):
+            if allowed is None or product_id in allowed:
+                counts[product_id] += 1
+                revenue[product_id] += order["total"]
+
+    scale = population / sample_size if sample_size else 0
+    return [
+        {
+            "_id": product_id,
+            "order_count": round(count * scale),
+            "total_revenue": revenue[product_id] * scale
+        }
+        for product_id, count in counts.most_common(limit)
+    ]
+
+def add_exact_part(metrics: dict, intervals: dict, time_series: List[dict], exact: dict):
+    """
+    Soma às estimativas uma parte conhecida exatamente (dias arquivados):
+    os intervalos de totais só se deslocam; o do ticket médio é recalculado
+    de forma conservadora a partir dos limites de receita e pedidos.
+    """
+    exact_metrics = exact["metrics"]
+    total_orders = metrics["total_orders"] + exact_metrics["total_orders"]
+    total_revenue = metrics["total_revenue"] + exact_metrics["total_revenue"]
+    orders_interval = [bound + exact_metrics["total_orders"] for bound in intervals["total_orders"]]
+    revenue_interval = [bound + exact_metrics["total_revenue"] for bound in intervals["total_revenue"]]
+
+    sources = [exact_metrics, metrics] if metrics["total_orders"] else [exact_metrics]
+    combined = {
+        "total_orders": total_orders,
+        "total_revenue": total_revenue,
+        "avg_order_value": total_revenue / total_orders if total_orders else 0,
+        "min_order_value": min((m["min_order_value"] for m in sources if m["min_order_value"] is not None), default=0),
+        "max_order_value": max((m["max_order_value"] for m in sources if m["max_order_value"] is not None), default=0)
+    }
+    combined_intervals = {
+        "total_orders": orders_interval,
+        "total_revenue": revenue_interval,
+        "avg_order_value": [
+            revenue_interval[0] / orders_interval[1] if orders_interval[1] else 0,
+            revenue_interval[1] / orders_interval[0] if orders_interval[0] else 0
+        ]
+    }
+
+    days = {row["date"]: dict(row) for row in time_series}
+    for row in exact["time_series"]:
+        day = days.setdefault(row["date"], {
+            "date": row["date"],
+            "revenue": 0,
+            "orders": 0,
+            "revenue_interval": [0, 0],
+            "orders_interval": [0, 0]
+        })
+        day["revenue"] += row["revenue"]
+        day["orders"] += row["orders"]
+        day["revenue_interval"] = [bound + row["revenue"] for bound in day["revenue_interval"]]
+        day["orders_interval"] = [bound + row["orders"] for bound in day["orders_interval"]]
+
+    return combined, combined_intervals, [days[day] for day in sorted(days)]
+
+async def is_small_range(orders_collection, match_stage: dict) -> bool:
+    """
+    Conta no máximo DASHBOARD_APPROX_EXACT_MAX_ORDERS pedidos: abaixo disso a
+    resposta exata é barata. Se nem a contagem cabe no orçamento de tempo, o
+    intervalo é grande o bastante para amostrar.
+    """
+    limit = settings.DASHBOARD_APPROX_EXACT_MAX_ORDERS
+    try:
+        count = await orders_collection.count_documents(
+            match_stage,
+            limit=limit + 1,
+            maxTimeMS=settings.DASHBOARD_APPROX_COUNT_MAX_TIME_MS
+        )
+    except ExecutionTimeout:
+        return False
+    return count <= limit
+
+async def sample_orders(orders_collection, match_stage: dict) -> Tuple[List[dict], int, int]:
+    """
+    $sample como primeiro estágio usa o cursor aleatório do WiredTiger: o custo
+    depende do tamanho da amostra e não do histórico. O filtro é aplicado depois,
+    sobre a amostra, e a população é a contagem estimada pelos metadados.
+    Retorna os pedidos amostrados que atendem ao filtro, o tamanho da amostra e
+    o da população.
+    """
+    population = await orders_collection.estimated_document_count()
+    if not population:
+        return [], 0, 0
+    sample_size = min(settings.DASHBOARD_APPROX_SAMPLE_SIZE, population)
+
+    hits = await orders_collection.aggregate([
+        {"$sample": {"size": sample_size}},
+        {"$match": match_stage},
+        {"$project": {"_id": 0, "date": 1, "total": 1, "product_ids": 1}}
+    ]).to_list(None)
+    return hits, sample_size, population
@@ -0,0 +1,149 @@
+import asyncio
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+from bson import ObjectId
+from app.core.database import get_collection
+from app.core.config import settings
+from app.services import orders_timeseries
+
+# Tarefas em execução, indexadas pelo id da categoria
+_running_tasks: Dict[str, asyncio.Task] = {}
+
+async def create_deletion_job(category_id: ObjectId) -> dict:
+    """
+    Registra o job de remoção da categoria.
+    O total é estimado no início apenas para o relatório de progresso.
+    """
+    products_collection = await get_collection("products")
+    jobs_collection = await get_collection("category_deletions")
+
+    total = await products_collection.count_documents({"category_ids": category_id})
+    job = {
+        "_id": category_id,
+        "status": "pending",
+        "total": total,
+        "processed": 0,
+        "started_at": datetime.utcnow(),
+        "finished_at": None,
+        "error": None
+    }
+    await jobs_collection.replace_one({"_id": category_id}, job, upsert=True)
+    return job
+
+async def get_deletion_job(category_id: ObjectId) -> Optional[dict]:
+    jobs_collection = await get_collection("category_deletions")
+    return await jobs_collection.find_one({"_id": category_id})
+
+async def pull_category_in_batches(
+    collection,
+    category_id: ObjectId,
+    batch_size: int,
+    throttle_seconds: float,
+    on_batch=None
+) -> int:
+    """
+    Remove o id da categoria de `collection` em lotes limitados.
+    Cada lote busca apenas os _id dos documentos ainda vinculados, então a
+    operação é idempotente e pode ser retomada do ponto onde parou.
+    """
+    processed = 0
+    while True:
+        batch = await collection.find(
+            {"category_ids": category_id},
+            {"_id": 1}
+        ).limit(batch_size).to_list(batch_size)
+
+        if not batch:
+            break
+
+        result = await collection.update_many(
+            {"_id": {"$in": [d["_id"] for d in batch]}},
+            {"$pull": {"category_ids": category_id}}
+        )
+        processed += result.modified_count
+
+        if on_batch is not None:
+            await on_batch(result.modified_count)
+
+        if throttle_seconds > 0:
+            await asyncio.sleep(throttle_seconds)
+
+    return processed
+
+async def run_category_cleanup(
+    category_id: ObjectId,
+    batch_size: Optional[int] = None,
+    throttle_seconds: Optional[float] = None
+) -> int:
+    """
+    Remove o id da categoria dos produtos e das categorias desnormalizadas
+    nos pedidos, em lotes limitados.
+    Retorna o número de produtos atualizados nesta execução.
+    """
+    batch_size = batch_size or settings.CATEGORY_CLEANUP_BATCH_SIZE
+    if throttle_seconds is None:
+        throttle_seconds = settings.CATEGORY_CLEANUP_THROTTLE_SECONDS
+
+    products_collection = await get_collection("products")
+    orders_collection = await get_collection("orders")
+    categories_collection = await get_collection("categories")
+    jobs_collection = await get_collection("category_deletions")
+
+    await jobs_collection.update_one(
+        {"_id": category_id},
+        {"$set": {"status": "running"}}
+    )
+
+    async def record_progress(modified_count):
+        await jobs_collection.update_one(
+            {"_id": category_id},
+            {"$inc": {"processed": modified_count}}
+        )
+
+    try:
+        processed = await pull_category_in_batches(
+            products_collection, category_id, batch_size, throttle_seconds, record_progress
+        )
+        await pull_category_in_batches(orders_collection, category_id, batch_size, throttle_seconds)
+        await orders_timeseries.pull_category(category_id)
+
+        await categories_collection.delete_one({"_id": category_id})
+        await jobs_collection.update_one(
+            {"_id": category_id},
+            {"$set": {"status": "completed", "finished_at": datetime.utcnow()}}
+        )
+    except Exception as e:
+        print(f"Erro na remoção da categoria {category_id}: {str(e)}", file=sys.stderr)
+        await jobs_collection.update_one(
+            {"_id": category_id},
+            {"$set": {"status": "failed", "error": str(e)}}
+        )
+        raise
+
+    return processed
+
+def schedule_category_cleanup(category_id: ObjectId) -> asyncio.Task:
+    """Agenda o job no event loop atual, evitando execuções duplicadas"""
+    key = str(category_id)
+    task = _running_tasks.get(key)
+    if task is not None and not task.done():
+        return task
+
+    task = asyncio.create_task(run_category_cleanup(category_id))
+    _running_tasks[key] = task
+    task.add_done_callback(lambda _: _running_tasks.pop(key, None))
+    return task
+
+async def resume_pending_cleanups() -> int:
+    """Retoma jobs interrompidos por um restart da aplicação"""
+    jobs_collection = await get_collection("category_deletions")
+    jobs = await jobs_collection.find(
+        {"status": {"$in": ["pending", "running"]}},
+        {"_id": 1}
+    ).to_list(None)
+
+    for job in jobs:
+        schedule_category_cleanup(job["_id"])
+
+    return len(jobs)
@@ -0,0 +1,69 @@
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from bson import ObjectId
+
+# Tamanho aproximado de cada bloco enviado ao cliente
+CHUNK_SIZE = 64 * 1024
+
+def encode_cursor(date: datetime, object_id: ObjectId = None) -> str:
+    """Token opaco com a posição do último registro exportado"""
+    raw = date.isoformat() + ("|" + str(object_id) if object_id else "")
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    padded = token + "=" * (-len(token) % 4)
+    raw = base64.urlsafe_b64decode(padded.encode()).decode()
+    date, _, object_id = raw.partition("|")
+    return datetime.fromisoformat(date), ObjectId(object_id) if object_id else None
+
+def _to_text(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [_to_text(v) for v in value]
+    return value
+
+async def serialize_rows(
+    rows: AsyncIterator[Dict[str, Any]],
+    columns: List[str],
+    export_format: str
+) -> AsyncIterator[bytes]:
+    """Converte documentos em CSV ou NDJSON, um bloco por vez"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if export_format == "csv":
+        writer.writerow(columns)
+
+    async for row in rows:
+        values = {column: _to_text(row.get(column)) for column in columns}
+
+        if export_format == "csv":
+            writer.writerow([
+                " ".join(v) if isinstance(v, list) else v
+                for v in values.values()
+            ])
+        else:
+            buffer.write(json.dumps(values) + "\n")
+
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31 = cabeçalho gzip
+    async for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+from app.core.database import get_collection
+from app.core.config import settings
+from app.core import metrics
+
+# Idempotency-Key: a primeira requisição com uma chave grava um registro
+# "pending" (o _id único funciona como trava entre processos), executa a rota
+# e guarda a resposta. Repetições recebem a resposta guardada sem reexecutar
+# nada. O índice TTL em expires_at remove os registros antigos.
+COLLECTION = "idempotency_keys"
+MAX_KEY_LENGTH = 255
+
+class ResponseCache:
+    """LRU em memória dos registros concluídos, na frente da coleção"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, dict]" = OrderedDict()
+
+    def get(self, record_id: str) -> Optional[dict]:
+        record = self._items.get(record_id)
+        if record is None:
+            return None
+        if record["expires_at"] <= datetime.utcnow():
+            del self._items[record_id]
+            return None
+        self._items.move_to_end(record_id)
+        return record
+
+    def put(self, record_id: str, record: dict):
+        self._items[record_id] = record
+        self._items.move_to_end(record_id)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+_cache = ResponseCache(settings.IDEMPOTENCY_CACHE_SIZE)
+
+# Execuções em andamento neste processo, para duplicatas esperarem pela primeira
+_in_flight: Dict[str, asyncio.Task] = {}
+
+def request_fingerprint(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def to_response(record: dict, fingerprint: str, replayed: bool) -> JSONResponse:
+    if record["fingerprint"] != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request"
+        )
+    headers = {"Idempotent-Replayed": "true"} if replayed else None
+    return JSONResponse(status_code=record["status_code"], content=record["body"], headers=headers)
+
+async def _run(collection, record_id: str, fingerprint: str, handler: Callable[[], Awaitable]) -> dict:
+    """Executa a rota com a trava obtida e grava a resposta"""
+    try:
+        status_code, body = 200, await handler()
+    except HTTPException as e:
+        if e.status_code >= 500:
+            await collection.delete_one({"_id": record_id, "status": "pending"})
+            raise
+        # Erros do cliente (ex.: produto inexistente) também são repetidos tal como foram
+        status_code, body = e.status_code, {"detail": e.detail}
+    except BaseException:
+        # Sem resposta definitiva: libera a chave para a próxima tentativa
+        await collection.delete_one({"_id": record_id, "status": "pending"})
+        raise
+
+    now = datetime.utcnow()
+    record = {
+        "status": "completed",
+        "fingerprint": fingerprint,
+        "status_code": status_code,
+        "body": body,
+        "completed_at": now,
+        "expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    }
+    await collection.update_one({"_id": record_id}, {"$set": record})
+    return record
+
+async def _claim_or_wait(record_id: str, fingerprint: str, handler: Callable[[], Awaitable]) -> Tuple[dict, bool]:
+    """
+    Obtém a trava da chave ou espera quem a tem (outro processo) concluir.
+    Retorna o registro e se ele veio de uma execução anterior. Uma trava
+    "pending" mais velha que IDEMPOTENCY_PENDING_TIMEOUT_SECONDS é de um
+    processo que caiu e pode ser assumida.
+    """
+    collection = await get_collection(COLLECTION, "transactional", budget="write")
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+
+    while True:
+        now = datetime.utcnow()
+        try:
+            await collection.insert_one({
+                "_id": record_id,
+                "status": "pending",
+                "fingerprint": fingerprint,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+            })
+            return await _run(collection, record_id, fingerprint, handler), False
+        except DuplicateKeyError:
+            pass
+
+        record = await collection.find_one({"_id": record_id})
+        if record is not None:
+            if record["status"] == "completed" or record["fingerprint"] != fingerprint:
+                return record, True
+
+            stale_before = now - timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT_SECONDS)
+            if record["created_at"] < stale_before:
+                taken = await collection.find_one_and_update(
+                    {"_id": record_id, "status": "pending", "created_at": record["created_at"]},
+                    {"$set": {"created_at": now}}
+                )
+                if taken is not None:
+                    return await _run(collection, record_id, fingerprint, handler), False
+
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress"
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+async def execute(scope: str, key: str, payload, handler: Callable[[], Awaitable]) -> JSONResponse:
+    """
+    Executa handler uma única vez por (scope, key). handler deve retornar o
+    corpo da resposta já serializável em JSON.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must have 1 to {MAX_KEY_LENGTH} characters")
+
+    record_id = f"{scope}:{key}"
+    fingerprint = request_fingerprint(payload)
+
+    if (record := _cache.get(record_id)) is not None:
+        metrics.inc("idempotency_requests_total", scope=scope, result="cache_hit")
+        return to_response(record, fingerprint, replayed=True)
+
+    task = _in_flight.get(record_id)
+    replayed = task is not None
+    if task is None:
+        # Task própria: se o cliente desconectar, as duplicatas à espera ainda recebem o resultado
+        task = asyncio.create_task(_claim_or_wait(record_id, fingerprint, handler))
+        _in_flight[record_id] = task
+        task.add_done_callback(lambda t: _in_flight.pop(record_id, None) if _in_flight.get(record_id) is t else None)
+
+    record, stored = await asyncio.shield(task)
+    if record["status"] == "completed":
+        _cache.put(record_id, record)
+
+    replayed = replayed or stored
+    metrics.inc("idempotency_requests_total", scope=scope, result="replay" if replayed else "new")
+    return to_response(record, fingerprint, replayed)
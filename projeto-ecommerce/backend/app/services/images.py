@@ -0,0 +1,71 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from PIL import Image
+from app.core.config import settings
+
+CONTENT_TYPES = {
+    "WEBP": "image/webp",
+    "JPEG": "image/jpeg",
+    "PNG": "image/png"
+}
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def generate_variants(
+    data: bytes,
+    sizes: Dict[str, int],
+    image_format: str = "WEBP",
+    quality: int = 80
+) -> Dict[str, bytes]:
+    """
+    Decodifica a imagem uma única vez e gera as variantes redimensionadas.
+    Executa dentro do process pool, por isso recebe e devolve apenas bytes.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+
+        variants = {}
+        # Da maior para a menor, reaproveitando a redução anterior
+        current = source
+        for name, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+            current = current.copy()
+            current.thumbnail((size, size), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            current.save(buffer, format=image_format, quality=quality)
+            variants[name] = buffer.getvalue()
+
+    return variants
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        workers = settings.IMAGE_PROCESS_WORKERS or os.cpu_count() or 1
+        _process_pool = ProcessPoolExecutor(max_workers=workers)
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+async def build_variants(data: bytes) -> Dict[str, bytes]:
+    """Gera as variantes configuradas fora do event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_process_pool(),
+        generate_variants,
+        data,
+        settings.IMAGE_VARIANTS,
+        settings.IMAGE_VARIANT_FORMAT,
+        settings.IMAGE_VARIANT_QUALITY
+    )
+
+def variant_extension(image_format: str) -> str:
+    return image_format.lower().replace("jpeg", "jpg")
@@ -0,0 +1,255 @@
+import asyncio
+import sys
+from datetime import datetime
+from typing import Dict, Optional, Set
+from bson.timestamp import Timestamp
+from app.core.database import get_database
+from app.core.config import settings
+
+def _day(date: datetime) -> str:
+    return date.strftime("%Y-%m-%d")
+
+class LiveSalesMetrics:
+    """
+    Métricas de vendas mantidas em memória e atualizadas por deltas.
+    min/max não podem ser desfeitos incrementalmente: quando o pedido
+    removido era o extremo, a próxima leitura exige um resync.
+    """
+
+    def __init__(self):
+        self.total_orders = 0
+        self.total_revenue = 0.0
+        self.min_order_value: Optional[float] = None
+        self.max_order_value: Optional[float] = None
+        self.daily: Dict[str, Dict[str, float]] = {}
+        self.needs_resync = False
+
+    def load(self, metrics: dict, time_series: list):
+        self.total_orders = metrics.get("total_orders", 0)
+        self.total_revenue = metrics.get("total_revenue", 0.0)
+        self.min_order_value = metrics.get("min_order_value")
+        self.max_order_value = metrics.get("max_order_value")
+        self.daily = {
+            _day(day["date"]): {"revenue": day["revenue"], "orders": day["orders"]}
+            for day in time_series
+        }
+        self.needs_resync = False
+
+    def add(self, order: dict) -> str:
+        total = order.get("total", 0)
+        day = _day(order["date"])
+
+        self.total_orders += 1
+        self.total_revenue += total
+        self.min_order_value = total if self.min_order_value is None else min(self.min_order_value, total)
+        self.max_order_value = total if self.max_order_value is None else max(self.max_order_value, total)
+
+        bucket = self.daily.setdefault(day, {"revenue": 0.0, "orders": 0})
+        bucket["revenue"] += total
+        bucket["orders"] += 1
+        return day
+
+    def remove(self, order: dict) -> str:
+        total = order.get("total", 0)
+        day = _day(order["date"])
+
+        self.total_orders -= 1
+        self.total_revenue -= total
+        if total in (self.min_order_value, self.max_order_value):
+            self.needs_resync = True
+
+        bucket = self.daily.get(day)
+        if bucket:
+            bucket["revenue"] -= total
+            bucket["orders"] -= 1
+            if bucket["orders"] <= 0:
+                del self.daily[day]
+        return day
+
+    def metrics(self) -> dict:
+        return {
+            "total_orders": self.total_orders,
+            "total_revenue": self.total_revenue,
+            "avg_order_value": self.total_revenue / self.total_orders if self.total_orders else 0,
+            "min_order_value": self.min_order_value or 0,
+            "max_order_value": self.max_order_value or 0
+        }
+
+    def time_series(self, days=None) -> list:
+        keys = sorted(self.daily) if days is None else sorted(d for d in days if d in self.daily)
+        return [{"date": day, **self.daily[day]} for day in keys]
+
+class LiveDashboardHub:
+    """
+    Um único change stream em "orders" alimenta as métricas em memória e
+    distribui as atualizações para todos os dashboards conectados.
+    """
+
+    def __init__(self):
+        self.state = LiveSalesMetrics()
+        self.subscribers: Set[asyncio.Queue] = set()
+        self._changed_days: Set[str] = set()
+        self._dirty = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._tasks = []
+        self._resume_token = None
+
+    async def resync(self, db) -> Timestamp:
+        """
+        Recarrega o estado com uma leitura snapshot e retorna o instante logo
+        após ela, de onde o change stream deve começar: eventos contidos no
+        snapshot não são aplicados de novo e nenhum posterior fica de fora.
+        """
+        # Import tardio para evitar import circular com o router do dashboard
+        from app.api.v1.dashboard import EMPTY_METRICS, time_series_stages
+
+        async with await db.client.start_session(snapshot=True) as session:
+            metrics = await db.orders.aggregate([{
+                "$group": {
+                    "_id": None,
+                    "total_orders": {"$sum": 1},
+                    "total_revenue": {"$sum": "$total"},
+                    "min_order_value": {"$min": "$total"},
+                    "max_order_value": {"$max": "$total"}
+                }
+            }], session=session).to_list(1)
+            time_series = await db.orders.aggregate(time_series_stages(), session=session).to_list(None)
+            # Em leituras snapshot o operationTime é o instante lido (atClusterTime)
+            snapshot_time = session.operation_time
+
+        # Sem pedidos não há extremos: o primeiro insert define min e max
+        empty = {**EMPTY_METRICS, "min_order_value": None, "max_order_value": None}
+        self.state.load(metrics[0] if metrics else empty, time_series)
+        self._changed_days.clear()
+        return Timestamp(snapshot_time.time, snapshot_time.inc + 1)
+
+    def apply_change(self, change: dict):
+        operation = change["operationType"]
+        before = change.get("fullDocumentBeforeChange")
+        after = change.get("fullDocument")
+
+        if operation in ("update", "replace", "delete"):
+            if before is None:
+                # Sem pre-image não há como desfazer o valor antigo
+                self.state.needs_resync = True
+                return
+            self._changed_days.add(self.state.remove(before))
+
+        if operation in ("insert", "update", "replace") and after is not None:
+            self._changed_days.add(self.state.add(after))
+
+        if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            self.state.needs_resync = True
+
+    async def _watch(self):
+        db = await get_database()
+        try:
+            # Pre-images permitem aplicar updates e deletes como deltas (MongoDB 6+)
+            await db.command({"collMod": "orders", "changeStreamPreAndPostImages": {"enabled": True}})
+        except Exception as e:
+            print(f"Pre-images indisponíveis para orders: {str(e)}", file=sys.stderr)
+
+        failures = 0
+        while True:
+            try:
+                start_at = None
+                if self._resume_token is None:
+                    # Sem token não sabemos o que foi perdido: recarrega tudo antes
+                    # de abrir o stream, que continua a partir do snapshot
+                    start_at = await self.resync(db)
+                    self._ready.set()
+                    self._publish("snapshot", self.snapshot())
+
+                watch_options = {"resume_after": self._resume_token} if start_at is None \
+                    else {"start_at_operation_time": start_at}
+                async with db.orders.watch(
+                    full_document="updateLookup",
+                    full_document_before_change="whenAvailable",
+                    **watch_options
+                ) as stream:
+                    failures = 0
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self.apply_change(change)
+                        if self.state.needs_resync:
+                            # O estado é recarregado aqui, com o stream parado: nenhuma
+                            # mudança é aplicada durante o load nem contada duas vezes
+                            self._resume_token = None
+                            break
+                        self._dirty.set()
+
+                if self.state.needs_resync:
+                    # Agrupa rajadas de mudanças que exigem resync
+                    await asyncio.sleep(settings.LIVE_DASHBOARD_PUSH_INTERVAL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Change stream de orders interrompido: {str(e)}", file=sys.stderr)
+                failures += 1
+                if failures > 1:
+                    # O token pode ter saído do oplog; recomeça do zero
+                    self._resume_token = None
+                await asyncio.sleep(settings.LIVE_DASHBOARD_RETRY_SECONDS)
+
+    async def _flush(self):
+        """Agrupa as mudanças e envia no máximo uma atualização por intervalo"""
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(settings.LIVE_DASHBOARD_PUSH_INTERVAL_SECONDS)
+            self._dirty.clear()
+
+            if self.state.needs_resync:
+                # O watcher recarrega o estado e publica um snapshot
+                continue
+
+            days, self._changed_days = self._changed_days, set()
+            self._publish("update", {
+                "metrics": self.state.metrics(),
+                "time_series": self.state.time_series(days)
+            })
+
+    def snapshot(self) -> dict:
+        return {"metrics": self.state.metrics(), "time_series": self.state.time_series()}
+
+    def _publish(self, event: str, data: dict):
+        for queue in list(self.subscribers):
+            if queue.full():
+                # Cliente lento: descarta a mensagem mais antiga
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._watch()),
+                asyncio.create_task(self._flush())
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def subscribe(self) -> asyncio.Queue:
+        self.start()
+        queue = asyncio.Queue(maxsize=settings.LIVE_DASHBOARD_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self._ready.is_set():
+            queue.put_nowait(("snapshot", self.snapshot()))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+_hub: Optional[LiveDashboardHub] = None
+
+def get_live_hub() -> LiveDashboardHub:
+    global _hub
+    if _hub is None:
+        _hub = LiveDashboardHub()
+    return _hub
+
+async def shutdown_live_hub():
+    if _hub is not None:
+        await _hub.stop()
@@ -0,0 +1,360 @@
+import hashlib
+import io
+import os
+import sys
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+from pymongo import ASCENDING
+from app.core.database import get_collection
+from app.core.config import settings
+from app.core.aws import get_s3_client
+from app.core.resilience import s3_breaker
+from app.services import orders_timeseries
+
+# Pedidos mais antigos que o horizonte saem do Mongo para arquivos Parquet
+# particionados por dia (orders/date=AAAA-MM-DD/part-*.parquet). Cada dia
+# arquivado tem um resumo em orders_archive_summary, usado pelo dashboard.
+# pyarrow é importado só quando um arquivo é lido ou escrito.
+SUMMARY_COLLECTION = "orders_archive_summary"
+ARCHIVE_COLUMNS = ["date", "total", "product_ids", "category_ids"]
+
+# A Lambda lê os últimos 30 dias direto de orders
+MIN_HORIZON_DAYS = 31
+
+def _day(date: datetime) -> datetime:
+    return datetime.combine(date.date(), time.min)
+
+class LocalArchiveStore:
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, key: str, data: bytes):
+        destination = os.path.join(self.path, key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # Escrita atômica: um arquivo pela metade nunca fica visível
+        temporary = f"{destination}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, destination)
+
+    def read(self, key: str) -> bytes:
+        with open(os.path.join(self.path, key), "rb") as file:
+            return file.read()
+
+class S3ArchiveStore:
+    def __init__(self, bucket: str, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def write(self, key: str, data: bytes):
+        s3_breaker.call(
+            get_s3_client().put_object,
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}",
+            Body=data,
+            ContentType="application/vnd.apache.parquet"
+        )
+
+    def _get(self, key: str) -> bytes:
+        response = get_s3_client().get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}")
+        return response["Body"].read()
+
+    def read(self, key: str) -> bytes:
+        # O corpo é lido dentro do circuito: a falha pode vir no meio do download
+        return s3_breaker.call(self._get, key)
+
+def get_archive_store():
+    if settings.ORDERS_ARCHIVE_BACKEND == "s3":
+        return S3ArchiveStore(settings.S3_BUCKET_NAME, settings.ORDERS_ARCHIVE_S3_PREFIX)
+    return LocalArchiveStore(settings.ORDERS_ARCHIVE_PATH)
+
+def part_key(day: datetime, orders: List[dict]) -> str:
+    """
+    O nome do arquivo deriva dos _id arquivados: rodar o job de novo após uma
+    falha entre a escrita do resumo e a remoção dos pedidos não conta duas vezes.
+    """
+    digest = hashlib.sha1("".join(sorted(str(o["_id"]) for o in orders)).encode()).hexdigest()
+    return f"orders/date={day:%Y-%m-%d}/part-{digest[:16]}.parquet"
+
+def orders_to_parquet(orders: List[dict]) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({
+        "order_id": pa.array([str(o["_id"]) for o in orders], pa.string()),
+        "date": pa.array([o["date"] for o in orders], pa.timestamp("ms")),
+        "total": pa.array([float(o.get("total", 0)) for o in orders], pa.float64()),
+        "status": pa.array([o.get("status") for o in orders], pa.string()),
+        "customer_name": pa.array([o.get("customer_name") for o in orders], pa.string()),
+        "product_ids": pa.array(
+            [[str(p) for p in o.get("product_ids", [])] for o in orders], pa.list_(pa.string())
+        ),
+        "category_ids": pa.array(
+            [[str(c) for c in o.get("category_ids", [])] for o in orders], pa.list_(pa.string())
+        )
+    })
+
+    sink = io.BytesIO()
+    pq.write_table(table, sink, compression=settings.ORDERS_ARCHIVE_COMPRESSION)
+    return sink.getvalue()
+
+def summarize(orders: List[dict]) -> dict:
+    totals = [o.get("total", 0) for o in orders]
+    return {
+        "orders": len(totals),
+        "revenue": sum(totals),
+        "min_order_value": min(totals),
+        "max_order_value": max(totals)
+    }
+
+async def archivable_days(cutoff: datetime) -> List[datetime]:
+    orders_collection = await get_collection("orders")
+    rows = await orders_collection.aggregate([
+        {"$match": {"date": {"$lt": cutoff}}},
+        {"$group": {"_id": {"$dateTrunc": {"date": "$date", "unit": "day"}}}},
+        {"$sort": {"_id": ASCENDING}}
+    ]).to_list(None)
+    return [row["_id"] for row in rows]
+
+def archived_order_ids(data: bytes) -> List[ObjectId]:
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(data), columns=["order_id"])
+    return [ObjectId(order_id) for order_id in table["order_id"].to_pylist()]
+
+async def delete_archived_orders(order_ids: List[ObjectId]):
+    orders_collection = await get_collection("orders")
+    for start in range(0, len(order_ids), 1000):
+        await orders_collection.delete_many({"_id": {"$in": order_ids[start:start + 1000]}})
+    await orders_timeseries.delete_orders(order_ids)
+
+async def archive_day(day: datetime, store=None) -> dict:
+    """
+    Arquiva um dia: grava o Parquet, soma o resumo e só então remove os
+    pedidos do Mongo. Pedidos que chegarem depois para um dia já arquivado
+    viram um novo arquivo na próxima execução.
+    """
+    store = store or get_archive_store()
+    orders_collection = await get_collection("orders")
+    summary_collection = await get_collection(SUMMARY_COLLECTION)
+
+    summary = await summary_collection.find_one({"_id": day}, {"files": 1, "pending_delete": 1})
+    if summary and summary.get("pending_delete"):
+        # A execução anterior parou no meio da remoção: os pedidos que sobraram
+        # já estão naquele arquivo e não podem ir para um novo
+        data = await run_in_threadpool(store.read, summary["pending_delete"])
+        await delete_archived_orders(await run_in_threadpool(archived_order_ids, data))
+        await summary_collection.update_one({"_id": day}, {"$unset": {"pending_delete": ""}})
+
+    orders = await orders_collection.find(
+        {"date": {"$gte": day, "$lt": day + timedelta(days=1)}}
+    ).to_list(None)
+    if not orders:
+        return {"orders": 0}
+
+    key = part_key(day, orders)
+    stats = summarize(orders)
+
+    if summary is None or key not in summary.get("files", []):
+        data = await run_in_threadpool(orders_to_parquet, orders)
+        await run_in_threadpool(store.write, key, data)
+        # pending_delete marca o arquivo cujos pedidos ainda estão sendo removidos
+        await summary_collection.update_one(
+            {"_id": day},
+            {
+                "$inc": {"orders": stats["orders"], "revenue": stats["revenue"], "bytes": len(data)},
+                "$min": {"min_order_value": stats["min_order_value"]},
+                "$max": {"max_order_value": stats["max_order_value"]},
+                "$push": {"files": key},
+                "$set": {"archived_at": datetime.utcnow(), "pending_delete": key}
+            },
+            upsert=True
+        )
+
+    # Os contadores de product_sales_daily ficam: o top de produtos de dias
+    # arquivados continua vindo deles
+    await delete_archived_orders([o["_id"] for o in orders])
+    await summary_collection.update_one({"_id": day}, {"$unset": {"pending_delete": ""}})
+
+    return stats
+
+async def run_archive(horizon_days: Optional[int] = None, dry_run: bool = False) -> dict:
+    horizon_days = horizon_days or settings.ORDERS_ARCHIVE_HORIZON_DAYS
+    if horizon_days < MIN_HORIZON_DAYS:
+        raise ValueError(f"Archive horizon must be at least {MIN_HORIZON_DAYS} days")
+
+    cutoff = _day(datetime.utcnow() - timedelta(days=horizon_days))
+    days = await archivable_days(cutoff)
+    report = {"cutoff": cutoff, "days": len(days), "orders": 0}
+
+    if dry_run:
+        return report
+
+    store = get_archive_store()
+    for day in days:
+        try:
+            report["orders"] += (await archive_day(day, store))["orders"]
+        except Exception as e:
+            print(f"Erro ao arquivar pedidos de {day:%Y-%m-%d}: {str(e)}", file=sys.stderr)
+            raise
+    return report
+
+async def archive_watermark() -> Optional[datetime]:
+    """Dia seguinte ao último dia arquivado (None se nada foi arquivado)"""
+    summary_collection = await get_collection(SUMMARY_COLLECTION)
+    last = await summary_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return last["_id"] + timedelta(days=1) if last else None
+
+def filter_rows(table, product_ids: Optional[List[str]], category_ids: Optional[List[str]]):
+    """Aplica os filtros de produto/categoria de forma vetorizada"""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for column, values in (("product_ids", product_ids), ("category_ids", category_ids)):
+        if values:
+            lists = table[column].combine_chunks()
+            hits = pc.is_in(pc.list_flatten(lists), value_set=pa.array(values, pa.string()))
+            rows = pc.filter(pc.list_parent_indices(lists), hits).to_numpy()
+            mask = np.zeros(len(table), dtype=bool)
+            mask[rows] = True
+            table = table.filter(pa.array(mask))
+
+    return table
+
+def read_archived_metrics(store, keys: List[str], product_ids: Optional[List[str]], category_ids: Optional[List[str]]) -> dict:
+    """
+    Lê os arquivos um de cada vez, somando as métricas parciais de cada um:
+    a memória fica limitada ao maior arquivo, qualquer que seja o intervalo.
+    """
+    import pyarrow.parquet as pq
+
+    result = {"days": {}, "min_order_value": None, "max_order_value": None}
+    for key in keys:
+        table = pq.read_table(io.BytesIO(store.read(key)), columns=ARCHIVE_COLUMNS)
+        merge_metrics(result, rows_to_metrics(filter_rows(table, product_ids, category_ids)))
+    return result
+
+def merge_metrics(result: dict, partial: dict):
+    """Soma em result as métricas por dia e os extremos de um arquivo"""
+    for day, values in partial["days"].items():
+        bucket = result["days"].setdefault(day, {"revenue": 0.0, "orders": 0})
+        bucket["revenue"] += values["revenue"]
+        bucket["orders"] += values["orders"]
+    for key, pick in (("min_order_value", min), ("max_order_value", max)):
+        if partial[key] is not None:
+            result[key] = partial[key] if result[key] is None else pick(result[key], partial[key])
+
+def rows_to_metrics(table) -> dict:
+    import pyarrow.compute as pc
+
+    if len(table) == 0:
+        return {"days": {}, "min_order_value": None, "max_order_value": None}
+
+    by_day = table.append_column(
+        "day", pc.floor_temporal(table["date"], unit="day")
+    ).group_by("day").aggregate([("total", "sum"), ("total", "count")])
+
+    return {
+        "days": {
+            day: {"revenue": revenue, "orders": orders}
+            for day, revenue, orders in zip(
+                by_day["day"].to_pylist(), by_day["total_sum"].to_pylist(), by_day["total_count"].to_pylist()
+            )
+        },
+        "min_order_value": pc.min(table["total"]).as_py(),
+        "max_order_value": pc.max(table["total"]).as_py()
+    }
+
+async def archived_sales(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    product_ids: Optional[List[str]] = None,
+    category_ids: Optional[List[str]] = None
+) -> Optional[dict]:
+    """
+    Métricas dos dias arquivados dentro do intervalo, com granularidade
+    diária. Sem filtros usa só os resumos; com filtros lê os arquivos dos
+    dias do intervalo. Retorna None quando nenhum dia arquivado é afetado.
+    """
+    summary_collection = await get_collection(SUMMARY_COLLECTION, "analytics", budget="dashboard")
+    day_filter = {}
+    if start_date:
+        day_filter["$gte"] = _day(start_date)
+    if end_date:
+        day_filter["$lte"] = _day(end_date)
+
+    summaries = await summary_collection.find(
+        {"_id": day_filter} if day_filter else {}
+    ).sort("_id", ASCENDING).to_list(None)
+    if not summaries:
+        return None
+
+    if not product_ids and not category_ids:
+        days = {s["_id"]: {"revenue": s["revenue"], "orders": s["orders"]} for s in summaries}
+        minimum = min(s["min_order_value"] for s in summaries)
+        maximum = max(s["max_order_value"] for s in summaries)
+    else:
+        store = get_archive_store()
+        keys = [key for s in summaries for key in s.get("files", [])]
+        result = await run_in_threadpool(read_archived_metrics, store, keys, product_ids, category_ids)
+        days, minimum, maximum = result["days"], result["min_order_value"], result["max_order_value"]
+
+    total_orders = sum(d["orders"] for d in days.values())
+    total_revenue = sum(d["revenue"] for d in days.values())
+    return {
+        "days": [s["_id"] for s in summaries],
+        "metrics": {
+            "total_orders": total_orders,
+            "total_revenue": total_revenue,
+            "min_order_value": minimum,
+            "max_order_value": maximum
+        },
+        "time_series": [
+            {"date": day, "revenue": values["revenue"], "orders": values["orders"]}
+            for day, values in sorted(days.items())
+            if values["orders"]
+        ]
+    }
+
+def combine_metrics(live: dict, archived: dict) -> dict:
+    """Soma as métricas do Mongo com as dos dias arquivados"""
+    total_orders = live.get("total_orders", 0) + archived["total_orders"]
+    total_revenue = live.get("total_revenue", 0) + archived["total_revenue"]
+
+    # Sem pedidos no Mongo, o 0 de EMPTY_METRICS não é um valor real
+    sources = [archived, live] if live.get("total_orders") else [archived]
+    minimums = [m["min_order_value"] for m in sources if m.get("min_order_value") is not None]
+    maximums = [m["max_order_value"] for m in sources if m.get("max_order_value") is not None]
+
+    return {
+        "total_orders": total_orders,
+        "total_revenue": total_revenue,
+        "avg_order_value": total_revenue / total_orders if total_orders else 0,
+        "min_order_value": min(minimums, default=0),
+        "max_order_value": max(maximums, default=0)
+    }
+
+def combine_time_series(live: List[dict], archived: List[dict]) -> List[dict]:
+    """Junta as séries; um dia arquivado pode ter pedidos atrasados ainda no Mongo"""
+    days: Dict[datetime, dict] = {}
+    for row in archived + live:
+        day = days.setdefault(row["date"], {"date": row["date"], "revenue": 0, "orders": 0})
+        day["revenue"] += row["revenue"]
+        day["orders"] += row["orders"]
+    return [days[day] for day in sorted(days)]
+
+def merge_product_totals(*groups: List[dict]) -> List[dict]:
+    """
+    Junta agrupamentos por produto (_id, order_count, total_revenue) de fontes
+    diferentes e ordena como o ranking do dashboard.
+    """
+    merged: Dict[object, dict] = {}
+    for group in groups:
+        for row in group:
+            product = merged.setdefault(row["_id"], {"_id": row["_id"], "order_count": 0, "total_revenue": 0})
+            product["order_count"] += row["order_count"]
+            product["total_revenue"] += row["total_revenue"]
+    return sorted(merged.values(), key=lambda p: (-p["order_count"], str(p["_id"])))
@@ -0,0 +1,98 @@
+import asyncio
+import sys
+from typing import Dict, Iterable, List
+from bson import ObjectId
+from app.core.database import get_collection
+from app.services import orders_timeseries
+
+# Pedidos guardam a união das categorias dos seus produtos (campo category_ids,
+# com índice multikey), para o filtro por categoria do dashboard rodar no banco.
+
+# Recalculos em execução, indexados pelo id do produto
+_running_tasks: Dict[str, asyncio.Task] = {}
+
+def order_category_ids(products: Iterable[dict]) -> List[ObjectId]:
+    """União ordenada das categorias dos produtos do pedido"""
+    return sorted({cid for product in products for cid in product.get("category_ids", [])})
+
+def refresh_pipeline(match: dict) -> List[dict]:
+    """
+    Recalcula category_ids dos pedidos selecionados por `match` inteiramente
+    no servidor: $lookup nos produtos e $merge de volta em orders.
+    """
+    return [
+        {"$match": match},
+        {"$project": {"product_ids": 1}},
+        {
+            "$lookup": {
+                "from": "products",
+                "localField": "product_ids",
+                "foreignField": "_id",
+                "as": "products"
+            }
+        },
+        {
+            "$project": {
+                "category_ids": {
+                    "$reduce": {
+                        "input": "$products.category_ids",
+                        "initialValue": [],
+                        "in": {"$setUnion": ["$$value", {"$ifNull": ["$$this", []]}]}
+                    }
+                }
+            }
+        },
+        {
+            "$merge": {
+                "into": "orders",
+                "on": "_id",
+                "whenMatched": "merge",
+                "whenNotMatched": "discard"
+            }
+        }
+    ]
+
+async def refresh_orders(match: dict):
+    orders_collection = await get_collection("orders")
+    await orders_collection.aggregate(refresh_pipeline(match), allowDiskUse=True).to_list(None)
+
+async def refresh_orders_for_products(product_ids: List[ObjectId], previous: Iterable[asyncio.Task] = ()):
+    # Um recálculo já em andamento pode ter lido as categorias antigas:
+    # espera por ele e roda de novo
+    previous = list(previous)
+    if previous:
+        await asyncio.gather(*previous, return_exceptions=True)
+
+    match = {"product_ids": product_ids[0]} if len(product_ids) == 1 else {"product_ids": {"$in": product_ids}}
+    try:
+        await refresh_orders(match)
+        await orders_timeseries.resync_orders(match)
+    except Exception as e:
+        print(f"Erro ao atualizar categorias dos pedidos dos produtos {product_ids}: {str(e)}", file=sys.stderr)
+        raise
+
+def schedule_refresh_for_products(product_ids: List[ObjectId]) -> asyncio.Task:
+    """
+    Agenda um único recálculo dos pedidos que contêm os produtos, após mudança
+    nas categorias ou remoção (inclusive em massa).
+    """
+    keys = [str(product_id) for product_id in product_ids]
+    previous = {
+        id(task): task for key in keys
+        if (task := _running_tasks.get(key)) is not None and not task.done()
+    }
+
+    task = asyncio.create_task(refresh_orders_for_products(list(product_ids), previous.values()))
+    for key in keys:
+        _running_tasks[key] = task
+
+    def forget(done_task):
+        for key in keys:
+            if _running_tasks.get(key) is done_task:
+                del _running_tasks[key]
+
+    task.add_done_callback(forget)
+    return task
+
+def schedule_refresh_for_product(product_id: ObjectId) -> asyncio.Task:
+    return schedule_refresh_for_products([product_id])
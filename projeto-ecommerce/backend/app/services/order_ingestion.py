@@ -0,0 +1,123 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, WriteError
+from app.core.database import get_collection
+from app.core.config import settings
+from app.core import metrics
+from app.services import orders_timeseries, sales_counters
+
+# Group commit de pedidos: em picos de escrita, os inserts de requisições
+# concorrentes são juntados por alguns milissegundos (ou até encher o lote) e
+# gravados com um único insert_many. Cada requisição espera o resultado do
+# seu próprio documento.
+
+BatchWriter = Callable[[List[dict]], Awaitable[List[Optional[Exception]]]]
+
+class GroupCommitBuffer:
+    """
+    Acumula documentos e chama write_batch com o lote a cada window_ms ou
+    quando max_batch documentos se juntam. write_batch devolve, para cada
+    documento, None ou a exceção daquele documento.
+    """
+
+    def __init__(self, name: str, write_batch: BatchWriter, window_ms: float, max_batch: int):
+        self.name = name
+        self.write_batch = write_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    async def submit(self, document: dict) -> ObjectId:
+        """
+        Enfileira o documento e espera o lote ser gravado. Se a requisição for
+        cancelada, o documento ainda é gravado com o lote, como um insert já enviado.
+        """
+        document.setdefault("_id", ObjectId())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((document, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+
+        await future
+        return document["_id"]
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        metrics.observe("group_commit_batch_size", len(batch), buffer=self.name)
+        try:
+            errors = await self.write_batch([document for document, _ in batch])
+        except Exception as e:
+            metrics.inc("group_commit_failed_batches_total", buffer=self.name)
+            errors = [e] * len(batch)
+
+        for (_, future), error in zip(batch, errors):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    async def close(self):
+        """Grava o que estiver pendente e espera os lotes em andamento"""
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+def parse_write_concern(value: str) -> WriteConcern:
+    """"1", "majority" ou "majority:j" (com journal)"""
+    w, _, journal = value.partition(":")
+    return WriteConcern(w=int(w) if w.isdigit() else w, j=True if journal == "j" else None)
+
+async def write_orders(orders: List[dict]) -> List[Optional[Exception]]:
+    """Um insert_many para o lote, depois contadores e cópia analítica também em lote"""
+    collection = (await get_collection("orders")).with_options(
+        write_concern=parse_write_concern(settings.ORDER_INGESTION_WRITE_CONCERN)
+    )
+
+    errors: List[Optional[Exception]] = [None] * len(orders)
+    try:
+        await collection.insert_many(orders, ordered=False)
+    except BulkWriteError as e:
+        # Sem ordered, os demais documentos do lote são gravados normalmente
+        for error in e.details.get("writeErrors", []):
+            errors[error["index"]] = WriteError(error.get("errmsg"), error.get("code"), error)
+
+    written = [order for order, error in zip(orders, errors) if error is None]
+    await sales_counters.apply_safely("group_commit", sales_counters.apply_orders(written))
+    await orders_timeseries.mirror_insert_many(written)
+    return errors
+
+_buffer: Optional[GroupCommitBuffer] = None
+
+def get_order_buffer() -> GroupCommitBuffer:
+    global _buffer
+    if _buffer is None:
+        _buffer = GroupCommitBuffer(
+            "orders",
+            write_orders,
+            settings.ORDER_INGESTION_WINDOW_MS,
+            settings.ORDER_INGESTION_MAX_BATCH
+        )
+    return _buffer
+
+async def shutdown_order_buffer():
+    if _buffer is not None:
+        await _buffer.close()
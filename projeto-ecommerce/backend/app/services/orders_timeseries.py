@@ -0,0 +1,181 @@
+import sys
+from typing import List, Optional
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid
+from app.core.database import get_collection, get_database
+from app.core.config import settings
+from app.core import metrics
+
+# Cópia analítica de orders em uma coleção time-series: date é o timeField e
+# categorias/status ficam no metaField "meta", que o Mongo usa para agrupar os
+# buckets. total e product_ids continuam com os mesmos nomes, então as
+# agregações do dashboard rodam nas duas coleções.
+META_FIELDS = ("category_ids", "status")
+
+def to_timeseries(order: dict) -> dict:
+    return {
+        "date": order["date"],
+        "meta": {field: order.get(field) for field in META_FIELDS},
+        "order_id": order["_id"],
+        "total": order.get("total", 0),
+        "product_ids": order.get("product_ids", [])
+    }
+
+def timeseries_projection() -> dict:
+    """Mesmo formato de to_timeseries, para o backfill rodar como $project"""
+    return {
+        "_id": 0,
+        "date": 1,
+        "meta": {field: f"${field}" for field in META_FIELDS},
+        "order_id": "$_id",
+        "total": 1,
+        "product_ids": 1
+    }
+
+def is_timeseries_source(collection_name: str) -> bool:
+    return collection_name == settings.ORDERS_TIMESERIES_COLLECTION
+
+def adapt_match(match_stage: dict, collection_name: str) -> dict:
+    """Campos do metaField ficam em meta.* na coleção time-series"""
+    if not is_timeseries_source(collection_name):
+        return match_stage
+    return {
+        f"meta.{key}" if key in META_FIELDS else key: value
+        for key, value in match_stage.items()
+    }
+
+async def create_timeseries_collection():
+    """Cria a coleção time-series e seu índice secundário (idempotente)"""
+    db = await get_database()
+    try:
+        await db.create_collection(
+            settings.ORDERS_TIMESERIES_COLLECTION,
+            timeseries={
+                "timeField": "date",
+                "metaField": "meta",
+                "granularity": settings.ORDERS_TIMESERIES_GRANULARITY
+            }
+        )
+    except CollectionInvalid:
+        pass
+
+    collection = db[settings.ORDERS_TIMESERIES_COLLECTION]
+    await collection.create_index([("meta.category_ids", ASCENDING), ("date", ASCENDING)])
+    await collection.create_index([("order_id", ASCENDING)])
+
+async def _mirror(operation: str, insert: Optional[List[dict]] = None, delete_id=None):
+    """
+    A cópia não pode derrubar a escrita do pedido: falhas são registradas e
+    corrigidas rodando o backfill novamente.
+    """
+    if not settings.ORDERS_TIMESERIES_ENABLED:
+        return
+
+    try:
+        collection = await get_collection(settings.ORDERS_TIMESERIES_COLLECTION)
+        if delete_id is not None:
+            await collection.delete_many({"order_id": delete_id})
+        if insert and len(insert) == 1:
+            await collection.insert_one(to_timeseries(insert[0]))
+        elif insert:
+            await collection.insert_many([to_timeseries(order) for order in insert], ordered=False)
+    except Exception as e:
+        metrics.inc("orders_timeseries_mirror_errors_total", operation=operation)
+        print(f"Erro ao espelhar pedido na coleção time-series: {str(e)}", file=sys.stderr)
+
+async def mirror_insert(order: dict):
+    await _mirror("insert", insert=[order])
+
+async def mirror_insert_many(orders: List[dict]):
+    await _mirror("insert", insert=orders)
+
+async def mirror_replace(order: dict):
+    # Time-series não aceita updates arbitrários: remove e insere de novo
+    await _mirror("replace", insert=[order], delete_id=order["_id"])
+
+async def mirror_delete(order: dict):
+    await _mirror("delete", delete_id=order["_id"])
+
+async def resync_orders(match: dict, batch_size: int = 1000):
+    """Regrava na cópia os pedidos selecionados (ex.: após recalcular categorias)"""
+    if not settings.ORDERS_TIMESERIES_ENABLED:
+        return
+
+    orders_collection = await get_collection("orders")
+    target = await get_collection(settings.ORDERS_TIMESERIES_COLLECTION)
+
+    async def flush(batch):
+        await target.delete_many({"order_id": {"$in": [row["order_id"] for row in batch]}})
+        await target.insert_many(batch, ordered=False)
+
+    batch: List[dict] = []
+    async for order in orders_collection.find(match):
+        batch.append(to_timeseries(order))
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+async def pull_category(category_id):
+    """Remove a categoria do metaField; updates só no metaField são permitidos"""
+    if not settings.ORDERS_TIMESERIES_ENABLED:
+        return
+
+    target = await get_collection(settings.ORDERS_TIMESERIES_COLLECTION)
+    await target.update_many(
+        {"meta.category_ids": category_id},
+        {"$pull": {"meta.category_ids": category_id}}
+    )
+
+async def delete_orders(order_ids: list):
+    """Remove da cópia pedidos arquivados"""
+    if not settings.ORDERS_TIMESERIES_ENABLED or not order_ids:
+        return
+
+    target = await get_collection(settings.ORDERS_TIMESERIES_COLLECTION)
+    for start in range(0, len(order_ids), 1000):
+        await target.delete_many({"order_id": {"$in": order_ids[start:start + 1000]}})
+
+async def _insert_missing(target, batch: List[dict]) -> int:
+    existing = await target.find(
+        {"order_id": {"$in": [row["order_id"] for row in batch]}},
+        {"order_id": 1}
+    ).to_list(None)
+    existing_ids = {row["order_id"] for row in existing}
+
+    missing = [row for row in batch if row["order_id"] not in existing_ids]
+    if missing:
+        await target.insert_many(missing, ordered=False)
+    return len(missing)
+
+async def backfill(drop: bool = False, batch_size: int = 1000) -> int:
+    """
+    Copia para a coleção time-series, em lotes, os pedidos que ainda não estão
+    lá. Pode rodar com a cópia na escrita já ligada; use drop para reconstruir.
+    """
+    db = await get_database()
+    if drop:
+        await db.drop_collection(settings.ORDERS_TIMESERIES_COLLECTION)
+    await create_timeseries_collection()
+
+    target = db[settings.ORDERS_TIMESERIES_COLLECTION]
+
+    # Ordenar por date agrupa as inserções nos mesmos buckets
+    cursor = db.orders.aggregate([
+        {"$sort": {"date": ASCENDING}},
+        {"$project": timeseries_projection()}
+    ], allowDiskUse=True, batchSize=batch_size)
+
+    copied = 0
+    batch: List[dict] = []
+    async for row in cursor:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            copied += await _insert_missing(target, batch)
+            batch = []
+
+    if batch:
+        copied += await _insert_missing(target, batch)
+
+    return copied
@@ -0,0 +1,134 @@
+from typing import Dict, List, Tuple
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.database import get_collection
+from app.core.config import settings
+from app.models.product import ProductBulkOperation
+from app.services.order_categories import schedule_refresh_for_products
+
+# Atualização em massa de produtos: cada operação vira um UpdateOne (por id)
+# ou UpdateMany (por filtro) com pipeline de update, enviados em lotes de
+# bulk_write não ordenados.
+
+def operation_filter(operation: ProductBulkOperation) -> dict:
+    if operation.id is not None:
+        return {"_id": ObjectId(operation.id)}
+
+    query = {}
+    if operation.filter.ids:
+        query["_id"] = {"$in": [ObjectId(pid) for pid in operation.filter.ids]}
+    if operation.filter.category_ids:
+        query["category_ids"] = {"$in": [ObjectId(cid) for cid in operation.filter.category_ids]}
+    return query
+
+def changes_categories(operation: ProductBulkOperation) -> bool:
+    return bool(
+        (operation.set and "category_ids" in operation.set.model_fields_set)
+        or operation.add_category_ids
+        or operation.remove_category_ids
+    )
+
+def update_pipeline(operation: ProductBulkOperation) -> List[dict]:
+    """
+    Pipeline de update: permite calcular o novo preço a partir do atual e
+    arredondá-lo no servidor, sem ler os produtos.
+    """
+    fields = {}
+    patch = operation.set.model_dump(exclude_unset=True) if operation.set else {}
+    for name, value in patch.items():
+        if name == "category_ids":
+            value = [ObjectId(cid) for cid in value]
+        # $literal evita que valores começando com "$" sejam lidos como campos
+        fields[name] = {"$literal": value}
+
+    if operation.price_multiplier is not None or operation.price_increment is not None:
+        price = "$price"
+        if operation.price_multiplier is not None:
+            price = {"$multiply": [price, operation.price_multiplier]}
+        if operation.price_increment is not None:
+            price = {"$add": [price, operation.price_increment]}
+        fields["price"] = {"$round": [{"$max": [price, 0]}, 2]}
+
+    if operation.add_category_ids or operation.remove_category_ids:
+        categories = {"$ifNull": ["$category_ids", []]}
+        if operation.remove_category_ids:
+            categories = {"$setDifference": [categories, [ObjectId(cid) for cid in operation.remove_category_ids]]}
+        if operation.add_category_ids:
+            categories = {"$setUnion": [categories, [ObjectId(cid) for cid in operation.add_category_ids]]}
+        fields["category_ids"] = categories
+
+    return [{"$set": fields}]
+
+async def match_operations(collection, operations: List[ProductBulkOperation]) -> Tuple[List[int], List[List[ObjectId]]]:
+    """
+    Quantos produtos cada operação atinge. Operações por id são conferidas
+    em uma única consulta; as por filtro que mudam categorias precisam dos ids
+    para o recálculo dos pedidos, as demais só da contagem.
+    """
+    by_id = [ObjectId(op.id) for op in operations if op.id is not None]
+    existing = set()
+    if by_id:
+        found = await collection.find({"_id": {"$in": by_id}}, {"_id": 1}).to_list(None)
+        existing = {product["_id"] for product in found}
+
+    matched: List[int] = []
+    product_ids: List[List[ObjectId]] = []
+    for operation in operations:
+        query = operation_filter(operation)
+        if operation.id is not None:
+            ids = [query["_id"]] if query["_id"] in existing else []
+            matched.append(len(ids))
+            product_ids.append(ids)
+        elif changes_categories(operation):
+            ids = [product["_id"] for product in await collection.find(query, {"_id": 1}).to_list(None)]
+            matched.append(len(ids))
+            product_ids.append(ids)
+        else:
+            matched.append(await collection.count_documents(query))
+            product_ids.append([])
+    return matched, product_ids
+
+async def apply_bulk_update(operations: List[ProductBulkOperation]) -> dict:
+    collection = await get_collection("products", "transactional", budget="write")
+    matched, product_ids = await match_operations(collection, operations)
+
+    results = [
+        {"index": i, "status": "updated" if count or operation.id is None else "not_found", "matched": count}
+        for i, (operation, count) in enumerate(zip(operations, matched))
+    ]
+
+    # Operações por id sem produto não são enviadas
+    requests: List[Tuple[int, object]] = []
+    for i, operation in enumerate(operations):
+        if results[i]["status"] == "not_found":
+            continue
+        request_class = UpdateOne if operation.id is not None else UpdateMany
+        requests.append((i, request_class(operation_filter(operation), update_pipeline(operation))))
+
+    modified = 0
+    chunk_size = settings.PRODUCT_BULK_CHUNK_SIZE
+    for start in range(0, len(requests), chunk_size):
+        chunk = requests[start:start + chunk_size]
+        try:
+            result = await collection.bulk_write([request for _, request in chunk], ordered=False)
+            modified += result.modified_count
+        except BulkWriteError as e:
+            modified += e.details.get("nModified", 0)
+            for error in e.details.get("writeErrors", []):
+                index = chunk[error["index"]][0]
+                results[index].update({"status": "error", "error": error.get("errmsg")})
+
+    # Um único recálculo das categorias dos pedidos para todos os produtos alterados
+    recategorized: Dict[ObjectId, None] = {}
+    for i, operation in enumerate(operations):
+        if results[i]["status"] == "updated" and changes_categories(operation):
+            recategorized.update(dict.fromkeys(product_ids[i]))
+    if recategorized:
+        schedule_refresh_for_products(list(recategorized))
+
+    return {
+        "matched": sum(r["matched"] for r in results if r["status"] == "updated"),
+        "modified": modified,
+        "results": results
+    }
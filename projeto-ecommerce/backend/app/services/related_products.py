@@ -0,0 +1,276 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+from pymongo import ReplaceOne
+from app.core.database import get_collection
+from app.core.config import settings
+
+# "Comprados juntos": matriz esparsa produto x produto com o número de pedidos
+# em que cada par aparece. A matriz completa fica em disco (RELATED_PRODUCTS_MATRIX_PATH)
+# para as execuções incrementais; a API só lê os top-K vizinhos já gravados
+# em product_related, indexados pelo _id do produto.
+RELATED_COLLECTION = "product_related"
+WRITE_BATCH_SIZE = 1000
+
+class ProductIndex:
+    """Mapeia ObjectIds de produtos para linhas/colunas da matriz"""
+
+    def __init__(self, product_ids: Optional[List[str]] = None):
+        self.ids: List[str] = list(product_ids or [])
+        self.positions: Dict[str, int] = {pid: i for i, pid in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, product_id) -> int:
+        key = str(product_id)
+        if key not in self.positions:
+            self.positions[key] = len(self.ids)
+            self.ids.append(key)
+        return self.positions[key]
+
+def cooccurrence_batch(orders_product_ids: List[list], index: ProductIndex):
+    """
+    Co-ocorrências de um lote de pedidos: com B a matriz de incidência
+    pedido x produto (0/1), B.T @ B conta em quantos pedidos cada par aparece.
+    A diagonal guarda o número de pedidos de cada produto.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    lengths = np.fromiter((len(ids) for ids in orders_product_ids), dtype=np.int64, count=len(orders_product_ids))
+    columns = np.fromiter(
+        (index.position(pid) for ids in orders_product_ids for pid in ids),
+        dtype=np.int32,
+        count=int(lengths.sum())
+    )
+    rows = np.repeat(np.arange(len(orders_product_ids), dtype=np.int32), lengths)
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(columns), dtype=np.int32), (rows, columns)),
+        shape=(len(orders_product_ids), len(index))
+    )
+    # O mesmo produto repetido no pedido conta uma vez para o par
+    incidence.data[:] = 1
+    return (incidence.T @ incidence).tocsr()
+
+def add_matrices(total, batch):
+    """Soma matrizes de tamanhos diferentes (produtos novos aumentam o lote)"""
+    if total is None:
+        return batch
+    size = max(total.shape[0], batch.shape[0])
+    total.resize((size, size))
+    batch.resize((size, size))
+    return (total + batch).tocsr()
+
+def top_k(matrix, k: int, rows=None) -> Dict[int, List[Tuple[int, int]]]:
+    """
+    Os k vizinhos mais frequentes de cada linha (sem a própria diagonal),
+    ordenados por contagem e depois pela coluna, sem laço por produto.
+    """
+    import numpy as np
+
+    if rows is not None:
+        if len(rows) == 0:
+            return {}
+        matrix = matrix[rows]
+        row_ids = np.asarray(rows)
+    else:
+        row_ids = np.arange(matrix.shape[0])
+
+    coo = matrix.tocoo()
+    original_rows = row_ids[coo.row]
+    keep = original_rows != coo.col
+    local_rows, columns, counts = coo.row[keep], coo.col[keep], coo.data[keep]
+
+    order = np.lexsort((columns, -counts, local_rows))
+    local_rows, columns, counts = local_rows[order], columns[order], counts[order]
+
+    # Posição de cada vizinho dentro da sua linha
+    starts = np.searchsorted(local_rows, local_rows, side="left")
+    rank = np.arange(len(local_rows)) - starts
+    selected = rank < k
+
+    neighbors: Dict[int, List[Tuple[int, int]]] = {int(row): [] for row in row_ids}
+    for row, column, count in zip(row_ids[local_rows[selected]], columns[selected], counts[selected]):
+        neighbors[int(row)].append((int(column), int(count)))
+    return neighbors
+
+def save_state(path: str, matrix, index: ProductIndex, watermark: Optional[ObjectId], recent_ids: Set[ObjectId]):
+    import numpy as np
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(
+        tmp_path,
+        data=matrix.data,
+        indices=matrix.indices,
+        indptr=matrix.indptr,
+        shape=np.array(matrix.shape),
+        product_ids=np.array(index.ids),
+        watermark=np.array(str(watermark) if watermark else ""),
+        recent_ids=np.array(sorted(str(order_id) for order_id in recent_ids), dtype=str)
+    )
+    # Troca atômica: uma execução interrompida não corrompe o estado anterior
+    os.replace(tmp_path, path)
+
+def load_state(path: str):
+    """
+    Retorna (matriz, índice, watermark, pedidos já somados na janela de
+    releitura) ou (None, índice vazio, None, None). Estados antigos, sem a
+    janela, retornam None no último item.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    if not os.path.exists(path):
+        return None, ProductIndex(), None, None
+
+    with np.load(path) as state:
+        matrix = sparse.csr_matrix(
+            (state["data"], state["indices"], state["indptr"]),
+            shape=tuple(state["shape"])
+        )
+        index = ProductIndex(state["product_ids"].tolist())
+        watermark = str(state["watermark"])
+        recent_ids = {ObjectId(i) for i in state["recent_ids"].tolist()} if "recent_ids" in state else None
+    return matrix, index, ObjectId(watermark) if watermark else None, recent_ids
+
+def rescan_from(watermark: ObjectId) -> ObjectId:
+    """Menor _id relido na execução incremental"""
+    return ObjectId.from_datetime(
+        watermark.generation_time - timedelta(seconds=settings.RELATED_PRODUCTS_RESCAN_SECONDS)
+    )
+
+async def accumulate_orders(
+    matrix,
+    index: ProductIndex,
+    after: Optional[ObjectId],
+    batch_size: int,
+    recent_ids: Optional[Set[ObjectId]] = None
+):
+    """
+    Lê os pedidos em ordem de _id, em lotes, e soma as co-ocorrências. A memória
+    fica limitada ao lote mais a matriz, que cresce com os pares distintos e não
+    com o número de pedidos. Retorna também as linhas tocadas pelos pedidos lidos
+    e os pedidos somados dentro da janela de releitura do novo watermark.
+
+    O _id não é gravado em ordem (é gerado antes do insert, em vários
+    processos): a leitura recomeça RELATED_PRODUCTS_RESCAN_SECONDS antes do
+    watermark e pula os pedidos dessa janela que já foram somados.
+    """
+    import numpy as np
+
+    orders_collection = await get_collection("orders", "analytics")
+    if after is None:
+        query = {}
+    elif recent_ids is None:
+        # Estado salvo antes da janela de releitura
+        query = {"_id": {"$gt": after}}
+    else:
+        query = {"_id": {"$gte": rescan_from(after)}}
+    cursor = orders_collection.find(query, {"product_ids": 1}).sort("_id", 1).batch_size(batch_size)
+
+    seen = set(recent_ids or ())
+    watermark = after
+    processed = 0
+    touched = np.array([], dtype=np.int32)
+
+    async def flush(batch, matrix, touched):
+        batch_matrix = await run_in_threadpool(cooccurrence_batch, batch, index)
+        return add_matrices(matrix, batch_matrix), np.union1d(touched, batch_matrix.indices)
+
+    def window(seen):
+        threshold = rescan_from(watermark)
+        return {order_id for order_id in seen if order_id >= threshold}
+
+    batch: List[list] = []
+    async for order in cursor:
+        if order["_id"] in seen:
+            continue
+        seen.add(order["_id"])
+        batch.append(order.get("product_ids", []))
+        watermark = order["_id"] if watermark is None else max(watermark, order["_id"])
+        if len(batch) >= batch_size:
+            matrix, touched = await flush(batch, matrix, touched)
+            processed += len(batch)
+            batch = []
+            seen = window(seen)
+
+    if batch:
+        matrix, touched = await flush(batch, matrix, touched)
+        processed += len(batch)
+
+    return matrix, watermark, processed, touched, window(seen) if watermark else set()
+
+async def write_neighbors(neighbors: Dict[int, List[Tuple[int, int]]], index: ProductIndex, updated_at: datetime):
+    collection = await get_collection(RELATED_COLLECTION, "transactional")
+    operations = []
+    for row, items in neighbors.items():
+        operations.append(ReplaceOne(
+            {"_id": ObjectId(index.ids[row])},
+            {
+                "related": [
+                    {"product_id": ObjectId(index.ids[column]), "count": count}
+                    for column, count in items
+                ],
+                "updated_at": updated_at
+            },
+            upsert=True
+        ))
+        if len(operations) >= WRITE_BATCH_SIZE:
+            await collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+
+async def build(
+    full: bool = False,
+    batch_size: int = 50000,
+    k: Optional[int] = None,
+    path: Optional[str] = None
+) -> dict:
+    """
+    Atualiza a matriz com os pedidos novos desde a última execução e regrava
+    os vizinhos dos produtos afetados. Com full, recomeça do zero; pedidos
+    alterados ou removidos (inclusive os arquivados) só são refletidos assim.
+    """
+    k = k or settings.RELATED_PRODUCTS_TOP_K
+    path = path or settings.RELATED_PRODUCTS_MATRIX_PATH
+    started_at = datetime.utcnow()
+
+    if full:
+        matrix, index, watermark, recent_ids = None, ProductIndex(), None, None
+    else:
+        matrix, index, watermark, recent_ids = load_state(path)
+    incremental = matrix is not None
+
+    matrix, watermark, processed, touched, recent_ids = await accumulate_orders(
+        matrix, index, watermark, batch_size, recent_ids
+    )
+    if matrix is None:
+        return {"orders": 0, "products": 0, "updated": 0, "pairs": 0}
+
+    # Na execução incremental só os produtos dos pedidos novos mudam de top-K
+    neighbors = await run_in_threadpool(top_k, matrix, k, touched if incremental else None)
+    await write_neighbors(neighbors, index, started_at)
+
+    if full:
+        # Produtos que não aparecem mais em nenhum pedido
+        collection = await get_collection(RELATED_COLLECTION, "transactional")
+        await collection.delete_many({"updated_at": {"$lt": started_at}})
+
+    await run_in_threadpool(save_state, path, matrix, index, watermark, recent_ids)
+    return {
+        "orders": processed,
+        "products": len(index),
+        "updated": len(neighbors),
+        "pairs": matrix.nnz
+    }
+
+async def get_related(product_id: ObjectId, limit: int) -> Optional[dict]:
+    """Uma leitura pelo _id; os vizinhos já estão ordenados por contagem"""
+    collection = await get_collection(RELATED_COLLECTION, budget="read")
+    return await collection.find_one({"_id": product_id}, {"related": {"$slice": limit}})
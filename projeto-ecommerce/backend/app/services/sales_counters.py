@@ -0,0 +1,295 @@
+import sys
+from collections import Counter, defaultdict
+from datetime import datetime, time, timezone
+from typing import Awaitable, List, Optional
+from pymongo import ASCENDING, DESCENDING, DeleteOne, UpdateOne
+from app.core.database import get_collection
+from app.core import metrics
+
+COLLECTION = "product_sales_daily"
+REVENUE_TOLERANCE = 0.01
+
+def _day(date: datetime) -> datetime:
+    if date.tzinfo:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime.combine(date.date(), time.min)
+
+def counter_updates(order: dict, sign: int = 1) -> List[UpdateOne]:
+    """
+    $inc com upsert para cada produto do pedido no dia do pedido.
+    units e revenue seguem a semântica do top de produtos do dashboard: cada
+    ocorrência do produto no pedido conta uma vez e soma o total do pedido.
+    """
+    return merged_counter_updates([order], sign)
+
+def merged_counter_updates(orders: List[dict], sign: int = 1) -> List[UpdateOne]:
+    """Como counter_updates, somando em um só $inc os pedidos do mesmo produto e dia"""
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for order in orders:
+        day = _day(order["date"])
+        for product_id, count in Counter(order.get("product_ids", [])).items():
+            row = totals[(product_id, day)]
+            row[0] += sign
+            row[1] += sign * count
+            row[2] += sign * count * order.get("total", 0)
+
+    return [
+        UpdateOne(
+            {"product_id": product_id, "day": day},
+            {"$inc": {"orders": orders_count, "units": units, "revenue": revenue}},
+            upsert=True
+        )
+        for (product_id, day), (orders_count, units, revenue) in totals.items()
+    ]
+
+async def apply_order(order: Optional[dict], sign: int = 1):
+    """Aplica (sign=1) ou desfaz (sign=-1) um pedido nos contadores"""
+    if not order or not order.get("product_ids"):
+        return
+
+    collection = await get_collection(COLLECTION)
+    await collection.bulk_write(counter_updates(order, sign), ordered=False)
+
+async def apply_orders(orders: List[dict]):
+    """Aplica um lote de pedidos novos em um único bulk_write"""
+    updates = merged_counter_updates(orders)
+    if not updates:
+        return
+
+    collection = await get_collection(COLLECTION)
+    await collection.bulk_write(updates, ordered=False)
+
+async def apply_order_change(before: Optional[dict], after: Optional[dict]):
+    await apply_order(before, -1)
+    await apply_order(after, 1)
+
+async def apply_safely(source: str, update: Awaitable):
+    """
+    O pedido já foi gravado quando os contadores são atualizados: devolver
+    erro faria o cliente repetir e duplicar o pedido. A falha é registrada e a
+    diferença corrigida por scripts/reconcile_sales_counters.py.
+    """
+    try:
+        await update
+    except Exception as e:
+        metrics.inc("sales_counters_apply_errors_total", source=source)
+        print(f"Erro ao atualizar contadores de vendas: {str(e)}", file=sys.stderr)
+
+def covers_whole_days(start_date: Optional[datetime], end_date: Optional[datetime]) -> bool:
+    """
+    Os contadores têm granularidade diária: só respondem filtros que começam
+    à meia-noite e terminam no fim do dia (como os enviados pelo frontend).
+    """
+    if start_date and start_date.time() != time.min:
+        return False
+    if end_date and end_date.time() < time(23, 59, 59):
+        return False
+    return True
+
+def rank_products_stages(category_filter: Optional[dict] = None, limit: int = 5) -> List[dict]:
+    """
+    Ordena os produtos agrupados (_id = product_id, order_count, total_revenue)
+    e junta o nome. Com filtro de categoria o $lookup vem antes do $limit, para
+    descartar produtos de outras categorias ainda no servidor.
+    """
+    lookup = [
+        {
+            "$lookup": {
+                "from": "products",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "product_info"
+            }
+        },
+        {"$unwind": "$product_info"}
+    ]
+    ranking = [
+        {"$sort": {"order_count": DESCENDING, "_id": ASCENDING}},
+        {"$limit": limit}
+    ]
+
+    if category_filter:
+        stages = lookup + [{"$match": {"product_info.category_ids": category_filter}}] + ranking
+    else:
+        stages = ranking + lookup
+
+    return stages + [
+        {
+            "$project": {
+                "_id": 0,
+                "product_id": {"$toString": "$_id"},
+                "name": "$product_info.name",
+                "order_count": 1,
+                "total_revenue": 1
+            }
+        }
+    ]
+
+async def top_products(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    product_ids: Optional[list] = None,
+    category_filter: Optional[dict] = None,
+    limit: int = 5,
+    subsystem: Optional[str] = "analytics"
+) -> List[dict]:
+    """Top-N de produtos a partir dos contadores diários, sem desmontar pedidos"""
+    match = {}
+    if start_date or end_date:
+        match["day"] = {}
+        if start_date:
+            match["day"]["$gte"] = _day(start_date)
+        if end_date:
+            match["day"]["$lte"] = _day(end_date)
+    if product_ids is not None:
+        match["product_id"] = {"$in": product_ids}
+
+    collection = await get_collection(COLLECTION, subsystem, budget="dashboard")
+    return await collection.aggregate([
+        {"$match": match},
+        {
+            "$group": {
+                "_id": "$product_id",
+                "order_count": {"$sum": "$units"},
+                "total_revenue": {"$sum": "$revenue"}
+            }
+        },
+        {"$match": {"order_count": {"$gt": 0}}}
+    ] + rank_products_stages(category_filter, limit)).to_list(None)
+
+async def product_totals(
+    days: List[datetime],
+    product_ids: Optional[list] = None,
+    subsystem: Optional[str] = "analytics"
+) -> List[dict]:
+    """Totais por produto (sem ranking) em dias específicos, ex.: os já arquivados"""
+    match = {"day": {"$in": days}}
+    if product_ids is not None:
+        match["product_id"] = {"$in": product_ids}
+
+    collection = await get_collection(COLLECTION, subsystem, budget="dashboard")
+    return await collection.aggregate([
+        {"$match": match},
+        {
+            "$group": {
+                "_id": "$product_id",
+                "order_count": {"$sum": "$units"},
+                "total_revenue": {"$sum": "$revenue"}
+            }
+        },
+        {"$match": {"order_count": {"$gt": 0}}}
+    ]).to_list(None)
+
+def expected_counters_pipeline() -> List[dict]:
+    """Recalcula os contadores a partir dos pedidos brutos"""
+    return [
+        {"$unwind": "$product_ids"},
+        {
+            "$group": {
+                "_id": {
+                    "product_id": "$product_ids",
+                    "day": {"$dateTrunc": {"date": "$date", "unit": "day"}},
+                    "order": "$_id"
+                },
+                "units": {"$sum": 1},
+                "total": {"$sum": "$total"}
+            }
+        },
+        {
+            "$group": {
+                "_id": {"product_id": "$_id.product_id", "day": "$_id.day"},
+                "orders": {"$sum": 1},
+                "units": {"$sum": "$units"},
+                "revenue": {"$sum": "$total"}
+            }
+        },
+        {"$sort": {"_id.product_id": 1, "_id.day": 1}}
+    ]
+
+def _differs(expected: dict, actual: dict) -> bool:
+    return (
+        expected["orders"] != actual.get("orders")
+        or expected["units"] != actual.get("units")
+        or abs(expected["revenue"] - actual.get("revenue", 0)) > REVENUE_TOLERANCE
+    )
+
+async def reconcile(dry_run: bool = False, batch_size: int = 1000, since: Optional[datetime] = None) -> dict:
+    """
+    Compara os contadores com os valores recalculados dos pedidos e corrige
+    as diferenças. Os dois cursores vêm ordenados por (product_id, day) e são
+    percorridos juntos, então a memória usada não cresce com o histórico.
+    Com `since`, só os dias a partir dele são verificados (dias arquivados
+    não têm mais pedidos no Mongo, mas seus contadores continuam valendo).
+    """
+    orders_collection = await get_collection("orders")
+    counters_collection = await get_collection(COLLECTION)
+
+    since_match = [{"$match": {"date": {"$gte": since}}}] if since else []
+    expected_cursor = orders_collection.aggregate(since_match + expected_counters_pipeline(), allowDiskUse=True)
+    actual_cursor = counters_collection.find(
+        {"day": {"$gte": since}} if since else {}
+    ).sort([("product_id", 1), ("day", 1)])
+
+    report = {"checked": 0, "missing": 0, "mismatched": 0, "extra": 0, "fixed": 0, "samples": []}
+    operations = []
+
+    async def next_or_none(cursor):
+        try:
+            return await cursor.next()
+        except StopAsyncIteration:
+            return None
+
+    def record(kind, key, expected=None, actual=None):
+        report[kind] += 1
+        if len(report["samples"]) < 20:
+            report["samples"].append({
+                "type": kind,
+                "product_id": str(key[0]),
+                "day": key[1].isoformat(),
+                "expected": {k: expected[k] for k in ("orders", "units", "revenue")} if expected else None,
+                "actual": {k: actual.get(k) for k in ("orders", "units", "revenue")} if actual else None
+            })
+
+    async def flush():
+        if operations and not dry_run:
+            result = await counters_collection.bulk_write(operations, ordered=False)
+            report["fixed"] += result.upserted_count + result.modified_count + result.deleted_count
+        operations.clear()
+
+    expected = await next_or_none(expected_cursor)
+    actual = await next_or_none(actual_cursor)
+
+    while expected is not None or actual is not None:
+        expected_key = (expected["_id"]["product_id"], expected["_id"]["day"]) if expected else None
+        actual_key = (actual["product_id"], actual["day"]) if actual else None
+
+        if actual is None or (expected is not None and expected_key < actual_key):
+            record("missing", expected_key, expected=expected)
+            operations.append(UpdateOne(
+                {"product_id": expected_key[0], "day": expected_key[1]},
+                {"$set": {k: expected[k] for k in ("orders", "units", "revenue")}},
+                upsert=True
+            ))
+            expected = await next_or_none(expected_cursor)
+        elif expected is None or actual_key < expected_key:
+            # Contadores zerados são sobras de pedidos removidos, não drift
+            if actual.get("orders") or actual.get("units"):
+                record("extra", actual_key, actual=actual)
+            operations.append(DeleteOne({"_id": actual["_id"]}))
+            actual = await next_or_none(actual_cursor)
+        else:
+            report["checked"] += 1
+            if _differs(expected, actual):
+                record("mismatched", expected_key, expected=expected, actual=actual)
+                operations.append(UpdateOne(
+                    {"_id": actual["_id"]},
+                    {"$set": {k: expected[k] for k in ("orders", "units", "revenue")}}
+                ))
+            expected = await next_or_none(expected_cursor)
+            actual = await next_or_none(actual_cursor)
+
+        if len(operations) >= batch_size:
+            await flush()
+
+    await flush()
+    return report
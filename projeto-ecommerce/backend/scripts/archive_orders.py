@@ -0,0 +1,34 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.order_archive import run_archive
+
+async def main(args):
+    horizon_days = args.horizon_days or settings.ORDERS_ARCHIVE_HORIZON_DAYS
+    print(f"Arquivando pedidos com mais de {horizon_days} dias em {settings.ORDERS_ARCHIVE_BACKEND}...")
+
+    start = time.perf_counter()
+    report = await run_archive(horizon_days, dry_run=args.dry_run)
+
+    print(f"Corte: {report['cutoff']:%Y-%m-%d}, dias a arquivar: {report['days']}")
+    if args.dry_run:
+        print("Modo dry-run: nenhum pedido foi movido.")
+    else:
+        print(f"{report['orders']} pedidos arquivados em {time.perf_counter() - start:.1f}s")
+
+    if not settings.ORDERS_ARCHIVE_ENABLED:
+        print("Aviso: ORDERS_ARCHIVE_ENABLED=false, o dashboard não inclui os dias arquivados")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Move pedidos antigos para arquivos Parquet')
+    parser.add_argument('--horizon-days', type=int, default=None, help='Idade mínima dos pedidos arquivados')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas listar os dias que seriam arquivados')
+
+    args = parser.parse_args()
+    asyncio.run(main(args))
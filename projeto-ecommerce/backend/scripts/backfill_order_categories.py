@@ -0,0 +1,30 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import ensure_indexes, get_collection
+from app.services.order_categories import refresh_orders
+
+async def main(args):
+    await ensure_indexes()
+    orders = await get_collection("orders")
+
+    match = {} if args.all else {"category_ids": {"$exists": False}}
+    pending = await orders.count_documents(match)
+    print(f"Pedidos a atualizar: {pending}")
+
+    # $lookup e $merge rodam no servidor: nenhum documento passa pelo script
+    start = time.perf_counter()
+    await refresh_orders(match)
+    print(f"category_ids atualizado em {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Preenche category_ids nos pedidos a partir dos produtos')
+    parser.add_argument('--all', action='store_true', help='Recalcular todos os pedidos, não só os sem category_ids')
+
+    args = parser.parse_args()
+    asyncio.run(main(args))
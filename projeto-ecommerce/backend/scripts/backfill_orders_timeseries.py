@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.orders_timeseries import backfill
+
+async def main(args):
+    print(f"Copiando pedidos para a coleção time-series {settings.ORDERS_TIMESERIES_COLLECTION}...")
+    start = time.perf_counter()
+    copied = await backfill(drop=args.drop, batch_size=args.batch_size)
+    print(f"{copied} pedidos copiados em {time.perf_counter() - start:.1f}s")
+
+    if not settings.ORDERS_TIMESERIES_ENABLED:
+        print("Aviso: ORDERS_TIMESERIES_ENABLED=false, novos pedidos não serão copiados na escrita")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Preenche a cópia time-series dos pedidos')
+    parser.add_argument('--drop', action='store_true', help='Recriar a coleção do zero')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Pedidos por insert_many')
+
+    args = parser.parse_args()
+    asyncio.run(main(args))
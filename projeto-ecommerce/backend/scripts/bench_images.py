@@ -0,0 +1,59 @@
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.images import generate_variants
+
+def make_sample_image(width, height, image_format="JPEG"):
+    """Gera uma imagem sintética com ruído para não favorecer a compressão"""
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+def run(workers, images, width, height):
+    sample = make_sample_image(width, height)
+    sizes = settings.IMAGE_VARIANTS
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Aquecimento: inicializa os processos e importa o Pillow
+        list(pool.map(generate_variants, [sample] * workers, [sizes] * workers))
+
+        start = time.perf_counter()
+        list(pool.map(
+            generate_variants,
+            [sample] * images,
+            [sizes] * images,
+            [settings.IMAGE_VARIANT_FORMAT] * images,
+            [settings.IMAGE_VARIANT_QUALITY] * images
+        ))
+        elapsed = time.perf_counter() - start
+
+    return images / elapsed
+
+def main(args):
+    print(f"Imagem {args.width}x{args.height}, variantes {settings.IMAGE_VARIANTS} "
+          f"em {settings.IMAGE_VARIANT_FORMAT}")
+    print(f"{'workers':>8} {'imagens/s':>12} {'imagens/s/core':>16}")
+
+    for workers in range(1, args.max_workers + 1):
+        throughput = run(workers, args.images, args.width, args.height)
+        print(f"{workers:>8} {throughput:>12.1f} {throughput / workers:>16.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline de variantes de imagem')
+    parser.add_argument('--images', type=int, default=50, help='Número de imagens processadas por rodada')
+    parser.add_argument('--width', type=int, default=2000, help='Largura da imagem original')
+    parser.add_argument('--height', type=int, default=1500, help='Altura da imagem original')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help='Maior número de processos testado')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.database import get_database
+from app.api.v1.dashboard import time_series_stages
+from app.services.orders_timeseries import adapt_match
+
+# Requer dados do seed.py e a cópia de scripts/backfill_orders_timeseries.py
+
+async def storage_stats(db, name):
+    stats = await db[name].aggregate([{"$collStats": {"storageStats": {}}}]).to_list(1)
+    storage = stats[0]["storageStats"]
+    return {
+        "documents": storage.get("count", 0),
+        "storage": storage.get("storageSize", 0),
+        "indexes": storage.get("totalIndexSize", 0)
+    }
+
+def dashboard_pipelines(match_stage):
+    return {
+        "métricas": [
+            {"$match": match_stage},
+            {"$group": {
+                "_id": None,
+                "total_orders": {"$sum": 1},
+                "total_revenue": {"$sum": "$total"},
+                "min_order_value": {"$min": "$total"},
+                "max_order_value": {"$max": "$total"}
+            }}
+        ],
+        "série diária": [{"$match": match_stage}] + time_series_stages()
+    }
+
+async def time_pipeline(collection, pipeline, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await collection.aggregate(pipeline).to_list(None)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+async def main(args):
+    db = await get_database()
+    names = ["orders", settings.ORDERS_TIMESERIES_COLLECTION]
+
+    print(f"{'coleção':>12} {'documentos':>11} {'dados MB':>9} {'índices MB':>11}")
+    for name in names:
+        stats = await storage_stats(db, name)
+        print(f"{name:>12} {stats['documents']:>11} {stats['storage'] / 1024 / 1024:>9.2f} "
+              f"{stats['indexes'] / 1024 / 1024:>11.2f}")
+
+    match_stage = {"date": {"$gte": datetime.utcnow() - timedelta(days=args.days)}}
+    print(f"\nAgregações dos últimos {args.days} dias, mediana de {args.runs} execuções (ms)")
+    print(f"{'pipeline':>14} " + " ".join(f"{name:>12}" for name in names))
+
+    for label in dashboard_pipelines(match_stage):
+        results = []
+        for name in names:
+            pipeline = dashboard_pipelines(adapt_match(match_stage, name))[label]
+            results.append(await time_pipeline(db[name], pipeline, args.runs))
+        print(f"{label:>14} " + " ".join(f"{ms:>12.1f}" for ms in results))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara orders com a cópia time-series')
+    parser.add_argument('--days', type=int, default=90, help='Intervalo de datas das agregações')
+    parser.add_argument('--runs', type=int, default=5, help='Execuções por pipeline')
+
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,30 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services.related_products import build
+
+async def main(args):
+    mode = "completa" if args.full else "incremental"
+    print(f"Calculando produtos comprados juntos (execução {mode}, top {args.top_k or settings.RELATED_PRODUCTS_TOP_K})...")
+
+    start = time.perf_counter()
+    report = await build(full=args.full, batch_size=args.batch_size, k=args.top_k, path=args.matrix_path)
+
+    print(f"{report['orders']} pedidos lidos, {report['products']} produtos, {report['pairs']} pares na matriz")
+    print(f"Vizinhos regravados para {report['updated']} produtos em {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gera as recomendações "comprados juntos" a partir dos pedidos')
+    parser.add_argument('--full', action='store_true', help='Recalcular do zero em vez de somar só os pedidos novos')
+    parser.add_argument('--batch-size', type=int, default=50000, help='Pedidos por lote da matriz')
+    parser.add_argument('--top-k', type=int, default=None, help='Vizinhos gravados por produto')
+    parser.add_argument('--matrix-path', default=None, help='Arquivo .npz com o estado da matriz')
+
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -16,5 +16,23 @@ def create_bucket():
     except Exception as e:
         print(f"Error creating bucket: {str(e)}")
 
+    # CORS para o navegador enviar imagens direto ao bucket com URLs pré-assinadas
+    try:
+        s3.put_bucket_cors(
+            Bucket='product-images',
+            CORSConfiguration={
+                'CORSRules': [{
+                    'AllowedOrigins': ['*'],
+                    'AllowedMethods': ['PUT', 'POST', 'GET', 'HEAD'],
+                    'AllowedHeaders': ['*'],
+                    'ExposeHeaders': ['ETag'],
+                    'MaxAgeSeconds': 3000
+                }]
+            }
+        )
+        print("CORS configured for bucket 'product-images'")
+    except Exception as e:
+        print(f"Error configuring bucket CORS: {str(e)}")
+
 if __name__ == "__main__":
     create_bucket()
\ No newline at end of file
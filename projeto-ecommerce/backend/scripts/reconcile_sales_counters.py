@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.order_archive import archive_watermark
+from app.services.sales_counters import reconcile
+
+async def main(args):
+    # Dias já arquivados não têm mais pedidos no Mongo para comparar
+    since = await archive_watermark()
+    print("Reconciliando product_sales_daily com os pedidos" + (f" a partir de {since:%Y-%m-%d}..." if since else "..."))
+    report = await reconcile(dry_run=args.dry_run, since=since)
+
+    drift = report["missing"] + report["mismatched"] + report["extra"]
+    print(f"Contadores verificados: {report['checked']}")
+    print(f"Ausentes: {report['missing']}, divergentes: {report['mismatched']}, sobrando: {report['extra']}")
+    if report["samples"]:
+        print("Exemplos de divergência:")
+        for sample in report["samples"]:
+            print(f"  {json.dumps(sample)}")
+
+    if args.dry_run:
+        print("Modo dry-run: nenhuma correção aplicada.")
+    else:
+        print(f"Correções aplicadas: {report['fixed']}")
+
+    # Código de saída diferente de zero permite alertar sobre drift em um cron
+    if args.fail_on_drift and drift:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconstrói os contadores diários de vendas a partir dos pedidos')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas reportar o drift, sem corrigir')
+    parser.add_argument('--fail-on-drift', action='store_true', help='Sair com código 1 se houver drift')
+
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -6,6 +6,12 @@ import random
 from motor.motor_asyncio import AsyncIOMotorClient
 import argparse
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.sales_counters import COLLECTION as SALES_COUNTERS, expected_counters_pipeline
+from app.services.order_categories import order_category_ids
 
 fake = Faker('pt_BR')
 
@@ -104,10 +110,11 @@ async def create_orders(db, products, num_orders=100):
             random.randint(1, 5)
         )
 
-        total = sum(
-            next(p["price"] for p in products if p["_id"] == prod_id)
+        order_product_docs = [
+            next(p for p in products if p["_id"] == prod_id)
             for prod_id in order_products
-        )
+        ]
+        total = sum(p["price"] for p in order_product_docs)
 
         order_date = fake.date_time_between(
             start_date=start_date,
@@ -118,6 +125,7 @@ async def create_orders(db, products, num_orders=100):
             "_id": ObjectId(),
             "date": order_date,
             "product_ids": order_products,
+            "category_ids": order_category_ids(order_product_docs),
             "total": round(total, 2),
             "status": random.choice(["completed", "pending", "cancelled"]),
             "customer_name": fake.name(),
@@ -130,6 +138,23 @@ async def create_orders(db, products, num_orders=100):
 
     return orders
 
+async def rebuild_sales_counters(db):
+    """Os pedidos do seed são inseridos direto no banco: recalcula os contadores diários"""
+    await db.orders.aggregate(expected_counters_pipeline() + [
+        {
+            "$project": {
+                "_id": 0,
+                "product_id": "$_id.product_id",
+                "day": "$_id.day",
+                "orders": 1,
+                "units": 1,
+                "revenue": 1
+            }
+        },
+        # $out substitui a coleção mantendo os índices existentes
+        {"$out": SALES_COUNTERS}
+    ], allowDiskUse=True).to_list(None)
+
 async def main(args):
     print("Conectando ao MongoDB...")
     db = await connect_to_mongo()
@@ -139,6 +164,7 @@ async def main(args):
         await db.categories.delete_many({})
         await db.products.delete_many({})
         await db.orders.delete_many({})
+        await db[SALES_COUNTERS].delete_many({})
 
     print(f"Criando {args.categories} categorias...")
     categories = await create_categories(db, args.categories)
@@ -152,6 +178,9 @@ async def main(args):
     orders = await create_orders(db, products, args.orders)
     print(f"Criados {len(orders)} pedidos.")
 
+    print("Recalculando contadores de vendas por produto...")
+    await rebuild_sales_counters(db)
+
     print("População de dados concluída!")
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+
+# Substituto local de um collector OpenTelemetry: recebe OTLP/JSON em
+# POST /v1/traces (TRACING_EXPORTER=otlp) e grava cada lote como uma linha,
+# no mesmo formato do exportador em arquivo. Com --show imprime um trace como
+# árvore de spans, juntando os arquivos da API e da Lambda.
+
+def serve(port: int, output: str):
+    lock = Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self.send_error(400, "Invalid OTLP/JSON payload")
+                return
+            with lock, open(output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload) + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    print(f"Recebendo spans em http://0.0.0.0:{port}/v1/traces -> {output}")
+    ThreadingHTTPServer(("0.0.0.0", port), Handler).serve_forever()
+
+def load_spans(paths, trace_id: str):
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                payload = json.loads(line)
+                for resource in payload.get("resourceSpans", []):
+                    service = next(
+                        (a["value"].get("stringValue") for a in resource.get("resource", {}).get("attributes", [])
+                         if a["key"] == "service.name"),
+                        "?"
+                    )
+                    for scope in resource.get("scopeSpans", []):
+                        for span in scope.get("spans", []):
+                            if span["traceId"] == trace_id:
+                                spans.append({**span, "service": service})
+    return spans
+
+def show(paths, trace_id: str):
+    spans = load_spans(paths, trace_id)
+    if not spans:
+        print(f"Trace {trace_id} não encontrado")
+        sys.exit(1)
+
+    ids = {span["spanId"] for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        # Pais que não estão nos arquivos (ex.: traceparent de um cliente) viram raiz
+        parent = span.get("parentSpanId") if span.get("parentSpanId") in ids else None
+        children[parent].append(span)
+
+    def walk(parent, depth):
+        for span in sorted(children[parent], key=lambda s: int(s["startTimeUnixNano"])):
+            duration = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+            error = "  [erro: " + span["status"].get("message", "") + "]" if span.get("status", {}).get("code") == 2 else ""
+            print(f"{'  ' * depth}{span['name']:<{50 - 2 * depth}} {duration:10.2f} ms  {span['service']}{error}")
+            walk(span["spanId"], depth + 1)
+
+    walk(None, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Collector OTLP/JSON local e visualização de traces")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", default="/data/traces/collector.jsonl", help="Arquivo onde os lotes recebidos são gravados")
+    parser.add_argument("--show", metavar="TRACE_ID", help="Imprime o trace (ex.: o X-Trace-Id de uma resposta) e sai")
+    parser.add_argument("--files", nargs="+", help="Arquivos lidos por --show (padrão: --output)")
+    args = parser.parse_args()
+
+    if args.show:
+        show(args.files or [args.output], args.show.lower())
+    else:
+        serve(args.port, args.output)
+
+if __name__ == "__main__":
+    main()
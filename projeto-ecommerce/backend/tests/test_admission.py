@@ -0,0 +1,87 @@
+import pytest
+import sys
+import os
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.admission import AdmissionControlMiddleware, AdmissionGate, classify_request
+from app.core import metrics
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def test_classify_request():
+    """Cada rota deve cair na classe correta"""
+    assert classify_request("POST", "/api/v1/orders/") == "order_writes"
+    assert classify_request("GET", "/api/v1/orders/") == "catalog_reads"
+    assert classify_request("GET", "/api/v1/products/abc") == "catalog_reads"
+    assert classify_request("GET", "/api/v1/dashboard/sales") == "analytics"
+    assert classify_request("GET", "/api/v1/exports/orders") == "exports"
+    assert classify_request("POST", "/api/v1/products/with-image/") == "uploads"
+    assert classify_request("GET", "/api/v1/dashboard/sales/stream") is None
+    assert classify_request("GET", "/docs") is None
+
+@pytest.mark.asyncio
+async def test_gate_queues_then_rejects_when_full():
+    """Acima do limite a requisição espera; com a fila cheia é rejeitada"""
+    gate = AdmissionGate("analytics", limit=1, queue_depth=1, queue_timeout=1.0)
+
+    assert await gate.acquire()
+    queued = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+
+    assert gate.waiting == 1
+    assert not await gate.acquire()
+    assert metrics.get_counter("admission_rejected_total", route_class="analytics", reason="queue_full") == 1
+
+    gate.release()
+    assert await queued
+    assert metrics.get_summary("admission_queue_wait_seconds", route_class="analytics")["count"] == 2
+
+@pytest.mark.asyncio
+async def test_gate_rejects_after_queue_timeout():
+    """Requisições na fila devem desistir após o timeout configurado"""
+    gate = AdmissionGate("uploads", limit=1, queue_depth=5, queue_timeout=0.01)
+
+    assert await gate.acquire()
+    assert not await gate.acquire()
+    assert gate.waiting == 0
+    assert metrics.get_counter("admission_rejected_total", route_class="uploads", reason="queue_timeout") == 1
+
+@pytest.mark.asyncio
+async def test_streaming_exports_do_not_starve_dashboard():
+    """Exportações longas ocupam só as vagas da própria classe"""
+    streaming = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["path"].startswith("/api/v1/exports"):
+            await streaming.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionControlMiddleware(app)
+
+    async def request(path):
+        statuses = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await middleware({"type": "http", "method": "GET", "path": path}, None, send)
+        return statuses[0]
+
+    exports_limit = middleware.gates["exports"].limit
+    exports = [asyncio.create_task(request("/api/v1/exports/orders")) for _ in range(exports_limit)]
+    await asyncio.sleep(0)
+
+    assert middleware.gates["exports"].active == exports_limit
+    dashboard = [await request("/api/v1/dashboard/sales") for _ in range(middleware.gates["analytics"].limit + 1)]
+    assert dashboard == [200] * len(dashboard)
+
+    streaming.set()
+    assert await asyncio.gather(*exports) == [200] * exports_limit
@@ -0,0 +1,76 @@
+import pytest
+import sys
+import os
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import approx_sales
+
+Z_95 = approx_sales.z_score(0.95)
+
+@pytest.fixture
+def population():
+    """Fixture com 20 mil pedidos sintéticos em 30 dias"""
+    rng = random.Random(42)
+    products = [ObjectId() for _ in range(10)]
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "date": start + timedelta(minutes=rng.randrange(30 * 24 * 60)),
+            "total": round(rng.uniform(10, 500), 2),
+            "product_ids": rng.sample(products, rng.randint(1, 3))
+        }
+        for _ in range(20000)
+    ]
+
+def test_z_score():
+    """Nível de confiança de 95% corresponde a z ≈ 1,96"""
+    assert Z_95 == pytest.approx(1.96, abs=0.01)
+
+def test_full_sample_is_exact(population):
+    """Amostrar a população inteira dá o valor exato e intervalo de largura zero"""
+    metrics, intervals = approx_sales.estimate_metrics(population, len(population), len(population), Z_95)
+
+    assert metrics["total_orders"] == len(population)
+    assert metrics["total_revenue"] == pytest.approx(sum(o["total"] for o in population))
+    assert intervals["total_revenue"][0] == pytest.approx(intervals["total_revenue"][1])
+
+def test_interval_contains_true_value(population):
+    """Com filtro e amostras de 2 mil pedidos, o intervalo de 95% cobre os totais reais na maioria das vezes"""
+    cutoff = datetime(2025, 1, 16)
+    matching = [o for o in population if o["date"] >= cutoff]
+    revenue = sum(o["total"] for o in matching)
+
+    covered_orders = covered_revenue = 0
+    for seed in range(100):
+        sample = random.Random(seed).sample(population, 2000)
+        hits = [o for o in sample if o["date"] >= cutoff]
+        metrics, intervals = approx_sales.estimate_metrics(hits, len(sample), len(population), Z_95)
+
+        covered_orders += intervals["total_orders"][0] <= len(matching) <= intervals["total_orders"][1]
+        covered_revenue += intervals["total_revenue"][0] <= revenue <= intervals["total_revenue"][1]
+        assert abs(metrics["total_orders"] - len(matching)) / len(matching) < 0.1
+
+    assert covered_orders >= 88
+    assert covered_revenue >= 88
+
+def test_estimated_daily_series(population):
+    """A série estimada soma aproximadamente o total de pedidos e traz intervalos por dia"""
+    sample = random.Random(3).sample(population, 5000)
+    series = approx_sales.estimate_time_series(sample, len(sample), len(population), Z_95)
+
+    assert len(series) == 30
+    assert series[0]["date"] == datetime(2025, 1, 1)
+    assert sum(day["orders"] for day in series) == pytest.approx(len(population), rel=0.01)
+    for day in series:
+        assert day["orders_interval"][0] <= day["orders"] <= day["orders_interval"][1]
+
+def test_top_products_respects_filter(population):
+    """O top-N estimado considera apenas os produtos do filtro"""
+    allowed = population[0]["product_ids"][:1]
+    top = approx_sales.estimate_top_products(population, len(population), len(population), allowed)
+
+    assert [p["_id"] for p in top] == allowed
@@ -0,0 +1,30 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import aws
+
+@pytest.fixture(autouse=True)
+def clean_clients():
+    aws._clients.clear()
+    yield
+    aws._clients.clear()
+
+def test_clients_are_cached_per_service_and_endpoint():
+    """O mesmo cliente deve ser reaproveitado entre requisições"""
+    s3 = aws.get_s3_client()
+
+    assert aws.get_s3_client() is s3
+    assert aws.get_s3_client("http://localhost:4566") is not s3
+    assert aws.get_lambda_client() is aws.get_lambda_client()
+    assert s3.meta.config.max_pool_connections == aws.settings.AWS_MAX_POOL_CONNECTIONS
+
+def test_clients_are_not_shared_across_processes():
+    """Após um fork o processo filho deve criar seus próprios clientes"""
+    s3 = aws.get_s3_client()
+
+    with patch.object(aws.os, "getpid", return_value=os.getpid() + 1):
+        assert aws.get_s3_client() is not s3
@@ -0,0 +1,89 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch, MagicMock, AsyncMock
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import category_cleanup
+
+@pytest.fixture
+def category_id():
+    return ObjectId("507f1f77bcf86cd799439011")
+
+@pytest.fixture
+def collections():
+    """Fixture com mocks das coleções usadas pelo job"""
+    products = MagicMock()
+    products.update_many = AsyncMock(side_effect=lambda f, u: MagicMock(
+        modified_count=len(f["_id"]["$in"])
+    ))
+    orders = MagicMock()
+    orders.update_many = AsyncMock(side_effect=lambda f, u: MagicMock(
+        modified_count=len(f["_id"]["$in"])
+    ))
+    return {
+        "products": products,
+        "orders": orders,
+        "categories": AsyncMock(),
+        "category_deletions": AsyncMock()
+    }
+
+def make_find(batches):
+    """Simula find().limit().to_list() devolvendo um lote por chamada"""
+    cursor = MagicMock()
+    cursor.limit.return_value = cursor
+    cursor.to_list = AsyncMock(side_effect=batches)
+    return MagicMock(return_value=cursor)
+
+@pytest.mark.asyncio
+async def test_cleanup_runs_in_bounded_batches(collections, category_id):
+    """O job deve processar os produtos em lotes e registrar o progresso"""
+    batches = [
+        [{"_id": ObjectId()} for _ in range(2)],
+        [{"_id": ObjectId()}],
+        []
+    ]
+    collections["products"].find = make_find(batches)
+    collections["orders"].find = make_find([[{"_id": ObjectId()}], []])
+
+    async def fake_get_collection(name):
+        return collections[name]
+
+    with patch.object(category_cleanup, "get_collection", side_effect=fake_get_collection):
+        processed = await category_cleanup.run_category_cleanup(
+            category_id, batch_size=2, throttle_seconds=0
+        )
+
+    assert processed == 3
+    assert collections["products"].update_many.await_count == 2
+    collections["products"].find.return_value.limit.assert_called_with(2)
+    # Categorias desnormalizadas nos pedidos também são removidas
+    collections["orders"].update_many.assert_awaited_once()
+
+    progress_updates = [
+        c.args[1] for c in collections["category_deletions"].update_one.await_args_list
+        if "$inc" in c.args[1]
+    ]
+    assert progress_updates == [{"$inc": {"processed": 2}}, {"$inc": {"processed": 1}}]
+
+    collections["categories"].delete_one.assert_awaited_once_with({"_id": category_id})
+    final_status = collections["category_deletions"].update_one.await_args_list[-1].args[1]
+    assert final_status["$set"]["status"] == "completed"
+
+@pytest.mark.asyncio
+async def test_cleanup_marks_job_failed_on_error(collections, category_id):
+    """Erros no meio do job devem ficar registrados para permitir nova tentativa"""
+    collections["products"].find = make_find([Exception("primary indisponível")])
+
+    async def fake_get_collection(name):
+        return collections[name]
+
+    with patch.object(category_cleanup, "get_collection", side_effect=fake_get_collection):
+        with pytest.raises(Exception):
+            await category_cleanup.run_category_cleanup(category_id, throttle_seconds=0)
+
+    collections["categories"].delete_one.assert_not_awaited()
+    final_status = collections["category_deletions"].update_one.await_args_list[-1].args[1]
+    assert final_status["$set"]["status"] == "failed"
@@ -0,0 +1,66 @@
+import pytest
+import sys
+import os
+import io
+import hashlib
+from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
+from starlette.datastructures import UploadFile, Headers
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1 import products
+
+def make_upload(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(content),
+        filename=filename,
+        headers=Headers({"content-type": "image/jpeg"})
+    )
+
+@pytest.fixture
+def fake_s3():
+    """Mock do S3 que guarda os objetos enviados em um dicionário"""
+    objects = {}
+    s3 = MagicMock()
+
+    def head_object(Bucket, Key):
+        if Key not in objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(objects[Key])}
+
+    def put_object(Bucket, Key, Body, ContentType, CacheControl):
+        objects[Key] = Body.read() if hasattr(Body, "read") else Body
+
+    s3.head_object.side_effect = head_object
+    s3.put_object.side_effect = put_object
+    s3.objects = objects
+    return s3
+
+@pytest.mark.asyncio
+async def test_key_is_derived_from_content(fake_s3):
+    """A chave deve ser o SHA-256 do conteúdo, não o nome do arquivo"""
+    content = b"conteudo da imagem"
+
+    with patch.object(products, "get_s3_client", return_value=fake_s3):
+        url = await products.upload_file_to_s3(make_upload(content, "Foto.JPG"))
+
+    expected_key = f"products/{hashlib.sha256(content).hexdigest()}"
+    assert url.endswith(expected_key)
+    assert fake_s3.objects[expected_key] == content
+    assert fake_s3.put_object.call_args.kwargs["CacheControl"] == products.IMMUTABLE_CACHE_CONTROL
+    assert fake_s3.put_object.call_args.kwargs["ContentType"] == "image/jpeg"
+
+@pytest.mark.asyncio
+async def test_duplicate_upload_costs_only_a_head(fake_s3):
+    """Conteúdo repetido com outro nome ou extensão não deve gerar um novo PUT"""
+    with patch.object(products, "get_s3_client", return_value=fake_s3):
+        first = await products.upload_file_to_s3(make_upload(b"mesma imagem", "a.jpg"))
+        second = await products.upload_file_to_s3(make_upload(b"mesma imagem", "B.JPEG"))
+        third = await products.upload_file_to_s3(make_upload(b"mesma imagem", "sem-extensao"))
+        other = await products.upload_file_to_s3(make_upload(b"outra imagem", "a.jpg"))
+
+    assert first == second == third
+    assert other != first
+    assert fake_s3.put_object.call_count == 2
+    assert fake_s3.head_object.call_count == 4
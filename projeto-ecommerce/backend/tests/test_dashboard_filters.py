@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch, MagicMock, AsyncMock
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1 import dashboard
+from app.services import sales_counters
+from app.services.order_categories import order_category_ids
+
+CATEGORY_ID = "507f1f77bcf86cd799439011"
+
+@pytest.mark.asyncio
+async def test_category_filter_stays_in_database():
+    """Só com category_ids o $match usa o campo dos pedidos, sem ler produtos"""
+    fake_get_collection = AsyncMock()
+
+    with patch.object(dashboard, "get_collection", fake_get_collection):
+        match_stage = await dashboard.build_match_stage(category_ids=[CATEGORY_ID])
+
+    fake_get_collection.assert_not_awaited()
+    assert match_stage == {"category_ids": {"$in": [ObjectId(CATEGORY_ID)]}}
+
+@pytest.mark.asyncio
+async def test_product_filter_fetches_only_ids():
+    """Com product_ids a consulta aos produtos projeta só o _id"""
+    product_id = ObjectId()
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[{"_id": product_id}])
+    products = MagicMock()
+    products.find = MagicMock(return_value=cursor)
+
+    with patch.object(dashboard, "get_collection", AsyncMock(return_value=products)):
+        match_stage = await dashboard.build_match_stage(
+            product_ids=[str(product_id)], category_ids=[CATEGORY_ID]
+        )
+
+    query, projection = products.find.call_args.args
+    assert query["category_ids"] == {"$in": [ObjectId(CATEGORY_ID)]}
+    assert projection == {"_id": 1}
+    assert match_stage == {"product_ids": {"$in": [product_id]}}
+
+def test_ranking_filters_category_before_limit():
+    """Com categoria, o $match em product_info vem antes do $limit"""
+    category_filter = {"$in": [ObjectId(CATEGORY_ID)]}
+    stages = [list(stage)[0] for stage in sales_counters.rank_products_stages(category_filter)]
+
+    assert stages.index("$match") < stages.index("$limit")
+    assert [list(stage)[0] for stage in sales_counters.rank_products_stages()][:2] == ["$sort", "$limit"]
+
+def test_order_categories():
+    """O pedido guarda a união das categorias dos seus produtos"""
+    a, b = ObjectId(), ObjectId()
+    products = [{"category_ids": [a, b]}, {"category_ids": [a]}, {}]
+
+    assert order_category_ids(products) == sorted([a, b])
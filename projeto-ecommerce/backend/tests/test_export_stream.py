@@ -0,0 +1,102 @@
+import pytest
+import sys
+import os
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import export_stream
+from app.api.v1 import exports
+
+@pytest.fixture
+def sample_rows():
+    """Fixture com pedidos no formato retornado pelo Motor"""
+    return [
+        {
+            "_id": ObjectId("60c72b2f5e75e10001d56f0d"),
+            "date": datetime(2025, 2, 24, 10, 0),
+            "total": 29.99,
+            "product_ids": [ObjectId("60c72b2f5e75e10001d56f0c")]
+        },
+        {
+            "_id": ObjectId("60c72b2f5e75e10001d56f0e"),
+            "date": datetime(2025, 2, 23, 14, 30),
+            "total": 59.98,
+            "product_ids": []
+        }
+    ]
+
+async def collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+async def as_async(rows):
+    for row in rows:
+        yield row
+
+def test_cursor_round_trip():
+    """O token deve devolver exatamente a posição codificada"""
+    date = datetime(2025, 2, 24, 10, 0, 0, 123000)
+    object_id = ObjectId("60c72b2f5e75e10001d56f0d")
+
+    assert export_stream.decode_cursor(export_stream.encode_cursor(date, object_id)) == (date, object_id)
+    assert export_stream.decode_cursor(export_stream.encode_cursor(date)) == (date, None)
+
+@pytest.mark.asyncio
+async def test_serialize_csv_and_ndjson(sample_rows):
+    """CSV deve ter cabeçalho e NDJSON um objeto por linha"""
+    columns = ["_id", "date", "total", "product_ids"]
+
+    csv_data = await collect(export_stream.serialize_rows(as_async(sample_rows), columns, "csv"))
+    rows = list(csv.reader(io.StringIO(csv_data.decode())))
+    assert rows[0] == columns
+    assert rows[1] == ["60c72b2f5e75e10001d56f0d", "2025-02-24T10:00:00", "29.99", "60c72b2f5e75e10001d56f0c"]
+
+    ndjson_data = await collect(export_stream.serialize_rows(as_async(sample_rows), columns, "ndjson"))
+    lines = [json.loads(line) for line in ndjson_data.decode().splitlines()]
+    assert len(lines) == 2
+    assert lines[1]["product_ids"] == []
+
+@pytest.mark.asyncio
+async def test_gzip_stream(sample_rows):
+    """A saída comprimida deve ser um gzip válido do mesmo conteúdo"""
+    columns = ["_id", "total"]
+    plain = await collect(export_stream.serialize_rows(as_async(sample_rows), columns, "csv"))
+    compressed = await collect(export_stream.gzip_stream(
+        export_stream.serialize_rows(as_async(sample_rows), columns, "csv")
+    ))
+
+    assert gzip.decompress(compressed) == plain
+
+@pytest.mark.parametrize("path", ["/api/v1/exports/orders", "/api/v1/exports/sales/time-series"])
+def test_archived_days_are_rejected(path):
+    """Intervalos que alcançam dias arquivados recebem 400 em vez de uma exportação incompleta"""
+    app = FastAPI()
+    app.include_router(exports.router, prefix="/api/v1/exports")
+
+    async def empty_cursor():
+        return
+        yield
+
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.batch_size.return_value = empty_cursor()
+    collection.aggregate.return_value = empty_cursor()
+
+    with patch.object(exports, "archive_watermark", AsyncMock(return_value=datetime(2024, 1, 1))), \
+         patch.object(exports, "get_collection", AsyncMock(return_value=collection)):
+        client = TestClient(app)
+        without_start = client.get(path)
+        before = client.get(path, params={"start_date": "2023-12-31T00:00:00"})
+        after = client.get(path, params={"start_date": "2024-01-01T00:00:00"})
+
+    assert without_start.status_code == 400
+    assert "2024-01-01" in without_start.json()["detail"]
+    assert before.status_code == 400
+    assert after.status_code == 200
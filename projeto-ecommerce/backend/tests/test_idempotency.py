@@ -0,0 +1,126 @@
+import pytest
+import sys
+import os
+import json
+import asyncio
+from unittest.mock import patch
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import idempotency
+from app.core import metrics
+
+class FakeKeysCollection:
+    """Coleção em memória com _id único, suficiente para a trava de idempotência"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def insert_one(self, document):
+        await asyncio.sleep(0)
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("duplicate key")
+        self.documents[document["_id"]] = dict(document)
+
+    async def find_one(self, query):
+        document = self.documents.get(query["_id"])
+        return dict(document) if document else None
+
+    async def update_one(self, query, update):
+        self.documents[query["_id"]].update(update["$set"])
+
+    async def delete_one(self, query):
+        document = self.documents.get(query["_id"])
+        if document and document["status"] == query["status"]:
+            del self.documents[query["_id"]]
+
+    async def find_one_and_update(self, query, update):
+        return None
+
+@pytest.fixture
+def keys_collection():
+    collection = FakeKeysCollection()
+
+    async def fake_get_collection(name, subsystem=None, budget=None):
+        return collection
+
+    idempotency._cache.clear()
+    metrics.reset()
+    with patch("app.services.idempotency.get_collection", side_effect=fake_get_collection):
+        yield collection
+    idempotency._cache.clear()
+    metrics.reset()
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_run_handler_once(keys_collection):
+    """Duplicatas simultâneas esperam a primeira e recebem a mesma resposta"""
+    calls = 0
+
+    async def handler():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"_id": "order-1", "total": 10.0}
+
+    responses = await asyncio.gather(*[
+        idempotency.execute("create_order", "key-1", {"total": 10}, handler) for _ in range(5)
+    ])
+
+    assert calls == 1
+    assert all(json.loads(r.body) == {"_id": "order-1", "total": 10.0} for r in responses)
+    assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 4
+
+@pytest.mark.asyncio
+async def test_replay_comes_from_store_without_running_handler(keys_collection):
+    """Depois de concluída, a chave é respondida pelo LRU ou pela coleção"""
+    async def handler():
+        return {"_id": "order-1"}
+
+    async def fail():
+        raise AssertionError("handler não deve rodar de novo")
+
+    await idempotency.execute("create_order", "key-1", {"total": 10}, handler)
+    cached = await idempotency.execute("create_order", "key-1", {"total": 10}, fail)
+    assert metrics.get_counter("idempotency_requests_total", scope="create_order", result="cache_hit") == 1
+
+    # Outro processo, sem o LRU, lê a resposta da coleção
+    idempotency._cache.clear()
+    stored = await idempotency.execute("create_order", "key-1", {"total": 10}, fail)
+
+    assert json.loads(cached.body) == json.loads(stored.body) == {"_id": "order-1"}
+    assert stored.headers["Idempotent-Replayed"] == "true"
+
+@pytest.mark.asyncio
+async def test_key_reused_with_different_payload_is_rejected(keys_collection):
+    """A mesma chave com outro corpo de requisição retorna 422"""
+    async def handler():
+        return {"_id": "order-1"}
+
+    await idempotency.execute("create_order", "key-1", {"total": 10}, handler)
+    with pytest.raises(HTTPException) as exc:
+        await idempotency.execute("create_order", "key-1", {"total": 99}, handler)
+    assert exc.value.status_code == 422
+
+@pytest.mark.asyncio
+async def test_client_errors_are_stored_and_failures_release_the_key(keys_collection):
+    """Erros 4xx são repetidos; falhas inesperadas liberam a chave para nova tentativa"""
+    async def invalid():
+        raise HTTPException(status_code=400, detail="Product with id x does not exist")
+
+    response = await idempotency.execute("create_order", "key-400", {}, invalid)
+    assert response.status_code == 400
+
+    async def broken():
+        raise RuntimeError("mongo indisponível")
+
+    with pytest.raises(RuntimeError):
+        await idempotency.execute("create_order", "key-500", {}, broken)
+    assert "create_order:key-500" not in keys_collection.documents
+
+    async def handler():
+        return {"_id": "order-2"}
+
+    response = await idempotency.execute("create_order", "key-500", {}, handler)
+    assert json.loads(response.body) == {"_id": "order-2"}
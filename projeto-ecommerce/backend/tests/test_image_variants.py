@@ -0,0 +1,36 @@
+import pytest
+import sys
+import os
+import io
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.images import generate_variants
+
+@pytest.fixture
+def sample_image() -> bytes:
+    """Fixture com uma imagem JPEG 1200x800"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (1200, 800), color=(200, 30, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def test_generate_variants_sizes_and_format(sample_image):
+    """Cada variante deve respeitar o maior lado configurado e o formato WebP"""
+    variants = generate_variants(sample_image, {"thumb": 200, "medium": 600}, "WEBP", 80)
+
+    assert set(variants) == {"thumb", "medium"}
+    for name, expected in [("thumb", (200, 133)), ("medium", (600, 400))]:
+        with Image.open(io.BytesIO(variants[name])) as image:
+            assert image.format == "WEBP"
+            assert image.size == expected
+
+def test_generate_variants_does_not_upscale():
+    """Imagens menores que a variante não devem ser ampliadas"""
+    buffer = io.BytesIO()
+    Image.new("P", (100, 50)).save(buffer, format="PNG")
+
+    variants = generate_variants(buffer.getvalue(), {"medium": 600})
+
+    with Image.open(io.BytesIO(variants["medium"])) as image:
+        assert image.size == (100, 50)
@@ -0,0 +1,40 @@
+import sys
+import os
+import json
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Orçamento de import de app.main; ajustável por ambiente para máquinas lentas de CI
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", "3.0"))
+
+MEASURE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "heavy_modules": sorted(m for m in sys.modules if m.split(".")[0] in ("boto3", "botocore"))
+}))
+"""
+
+def measure_import():
+    """Importa app.main em um interpretador limpo, como no startup de um worker"""
+    output = subprocess.check_output(
+        [sys.executable, "-c", MEASURE_SCRIPT],
+        cwd=BACKEND_DIR,
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def test_app_main_does_not_import_boto3():
+    """boto3 e botocore devem ser carregados apenas na primeira chamada ao S3 ou à Lambda"""
+    assert measure_import()["heavy_modules"] == []
+
+def test_app_main_import_time_budget():
+    """O import de app.main não deve regredir além do orçamento"""
+    # Melhor de três execuções para reduzir o ruído da máquina
+    elapsed = min(measure_import()["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_TIME_BUDGET_SECONDS, \
+        f"Import de app.main levou {elapsed:.2f}s (orçamento {IMPORT_TIME_BUDGET_SECONDS:.2f}s)"
@@ -0,0 +1,157 @@
+import pytest
+import asyncio
+import sys
+import os
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson.timestamp import Timestamp
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.live_metrics import LiveDashboardHub
+
+@pytest.fixture
+def hub():
+    """Hub com um estado inicial de dois pedidos"""
+    hub = LiveDashboardHub()
+    hub.state.load(
+        {"total_orders": 2, "total_revenue": 30.0, "min_order_value": 10.0, "max_order_value": 20.0},
+        [{"date": datetime(2025, 2, 24), "revenue": 30.0, "orders": 2}]
+    )
+    return hub
+
+def order(total, day=24):
+    return {"_id": "x", "date": datetime(2025, 2, day, 12, 0), "total": total}
+
+def test_insert_applies_delta(hub):
+    """Um insert deve atualizar totais, extremos e o dia correspondente"""
+    hub.apply_change({"operationType": "insert", "fullDocument": order(50.0, day=25)})
+
+    metrics = hub.state.metrics()
+    assert metrics["total_orders"] == 3
+    assert metrics["total_revenue"] == 80.0
+    assert metrics["max_order_value"] == 50.0
+    assert hub.state.time_series({"2025-02-25"}) == [{"date": "2025-02-25", "revenue": 50.0, "orders": 1}]
+
+def test_update_with_pre_image_replaces_values(hub):
+    """Um update com pre-image deve trocar o valor antigo pelo novo"""
+    hub.apply_change({
+        "operationType": "update",
+        "fullDocumentBeforeChange": order(15.0),
+        "fullDocument": order(18.0)
+    })
+
+    assert hub.state.metrics()["total_revenue"] == 33.0
+    assert hub.state.metrics()["total_orders"] == 2
+    assert not hub.state.needs_resync
+
+def test_changes_without_pre_image_require_resync(hub):
+    """Sem pre-image, deletes não podem ser aplicados incrementalmente"""
+    hub.apply_change({"operationType": "delete", "documentKey": {"_id": "x"}})
+    assert hub.state.needs_resync
+
+def test_removing_extreme_value_requires_resync(hub):
+    """Remover o pedido de menor valor invalida o min mantido em memória"""
+    hub.apply_change({"operationType": "delete", "fullDocumentBeforeChange": order(10.0)})
+    assert hub.state.metrics()["total_orders"] == 1
+    assert hub.state.needs_resync
+
+class FakeStream:
+    def __init__(self, changes):
+        self.changes = changes
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            # Fim do teste: interrompe o watcher
+            raise asyncio.CancelledError()
+        change = self.changes.pop(0)
+        self.resume_token = {"_data": str(len(self.changes))}
+        return change
+
+def fake_db(snapshots, streams, calls):
+    """Banco falso: cada resync lê o próximo snapshot e cada watch abre o próximo stream"""
+    session = MagicMock(operation_time=Timestamp(1000, 5))
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+
+    def start_session(snapshot):
+        calls.append(("snapshot", snapshot))
+        return AsyncMock(return_value=session)()
+
+    def aggregate(pipeline, session):
+        cursor = MagicMock()
+        if "$group" in pipeline[0] and pipeline[0]["$group"]["_id"] is None:
+            cursor.to_list = AsyncMock(return_value=snapshots.pop(0))
+        else:
+            cursor.to_list = AsyncMock(return_value=[])
+        return cursor
+
+    def watch(**options):
+        calls.append(("watch", options))
+        return streams.pop(0)
+
+    db = MagicMock()
+    db.client.start_session.side_effect = start_session
+    db.orders.aggregate.side_effect = aggregate
+    db.orders.watch.side_effect = watch
+    db.command = AsyncMock()
+    return db
+
+@pytest.mark.asyncio
+async def test_empty_collection_then_first_insert():
+    """Sem pedidos o min começa vazio, e o primeiro insert define min e max"""
+    calls = []
+    hub = LiveDashboardHub()
+    await hub.resync(fake_db([[]], [], calls))
+
+    hub.apply_change({"operationType": "insert", "fullDocument": order(30.0)})
+
+    metrics = hub.state.metrics()
+    assert metrics["min_order_value"] == 30.0
+    assert metrics["max_order_value"] == 30.0
+
+@pytest.mark.asyncio
+async def test_stream_starts_after_snapshot_and_resyncs_with_stream_stopped():
+    """
+    O snapshot é lido antes do stream, que começa logo depois dele; um resync
+    fecha o stream e reabre a partir do novo snapshot, sem aplicar nada no meio.
+    """
+    calls = []
+    snapshots = [
+        [{"total_orders": 1, "total_revenue": 10.0, "min_order_value": 10.0, "max_order_value": 10.0}],
+        [{"total_orders": 0, "total_revenue": 0.0, "min_order_value": None, "max_order_value": None}]
+    ]
+    streams = [
+        FakeStream([
+            {"operationType": "delete", "documentKey": {"_id": "x"}},
+            {"operationType": "insert", "fullDocument": order(99.0)}
+        ]),
+        FakeStream([])
+    ]
+
+    hub = LiveDashboardHub()
+    with patch("app.services.live_metrics.get_database", AsyncMock(return_value=fake_db(snapshots, streams, calls))), \
+         patch("app.services.live_metrics.settings.LIVE_DASHBOARD_PUSH_INTERVAL_SECONDS", 0):
+        with pytest.raises(asyncio.CancelledError):
+            await hub._watch()
+
+    assert calls == [
+        ("snapshot", True),
+        ("watch", {"full_document": "updateLookup", "full_document_before_change": "whenAvailable",
+                   "start_at_operation_time": Timestamp(1000, 6)}),
+        ("snapshot", True),
+        ("watch", {"full_document": "updateLookup", "full_document_before_change": "whenAvailable",
+                   "start_at_operation_time": Timestamp(1000, 6)}),
+    ]
+    # O insert seguinte ao delete não foi aplicado: já está no novo snapshot
+    assert hub.state.metrics()["total_orders"] == 0
@@ -0,0 +1,86 @@
+import pytest
+import sys
+import os
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.projection import parse_object_ids, ids_query, in_requested_order, parse_expand
+from app.api.v1 import orders
+
+def cursor_with(documents):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=documents)
+    return cursor
+
+def test_parse_object_ids_dedupes_and_validates():
+    """ids repetidos são ignorados e ids inválidos retornam 400"""
+    first, second = ObjectId(), ObjectId()
+    assert parse_object_ids(f"{first}, {second},{first}") == [first, second]
+    assert ids_query([first]) == {"_id": {"$in": [first]}}
+    assert parse_object_ids(None) is None and ids_query(None) == {}
+
+    with pytest.raises(HTTPException) as exc:
+        parse_object_ids("not-an-id")
+    assert exc.value.status_code == 400
+
+def test_results_follow_requested_order():
+    """O $in não garante ordem: a resposta segue a ordem pedida e omite ausentes"""
+    a, b, missing = ObjectId(), ObjectId(), ObjectId()
+    documents = [{"_id": b}, {"_id": a}]
+    assert in_requested_order(documents, [a, missing, b]) == [{"_id": a}, {"_id": b}]
+
+def test_parse_expand_rejects_unknown_options():
+    assert parse_expand("products", {"products"}) == {"products"}
+    assert parse_expand(None, {"products"}) == set()
+    with pytest.raises(HTTPException):
+        parse_expand("customer", {"products"})
+
+@pytest.fixture
+def client():
+    from fastapi import FastAPI
+    app = FastAPI()
+    app.include_router(orders.router, prefix="/api/v1/orders")
+    return TestClient(app)
+
+def test_get_order_expands_products_in_one_aggregation(client):
+    """expand=products resolve os produtos com $lookup, sem uma chamada por produto"""
+    order_id, product_id = ObjectId(), ObjectId()
+    collection = MagicMock()
+    collection.aggregate.return_value = cursor_with([{
+        "_id": order_id,
+        "date": datetime(2025, 2, 24),
+        "product_ids": [product_id],
+        "total": 29.99,
+        "products": [{"_id": product_id, "name": "Teclado", "description": "ABNT2", "price": 29.99}]
+    }])
+
+    with patch("app.api.v1.orders.get_collection", AsyncMock(return_value=collection)):
+        response = client.get(f"/api/v1/orders/{order_id}", params={"expand": "products"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["products"][0]["_id"] == str(product_id)
+    assert body["products"][0]["name"] == "Teclado"
+
+    pipeline = collection.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"_id": order_id}}
+    assert pipeline[2]["$lookup"]["localField"] == "product_ids"
+
+def test_get_order_without_expand_keeps_original_shape(client):
+    """Sem expand a resposta continua sem o campo products"""
+    order_id = ObjectId()
+    collection = MagicMock()
+    collection.find.return_value = cursor_with([
+        {"_id": order_id, "date": datetime(2025, 2, 24), "product_ids": [], "total": 0.0}
+    ])
+
+    with patch("app.api.v1.orders.get_collection", AsyncMock(return_value=collection)):
+        response = client.get(f"/api/v1/orders/{order_id}")
+
+    assert response.status_code == 200
+    assert "products" not in response.json()
@@ -0,0 +1,211 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch, MagicMock, AsyncMock
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import ConnectionFailure
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import order_archive
+
+PRODUCT_A = ObjectId("60c72b2f5e75e10001d56f0c")
+PRODUCT_B = ObjectId("60c72b2f5e75e10001d56f0b")
+CATEGORY = ObjectId("60c72b2f5e75e10001d56f0a")
+
+@pytest.fixture
+def old_orders():
+    """Fixture com pedidos de dois dias antigos"""
+    return [
+        {"_id": ObjectId(), "date": datetime(2023, 3, 1, 9), "total": 10.0,
+         "product_ids": [PRODUCT_A], "category_ids": [CATEGORY], "status": "completed"},
+        {"_id": ObjectId(), "date": datetime(2023, 3, 1, 18), "total": 30.0,
+         "product_ids": [PRODUCT_B], "category_ids": []},
+        {"_id": ObjectId(), "date": datetime(2023, 3, 2, 12), "total": 20.0,
+         "product_ids": [PRODUCT_A, PRODUCT_B], "category_ids": [CATEGORY]}
+    ]
+
+@pytest.fixture
+def store(tmp_path, old_orders):
+    """Fixture com os pedidos gravados em um arquivo Parquet local"""
+    store = order_archive.LocalArchiveStore(str(tmp_path))
+    store.write("orders/part.parquet", order_archive.orders_to_parquet(old_orders))
+    return store
+
+def test_parquet_without_filters(store):
+    """Métricas por dia lidas do Parquet batem com os pedidos"""
+    result = order_archive.read_archived_metrics(store, ["orders/part.parquet"], None, None)
+
+    assert result["days"][datetime(2023, 3, 1)] == {"revenue": 40.0, "orders": 2}
+    assert result["days"][datetime(2023, 3, 2)] == {"revenue": 20.0, "orders": 1}
+    assert (result["min_order_value"], result["max_order_value"]) == (10.0, 30.0)
+
+def test_parquet_list_filters(store):
+    """Filtros de produto e categoria consideram qualquer item da lista"""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(os.path.join(store.path, "orders/part.parquet"))
+    by_category = order_archive.filter_rows(table, None, [str(CATEGORY)])
+    by_product = order_archive.filter_rows(table, [str(PRODUCT_B)], None)
+
+    assert by_category["total"].to_pylist() == [10.0, 20.0]
+    assert by_product["total"].to_pylist() == [30.0, 20.0]
+
+def test_files_are_aggregated_one_at_a_time(store):
+    """Cada arquivo vira métricas parciais antes do próximo ser lido"""
+    store.write("orders/late.parquet", order_archive.orders_to_parquet([
+        {"_id": ObjectId(), "date": datetime(2023, 3, 1, 20), "total": 5.0,
+         "product_ids": [PRODUCT_A], "category_ids": []}
+    ]))
+    reads = []
+    original_read = store.read
+    store.read = lambda key: reads.append(key) or original_read(key)
+    rows_to_metrics = order_archive.rows_to_metrics
+    aggregated = []
+
+    def spy_rows_to_metrics(table):
+        # Arquivos lidos até aqui e linhas (já filtradas) agregadas nesta chamada
+        aggregated.append((len(reads), len(table)))
+        return rows_to_metrics(table)
+
+    with patch.object(order_archive, "rows_to_metrics", side_effect=spy_rows_to_metrics):
+        result = order_archive.read_archived_metrics(
+            store, ["orders/part.parquet", "orders/late.parquet"], [str(PRODUCT_A)], None
+        )
+
+    assert aggregated == [(1, 2), (2, 1)]
+    assert result["days"][datetime(2023, 3, 1)] == {"revenue": 15.0, "orders": 2}
+    assert result["days"][datetime(2023, 3, 2)] == {"revenue": 20.0, "orders": 1}
+    assert (result["min_order_value"], result["max_order_value"]) == (5.0, 20.0)
+
+def test_part_key_is_deterministic(old_orders):
+    """Rodar de novo com os mesmos pedidos gera a mesma chave"""
+    day = datetime(2023, 3, 1)
+    assert order_archive.part_key(day, old_orders) == order_archive.part_key(day, list(reversed(old_orders)))
+    assert order_archive.part_key(day, old_orders).startswith("orders/date=2023-03-01/part-")
+
+def test_combine_mongo_and_archive():
+    """Sem pedidos no Mongo, os extremos vêm só do arquivo"""
+    archived = {"total_orders": 3, "total_revenue": 60.0, "min_order_value": 10.0, "max_order_value": 30.0}
+    empty = {"total_orders": 0, "total_revenue": 0, "min_order_value": 0, "max_order_value": 0}
+    live = {"total_orders": 1, "total_revenue": 5.0, "min_order_value": 5.0, "max_order_value": 5.0}
+
+    assert order_archive.combine_metrics(empty, archived)["min_order_value"] == 10.0
+    combined = order_archive.combine_metrics(live, archived)
+    assert combined["total_orders"] == 4
+    assert combined["avg_order_value"] == pytest.approx(16.25)
+    assert combined["min_order_value"] == 5.0
+
+def test_time_series_sums_repeated_days():
+    """Pedidos atrasados de um dia arquivado somam ao dia do arquivo"""
+    day = datetime(2023, 3, 1)
+    series = order_archive.combine_time_series(
+        [{"date": day, "revenue": 5.0, "orders": 1}],
+        [{"date": day, "revenue": 40.0, "orders": 2}]
+    )
+    assert series == [{"date": day, "revenue": 45.0, "orders": 3}]
+
+@pytest.mark.asyncio
+async def test_orders_leave_mongo_after_summary(old_orders):
+    """O dia é gravado e resumido antes dos pedidos serem removidos"""
+    day_orders = old_orders[:2]
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=day_orders)
+    orders = MagicMock()
+    orders.find = MagicMock(return_value=cursor)
+    orders.delete_many = AsyncMock()
+    summaries = AsyncMock()
+    summaries.find_one.return_value = None
+    store = MagicMock()
+    calls = []
+    summaries.update_one.side_effect = lambda *a, **k: calls.append("summary")
+    orders.delete_many.side_effect = lambda *a, **k: calls.append("delete")
+
+    async def fake_get_collection(name, subsystem=None):
+        return {"orders": orders, order_archive.SUMMARY_COLLECTION: summaries}[name]
+
+    with patch.object(order_archive, "get_collection", side_effect=fake_get_collection):
+        stats = await order_archive.archive_day(datetime(2023, 3, 1), store)
+
+    assert stats["orders"] == 2
+    assert calls == ["summary", "delete", "summary"]
+    store.write.assert_called_once()
+    update = summaries.update_one.call_args_list[0].args[1]
+    assert update["$inc"]["revenue"] == 40.0
+    assert update["$min"] == {"min_order_value": 10.0}
+
+class FakeOrders:
+    """Coleção de pedidos em memória; delete_many pode falhar a partir de uma chamada"""
+
+    def __init__(self, documents, fail_on_delete=None):
+        self.documents = list(documents)
+        self.fail_on_delete = fail_on_delete
+        self.deletes = 0
+
+    def find(self, query):
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(return_value=[
+            o for o in self.documents if query["date"]["$gte"] <= o["date"] < query["date"]["$lt"]
+        ])
+        return cursor
+
+    async def delete_many(self, query):
+        self.deletes += 1
+        if self.deletes == self.fail_on_delete:
+            raise ConnectionFailure("conexão perdida")
+        ids = set(query["_id"]["$in"])
+        self.documents = [o for o in self.documents if o["_id"] not in ids]
+
+class FakeSummaries:
+    """Resumos em memória com os operadores usados por archive_day"""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query, projection=None):
+        document = self.documents.get(query["_id"])
+        return dict(document) if document else None
+
+    async def update_one(self, query, update, upsert=False):
+        document = self.documents.setdefault(query["_id"], {"_id": query["_id"]})
+        for field, value in update.get("$inc", {}).items():
+            document[field] = document.get(field, 0) + value
+        for field, value in update.get("$push", {}).items():
+            document.setdefault(field, []).append(value)
+        document.update(update.get("$set", {}))
+        for field in update.get("$unset", {}):
+            document.pop(field, None)
+
+@pytest.mark.asyncio
+async def test_rerun_after_partial_delete_does_not_archive_twice(tmp_path):
+    """Pedidos que sobraram de uma remoção interrompida não vão para um segundo arquivo"""
+    day = datetime(2023, 3, 1)
+    day_orders = [
+        {"_id": ObjectId(), "date": datetime(2023, 3, 1, 12), "total": 1.0, "product_ids": [PRODUCT_A]}
+        for _ in range(1500)
+    ]
+    orders = FakeOrders(day_orders, fail_on_delete=2)
+    summaries = FakeSummaries()
+    store = order_archive.LocalArchiveStore(str(tmp_path))
+
+    async def fake_get_collection(name, subsystem=None):
+        return {"orders": orders, order_archive.SUMMARY_COLLECTION: summaries}[name]
+
+    with patch.object(order_archive, "get_collection", side_effect=fake_get_collection):
+        with pytest.raises(ConnectionFailure):
+            await order_archive.archive_day(day, store)
+        assert len(orders.documents) == 500
+
+        # Um pedido atrasado chega antes da nova execução
+        late = {"_id": ObjectId(), "date": datetime(2023, 3, 1, 20), "total": 7.0, "product_ids": [PRODUCT_B]}
+        orders.documents.append(late)
+        stats = await order_archive.archive_day(day, store)
+
+    summary = summaries.documents[day]
+    assert stats["orders"] == 1
+    assert orders.documents == []
+    assert summary["orders"] == 1501
+    assert len(summary["files"]) == 2 and "pending_delete" not in summary
+    late_file = store.read(summary["files"][1])
+    assert order_archive.archived_order_ids(late_file) == [late["_id"]]
@@ -0,0 +1,116 @@
+import pytest
+import sys
+import os
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ExecutionTimeout
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.order_ingestion import GroupCommitBuffer, parse_write_concern, write_orders
+from app.services import sales_counters
+from app.core import metrics
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_share_one_batch():
+    """Documentos enviados na mesma janela são gravados em um único lote"""
+    batches = []
+
+    async def write_batch(documents):
+        batches.append(list(documents))
+        return [None] * len(documents)
+
+    buffer = GroupCommitBuffer("test", write_batch, window_ms=5, max_batch=100)
+    ids = await asyncio.gather(*[buffer.submit({"n": i}) for i in range(10)])
+
+    assert len(batches) == 1
+    assert [document["_id"] for document in batches[0]] == ids
+
+@pytest.mark.asyncio
+async def test_full_batch_flushes_before_window():
+    """Ao atingir max_batch o lote é gravado sem esperar a janela"""
+    sizes = []
+
+    async def write_batch(documents):
+        sizes.append(len(documents))
+        return [None] * len(documents)
+
+    buffer = GroupCommitBuffer("test", write_batch, window_ms=10000, max_batch=4)
+    await asyncio.wait_for(asyncio.gather(*[buffer.submit({"n": i}) for i in range(8)]), timeout=1)
+
+    assert sizes == [4, 4]
+
+@pytest.mark.asyncio
+async def test_each_request_gets_its_own_error():
+    """A falha de um documento não afeta os demais do lote"""
+    async def write_batch(documents):
+        return [ValueError("duplicado") if document["n"] == 1 else None for document in documents]
+
+    buffer = GroupCommitBuffer("test", write_batch, window_ms=1, max_batch=100)
+    results = await asyncio.gather(*[buffer.submit({"n": i}) for i in range(3)], return_exceptions=True)
+
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[0], ObjectId) and isinstance(results[2], ObjectId)
+
+@pytest.mark.asyncio
+async def test_write_orders_maps_bulk_errors_and_skips_failed_orders():
+    """Erros do insert_many são devolvidos por índice e só os gravados vão aos contadores"""
+    orders = [
+        {"_id": ObjectId(), "date": datetime(2025, 2, 24), "product_ids": [ObjectId()], "total": 10.0}
+        for _ in range(3)
+    ]
+    collection = AsyncMock()
+    collection.with_options = lambda **kwargs: collection
+    collection.insert_many.side_effect = BulkWriteError({
+        "writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}]
+    })
+
+    with patch("app.services.order_ingestion.get_collection", AsyncMock(return_value=collection)), \
+         patch.object(sales_counters, "apply_orders", AsyncMock()) as apply_orders, \
+         patch("app.services.order_ingestion.orders_timeseries.mirror_insert_many", AsyncMock()):
+        errors = await write_orders(orders)
+
+    assert errors[0] is None and errors[2] is None
+    assert errors[1].code == 11000
+    apply_orders.assert_awaited_once_with([orders[0], orders[2]])
+
+@pytest.mark.asyncio
+async def test_counter_failure_does_not_fail_written_orders():
+    """Com os pedidos gravados, uma falha nos contadores só é registrada"""
+    orders = [{"_id": ObjectId(), "date": datetime(2025, 2, 24), "product_ids": [ObjectId()], "total": 10.0}]
+    collection = AsyncMock()
+    collection.with_options = lambda **kwargs: collection
+    metrics.reset()
+
+    with patch("app.services.order_ingestion.get_collection", AsyncMock(return_value=collection)), \
+         patch.object(sales_counters, "apply_orders", AsyncMock(side_effect=ExecutionTimeout("timeout"))), \
+         patch("app.services.order_ingestion.orders_timeseries.mirror_insert_many", AsyncMock()) as mirror:
+        buffer = GroupCommitBuffer("test", write_orders, window_ms=1, max_batch=100)
+        order_id = await buffer.submit(orders[0])
+
+    assert order_id == orders[0]["_id"]
+    assert metrics.get_counter("sales_counters_apply_errors_total", source="group_commit") == 1
+    mirror.assert_awaited_once_with(orders)
+
+def test_merged_counter_updates_sum_same_product_and_day():
+    """Pedidos do mesmo produto e dia viram um único $inc"""
+    product = ObjectId()
+    orders = [
+        {"date": datetime(2025, 2, 24, 10), "product_ids": [product], "total": 10.0},
+        {"date": datetime(2025, 2, 24, 15), "product_ids": [product, product], "total": 30.0}
+    ]
+
+    updates = sales_counters.merged_counter_updates(orders)
+
+    assert updates == [UpdateOne(
+        {"product_id": product, "day": datetime(2025, 2, 24)},
+        {"$inc": {"orders": 2, "units": 3, "revenue": 70.0}},
+        upsert=True
+    )]
+
+def test_parse_write_concern():
+    assert parse_write_concern("1").document == {"w": 1}
+    assert parse_write_concern("majority:j").document == {"w": "majority", "j": True}
@@ -0,0 +1,64 @@
+import pytest
+import sys
+import os
+from unittest.mock import patch, AsyncMock
+from datetime import datetime
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.services import orders_timeseries
+
+@pytest.fixture
+def sample_order():
+    """Fixture com um pedido já com categorias desnormalizadas"""
+    return {
+        "_id": ObjectId("60c72b2f5e75e10001d56f0d"),
+        "date": datetime(2025, 2, 24, 10, 0),
+        "total": 29.99,
+        "status": "completed",
+        "product_ids": [ObjectId("60c72b2f5e75e10001d56f0c")],
+        "category_ids": [ObjectId("60c72b2f5e75e10001d56f0a")]
+    }
+
+def test_time_series_document_shape(sample_order):
+    """Categorias e status vão para o metaField; medidas mantêm os nomes"""
+    document = orders_timeseries.to_timeseries(sample_order)
+
+    assert document["meta"] == {"category_ids": sample_order["category_ids"], "status": "completed"}
+    assert document["order_id"] == sample_order["_id"]
+    assert document["total"] == 29.99
+    assert "_id" not in document
+
+def test_match_is_adapted_for_time_series():
+    """O filtro de categorias passa a usar meta.category_ids só na cópia"""
+    match_stage = {"date": {"$gte": datetime(2025, 1, 1)}, "category_ids": {"$in": [1]}}
+
+    adapted = orders_timeseries.adapt_match(match_stage, settings.ORDERS_TIMESERIES_COLLECTION)
+
+    assert adapted == {"date": match_stage["date"], "meta.category_ids": {"$in": [1]}}
+    assert orders_timeseries.adapt_match(match_stage, "orders") is match_stage
+
+@pytest.mark.asyncio
+async def test_copy_failure_does_not_fail_order(sample_order):
+    """Erros ao espelhar são registrados sem propagar"""
+    collection = AsyncMock()
+    collection.insert_one.side_effect = Exception("coleção indisponível")
+
+    with patch.object(settings, "ORDERS_TIMESERIES_ENABLED", True), \
+         patch.object(orders_timeseries, "get_collection", AsyncMock(return_value=collection)):
+        await orders_timeseries.mirror_replace(sample_order)
+
+    collection.delete_many.assert_awaited_once_with({"order_id": sample_order["_id"]})
+
+@pytest.mark.asyncio
+async def test_copy_disabled(sample_order):
+    """Com ORDERS_TIMESERIES_ENABLED=false nada é escrito"""
+    get_collection = AsyncMock()
+
+    with patch.object(settings, "ORDERS_TIMESERIES_ENABLED", False), \
+         patch.object(orders_timeseries, "get_collection", get_collection):
+        await orders_timeseries.mirror_insert(sample_order)
+
+    get_collection.assert_not_awaited()
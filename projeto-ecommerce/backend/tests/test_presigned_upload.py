@@ -0,0 +1,126 @@
+import pytest
+import sys
+import os
+from urllib.parse import parse_qs, urlparse
+from unittest.mock import AsyncMock, MagicMock, patch
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1 import products
+from app.core.config import settings
+
+PRESIGNED_KEY = "products/0123456789abcdef0123456789abcdef-foto.png"
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(products.router, prefix="/api/v1/products")
+    return TestClient(app)
+
+@pytest.fixture
+def signing_s3():
+    """Cliente boto3 real (só assina localmente, sem rede)"""
+    return boto3.session.Session(
+        aws_access_key_id="test", aws_secret_access_key="test", region_name="us-east-1"
+    ).client(
+        "s3",
+        endpoint_url="http://localstack:4566",
+        config=Config(signature_version="s3v4", s3={"addressing_style": "path"})
+    )
+
+def test_presign_post_limits_size_with_policy(client, signing_s3):
+    with patch.object(products, "get_s3_client", return_value=signing_s3):
+        response = client.post("/api/v1/products/uploads/presign", json={
+            "filename": "foto.png", "content_type": "image/png", "method": "POST"
+        })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["method"] == "POST"
+    assert body["fields"]["Content-Type"] == "image/png"
+    assert body["key"].startswith("products/")
+    assert products.PRESIGNED_KEY_PATTERN.match(body["key"])
+
+def test_presign_put_signs_content_length(client, signing_s3):
+    """No PUT o tamanho declarado faz parte da assinatura"""
+    with patch.object(products, "get_s3_client", return_value=signing_s3):
+        response = client.post("/api/v1/products/uploads/presign", json={
+            "filename": "foto.png", "content_type": "image/png", "method": "PUT", "size": 1234
+        })
+
+    assert response.status_code == 200
+    query = parse_qs(urlparse(response.json()["url"]).query)
+    assert "content-length" in query["X-Amz-SignedHeaders"][0].split(";")
+
+@pytest.mark.parametrize("payload", [
+    {"filename": "doc.pdf", "content_type": "application/pdf", "method": "POST"},
+    {"filename": "foto.png", "content_type": "image/png", "method": "PUT"},
+    {"filename": "foto.png", "content_type": "image/png", "method": "PUT", "size": 10 ** 9},
+])
+def test_presign_rejects_invalid_requests(client, payload):
+    """Tipo que não é imagem, PUT sem tamanho e PUT acima do limite"""
+    s3 = MagicMock()
+    with patch.object(products, "get_s3_client", return_value=s3):
+        response = client.post("/api/v1/products/uploads/presign", json=payload)
+
+    assert response.status_code == 400
+    s3.generate_presigned_url.assert_not_called()
+
+def confirm(client, s3, key=PRESIGNED_KEY):
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value={"_id": ObjectId(), "name": "p", "description": "d", "price": 1.0})
+    collection.update_one = AsyncMock()
+    with patch.object(products, "get_s3_client", return_value=s3), \
+         patch.object(products, "get_collection", AsyncMock(return_value=collection)):
+        response = client.post(f"/api/v1/products/{ObjectId()}/image/confirm", json={"key": key})
+    return response, collection
+
+def test_confirm_missing_object(client):
+    s3 = MagicMock()
+    s3.head_object.side_effect = ClientError({"Error": {"Code": "404"}}, "HeadObject")
+
+    response, collection = confirm(client, s3)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Uploaded object not found"
+    collection.update_one.assert_not_called()
+
+def test_confirm_oversized_object_is_deleted(client):
+    s3 = MagicMock()
+    s3.head_object.return_value = {
+        "ContentType": "image/png",
+        "ContentLength": settings.S3_MAX_UPLOAD_SIZE_BYTES + 1
+    }
+
+    response, collection = confirm(client, s3)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Uploaded image is too large"
+    s3.delete_object.assert_called_once_with(Bucket=settings.S3_BUCKET_NAME, Key=PRESIGNED_KEY)
+    collection.update_one.assert_not_called()
+
+def test_confirm_never_deletes_content_addressed_objects(client):
+    """Chaves por hash podem ser usadas por outros produtos"""
+    s3 = MagicMock()
+    s3.head_object.return_value = {"ContentType": "text/plain", "ContentLength": 10}
+
+    response, _ = confirm(client, s3, key="products/" + "a" * 64)
+
+    assert response.status_code == 400
+    s3.delete_object.assert_not_called()
+
+def test_confirm_links_image(client):
+    s3 = MagicMock()
+    s3.head_object.return_value = {"ContentType": "image/png", "ContentLength": 1000}
+
+    response, collection = confirm(client, s3)
+
+    assert response.status_code == 200
+    update = collection.update_one.await_args.args[1]
+    assert update["$set"]["image_url"].endswith(PRESIGNED_KEY)
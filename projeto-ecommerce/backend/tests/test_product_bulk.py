@@ -0,0 +1,84 @@
+import pytest
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.product import ProductBulkOperation
+from app.services import product_bulk
+
+CATEGORY_ID = "507f1f77bcf86cd799439011"
+
+def find_result(documents):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=documents)
+    return cursor
+
+def test_reprice_by_category_pipeline():
+    """+5% em uma categoria vira um pipeline que arredonda o preço no servidor"""
+    operation = ProductBulkOperation(filter={"category_ids": [CATEGORY_ID]}, price_multiplier=1.05)
+
+    assert product_bulk.operation_filter(operation) == {"category_ids": {"$in": [ObjectId(CATEGORY_ID)]}}
+    assert product_bulk.update_pipeline(operation) == [{
+        "$set": {"price": {"$round": [{"$max": [{"$multiply": ["$price", 1.05]}, 0]}, 2]}}
+    }]
+
+def test_partial_set_only_touches_given_fields():
+    """Somente os campos enviados em set são alterados"""
+    operation = ProductBulkOperation(id=str(ObjectId()), set={"name": "Novo nome"})
+    assert product_bulk.update_pipeline(operation) == [{"$set": {"name": {"$literal": "Novo nome"}}}]
+    assert not product_bulk.changes_categories(operation)
+
+@pytest.mark.parametrize("payload", [
+    {"set": {"name": "x"}},
+    {"id": str(ObjectId())},
+    {"id": str(ObjectId()), "set": {"price": 10}, "price_multiplier": 1.1},
+    {"id": str(ObjectId()), "set": {"name": None}},
+])
+def test_invalid_operations(payload):
+    """Operações sem alvo, sem alterações, conflitantes ou com nulos são rejeitadas"""
+    with pytest.raises(ValidationError):
+        ProductBulkOperation(**payload)
+
+@pytest.mark.asyncio
+async def test_apply_bulk_update_reports_per_item_results():
+    """Resultados por operação: not_found, erro do bulk_write e atualizados"""
+    existing, missing, failing = ObjectId(), ObjectId(), ObjectId()
+    recategorized = [ObjectId(), ObjectId()]
+    operations = [
+        ProductBulkOperation(id=str(existing), set={"price": 20}),
+        ProductBulkOperation(id=str(missing), set={"price": 20}),
+        ProductBulkOperation(id=str(failing), set={"name": "x"}),
+        ProductBulkOperation(filter={"category_ids": [CATEGORY_ID]}, add_category_ids=[str(ObjectId())])
+    ]
+
+    collection = MagicMock()
+    collection.find.side_effect = [
+        find_result([{"_id": existing}, {"_id": failing}]),
+        find_result([{"_id": pid} for pid in recategorized])
+    ]
+    collection.bulk_write = AsyncMock(side_effect=BulkWriteError({
+        "nModified": 3,
+        "writeErrors": [{"index": 1, "code": 121, "errmsg": "Document failed validation"}]
+    }))
+
+    with patch("app.services.product_bulk.get_collection", AsyncMock(return_value=collection)), \
+         patch("app.services.product_bulk.schedule_refresh_for_products") as schedule_refresh:
+        response = await product_bulk.apply_bulk_update(operations)
+
+    statuses = [result["status"] for result in response["results"]]
+    assert statuses == ["updated", "not_found", "error", "updated"]
+    assert response["matched"] == 3
+    assert response["modified"] == 3
+
+    requests = collection.bulk_write.await_args.args[0]
+    assert [type(r) for r in requests] == [UpdateOne, UpdateOne, UpdateMany]
+    assert collection.bulk_write.await_args.kwargs == {"ordered": False}
+
+    # Um único recálculo com todos os produtos que mudaram de categoria
+    schedule_refresh.assert_called_once_with(recategorized)
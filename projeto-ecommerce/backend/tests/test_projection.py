@@ -0,0 +1,53 @@
+import pytest
+import sys
+import os
+import json
+from bson import ObjectId
+from fastapi import HTTPException
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.projection import parse_fields, mongo_projection, partial_model, partial_response
+from app.models.product import Product
+from app.models.order import Order
+
+def test_parse_fields_always_includes_id():
+    """Campos são normalizados, ordenados e sempre incluem o id"""
+    assert parse_fields(" price,name ,price", Product) == ("id", "name", "price")
+    assert parse_fields("_id", Product) == ("id",)
+    assert parse_fields(None, Product) is None
+    assert parse_fields(" , ", Product) is None
+
+def test_parse_fields_rejects_unknown_fields():
+    """Campos inexistentes no modelo devem retornar 400"""
+    with pytest.raises(HTTPException) as exc:
+        parse_fields("name,secret", Product)
+    assert exc.value.status_code == 400
+    assert "secret" in exc.value.detail
+
+def test_mongo_projection_excludes_description():
+    """A projeção só pede ao Mongo os campos selecionados"""
+    projection = mongo_projection(parse_fields("name,price,image_url", Product))
+    assert projection == {"image_url": 1, "name": 1, "price": 1}
+    assert mongo_projection(None) is None
+
+def test_partial_response_serializes_only_selected_fields():
+    """A resposta reduzida mantém conversão de ObjectId e o alias _id"""
+    product_id = ObjectId()
+    category_id = ObjectId()
+    fields = parse_fields("name,category_ids", Product)
+
+    response = partial_response(Product, fields, [
+        {"_id": product_id, "name": "Notebook", "category_ids": [category_id]}
+    ])
+
+    assert json.loads(response.body) == [
+        {"_id": str(product_id), "name": "Notebook", "category_ids": [str(category_id)]}
+    ]
+    assert partial_model(Product, fields) is partial_model(Product, fields)
+
+def test_partial_response_single_document():
+    """Um documento isolado é serializado como objeto"""
+    order_id = ObjectId()
+    response = partial_response(Order, parse_fields("total", Order), {"_id": order_id, "total": 10.5})
+    assert json.loads(response.body) == {"_id": str(order_id), "total": 10.5}
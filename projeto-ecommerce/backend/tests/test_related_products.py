@@ -0,0 +1,133 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import related_products
+from app.services.related_products import (
+    ProductIndex,
+    accumulate_orders,
+    add_matrices,
+    cooccurrence_batch,
+    load_state,
+    save_state,
+    top_k
+)
+
+@pytest.fixture
+def products():
+    return [ObjectId() for _ in range(4)]
+
+def test_cooccurrence_counts_each_pair_once_per_order(products):
+    """Cada par conta uma vez por pedido, mesmo com produto repetido"""
+    a, b, c, _ = products
+    index = ProductIndex()
+    matrix = cooccurrence_batch([[a, b, b], [a, b, c], [c]], index)
+
+    assert matrix[index.position(a), index.position(b)] == 2
+    assert matrix[index.position(b), index.position(a)] == 2
+    assert matrix[index.position(a), index.position(c)] == 1
+    # A diagonal é o número de pedidos do produto
+    assert matrix[index.position(c), index.position(c)] == 2
+
+def test_incremental_batches_match_single_batch(products):
+    """Somar lotes com produtos novos deve dar o mesmo que um lote único"""
+    a, b, c, d = products
+    orders = [[a, b], [b, c], [a, c, d], [d, a]]
+
+    index = ProductIndex()
+    whole = cooccurrence_batch(orders, index)
+
+    incremental_index = ProductIndex()
+    incremental = add_matrices(
+        cooccurrence_batch(orders[:2], incremental_index),
+        cooccurrence_batch(orders[2:], incremental_index)
+    )
+
+    for x in products:
+        for y in products:
+            assert whole[index.position(x), index.position(y)] == \
+                incremental[incremental_index.position(x), incremental_index.position(y)]
+
+def test_top_k_orders_by_count_and_skips_diagonal(products):
+    """Vizinhos ordenados por contagem, sem o próprio produto, limitados a k"""
+    a, b, c, d = products
+    index = ProductIndex()
+    matrix = cooccurrence_batch([[a, b], [a, b], [a, c], [a, d], [a, d]], index)
+
+    neighbors = top_k(matrix, 2)
+    assert neighbors[index.position(a)] == sorted([(index.position(b), 2), (index.position(d), 2)])
+    assert neighbors[index.position(c)] == [(index.position(a), 1)]
+
+    # Apenas as linhas pedidas
+    assert set(top_k(matrix, 2, rows=[index.position(c)])) == {index.position(c)}
+
+def test_state_round_trip(tmp_path, products):
+    """O estado salvo permite continuar de onde a execução anterior parou"""
+    index = ProductIndex()
+    matrix = cooccurrence_batch([products[:3]], index)
+    watermark = ObjectId()
+    path = str(tmp_path / "related" / "cooccurrence.npz")
+
+    save_state(path, matrix, index, watermark, {watermark})
+    loaded, loaded_index, loaded_watermark, recent_ids = load_state(path)
+
+    assert loaded_index.ids == index.ids
+    assert loaded_watermark == watermark
+    assert recent_ids == {watermark}
+    assert (loaded != matrix).nnz == 0
+    assert load_state(str(tmp_path / "missing.npz"))[0] is None
+
+class FakeOrders:
+    """Pedidos em memória; find aplica o filtro de _id e a ordenação"""
+
+    def __init__(self, orders):
+        self.orders = orders
+
+    def find(self, query, projection):
+        bounds = query.get("_id", {})
+
+        async def rows():
+            for order in sorted(self.orders, key=lambda o: o["_id"]):
+                if "$gt" in bounds and not order["_id"] > bounds["$gt"]:
+                    continue
+                if "$gte" in bounds and not order["_id"] >= bounds["$gte"]:
+                    continue
+                yield order
+
+        cursor = MagicMock()
+        cursor.sort.return_value.batch_size.return_value = rows()
+        return cursor
+
+@pytest.mark.asyncio
+async def test_late_commit_behind_watermark_is_counted_once(products):
+    """Um pedido gravado depois de outro com _id maior entra na próxima execução, sem recontar os demais"""
+    a, b, c, _ = products
+    now = datetime.utcnow()
+
+    def order(seconds, product_ids):
+        return {"_id": ObjectId.from_datetime(now + timedelta(seconds=seconds)), "product_ids": product_ids}
+
+    first, late, newer = order(0, [a, b]), order(1, [a, c]), order(2, [b, c])
+    orders = FakeOrders([first, newer])
+    index = ProductIndex()
+
+    with patch.object(related_products, "get_collection", AsyncMock(return_value=orders)):
+        matrix, watermark, processed, _, recent_ids = await accumulate_orders(None, index, None, 10)
+        assert (processed, watermark) == (2, newer["_id"])
+
+        orders.orders.append(late)
+        matrix, watermark, processed, touched, recent_ids = await accumulate_orders(
+            matrix, index, watermark, 10, recent_ids
+        )
+
+    assert processed == 1
+    assert watermark == newer["_id"]
+    assert recent_ids == {first["_id"], late["_id"], newer["_id"]}
+    assert matrix[index.position(a), index.position(c)] == 1
+    assert matrix[index.position(a), index.position(b)] == 1
+    assert sorted(touched.tolist()) == sorted([index.position(a), index.position(c)])
@@ -0,0 +1,166 @@
+import pytest
+import asyncio
+import sys
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+from botocore.exceptions import ClientError, ReadTimeoutError
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo.errors import ExecutionTimeout, ServerSelectionTimeoutError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1 import dashboard
+from app.core import metrics
+from app.core.database import BudgetedCollection
+from app.core.resilience import (
+    CircuitBreaker,
+    DependencyTimeout,
+    DependencyUnavailable,
+    aws_failure,
+    aws_timeout,
+    install_exception_handlers
+)
+
+def client_error(code: str, status: int) -> ClientError:
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "HeadObject")
+
+def failing(error):
+    def fn():
+        raise error
+    return fn
+
+@pytest.fixture
+def breaker():
+    metrics.reset()
+    return CircuitBreaker(
+        "s3", failure_rate=0.5, min_calls=4, window_seconds=30, open_seconds=15,
+        is_failure=aws_failure, is_timeout=aws_timeout
+    )
+
+def test_breaker_opens_when_error_rate_is_reached(breaker):
+    """Com metade das chamadas falhando o circuito abre e rejeita sem chamar a dependência"""
+    breaker.call(lambda: "ok")
+    breaker.call(lambda: "ok")
+    for _ in range(2):
+        with pytest.raises(ClientError):
+            breaker.call(failing(client_error("InternalError", 500)))
+    assert breaker.state == "open"
+
+    dependency = MagicMock()
+    with pytest.raises(DependencyUnavailable) as exc:
+        breaker.call(dependency)
+    dependency.assert_not_called()
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "15"
+    assert metrics.get_counter("circuit_breaker_rejected_total", dependency="s3") == 1
+
+def test_client_errors_do_not_open_the_circuit(breaker):
+    """404 de um head_object é resposta normal do S3, não indisponibilidade"""
+    for _ in range(10):
+        with pytest.raises(ClientError):
+            breaker.call(failing(client_error("404", 404)))
+    assert breaker.state == "closed"
+
+def test_half_open_trial_closes_or_reopens(breaker):
+    """Passado open_seconds, uma chamada de teste decide se o circuito fecha"""
+    with patch("app.core.resilience.time.monotonic", return_value=100.0):
+        for _ in range(4):
+            with pytest.raises(ClientError):
+                breaker.call(failing(client_error("SlowDown", 503)))
+    assert breaker.state == "open"
+
+    with patch("app.core.resilience.time.monotonic", return_value=116.0):
+        with pytest.raises(ClientError):
+            breaker.call(failing(client_error("SlowDown", 503)))
+    assert breaker.state == "open"
+
+    with patch("app.core.resilience.time.monotonic", return_value=132.0):
+        assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_releases_half_open_slot(breaker):
+    """Uma chamada de teste cancelada não deixa o circuito recusando tudo"""
+    with patch("app.core.resilience.time.monotonic", return_value=100.0):
+        for _ in range(4):
+            with pytest.raises(ClientError):
+                breaker.call(failing(client_error("SlowDown", 503)))
+
+    async def hanging(fn, *args, **kwargs):
+        await asyncio.Event().wait()
+
+    with patch("app.core.resilience.time.monotonic", return_value=116.0):
+        with patch("app.core.resilience.run_in_threadpool", hanging):
+            trial = asyncio.create_task(breaker.run(MagicMock()))
+            await asyncio.sleep(0)
+            trial.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await trial
+        assert breaker.state == "half_open"
+        assert await breaker.run(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+def test_timeouts_become_504(breaker):
+    with pytest.raises(DependencyTimeout) as exc:
+        breaker.call(failing(ReadTimeoutError(endpoint_url="http://localstack:4566")))
+    assert exc.value.status_code == 504
+    assert metrics.get_counter("dependency_timeouts_total", dependency="s3") == 1
+
+def test_budgeted_collection_applies_max_time_ms():
+    """find e aggregate recebem o orçamento, salvo quando a chamada define o seu"""
+    collection = MagicMock()
+    budgeted = BudgetedCollection(collection, 2000)
+
+    budgeted.find({"a": 1})
+    budgeted.aggregate([], maxTimeMS=50)
+    budgeted.insert_one({"a": 1})
+
+    assert collection.find.call_args.kwargs == {"max_time_ms": 2000}
+    assert collection.aggregate.call_args.kwargs == {"maxTimeMS": 50}
+    collection.insert_one.assert_called_once_with({"a": 1})
+    assert isinstance(budgeted.with_options(read_preference=None), BudgetedCollection)
+
+def test_mongo_errors_map_to_504_and_503():
+    metrics.reset()
+    app = FastAPI()
+    install_exception_handlers(app)
+
+    @app.get("/slow")
+    async def slow():
+        raise ExecutionTimeout("operation exceeded time limit")
+
+    @app.get("/down")
+    async def down():
+        raise ServerSelectionTimeoutError("No servers found")
+
+    client = TestClient(app)
+    assert client.get("/slow").status_code == 504
+    response = client.get("/down")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert metrics.get_counter("dependency_timeouts_total", dependency="mongo") == 1
+
+@pytest.mark.parametrize("approx", [False, True])
+@pytest.mark.parametrize("error, status", [
+    (ExecutionTimeout("operation exceeded time limit"), 504),
+    (ServerSelectionTimeoutError("No servers found"), 503),
+    (DependencyUnavailable("s3", retry_after=15), 503),
+])
+def test_dashboard_errors_keep_their_status(approx, error, status):
+    """Timeouts do orçamento "dashboard", Mongo fora do ar e o circuito do S3 não viram 500"""
+    app = FastAPI()
+    install_exception_handlers(app)
+    app.include_router(dashboard.router, prefix="/api/v1/dashboard")
+
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[])
+    collection = MagicMock()
+    collection.aggregate.return_value = cursor
+
+    with patch.object(dashboard, "get_collection", AsyncMock(return_value=collection)), \
+         patch.object(dashboard.approx_sales, "is_small_range", AsyncMock(return_value=True)), \
+         patch.object(dashboard, "archived_sales", AsyncMock(side_effect=error)):
+        response = TestClient(app).get("/api/v1/dashboard/sales", params={"approx": approx})
+
+    assert response.status_code == status
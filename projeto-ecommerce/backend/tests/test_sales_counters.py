@@ -0,0 +1,210 @@
+import pytest
+import sys
+import os
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.v1 import orders
+from app.core import metrics
+from app.core.config import settings
+from app.services import sales_counters
+
+PRODUCT_A = ObjectId("60c72b2f5e75e10001d56f0c")
+PRODUCT_B = ObjectId("60c72b2f5e75e10001d56f0b")
+
+@pytest.fixture
+def sample_order():
+    """Fixture com um pedido que repete um produto"""
+    return {
+        "_id": ObjectId("60c72b2f5e75e10001d56f0d"),
+        "date": datetime(2025, 2, 24, 15, 30),
+        "total": 89.97,
+        "product_ids": [PRODUCT_A, PRODUCT_B, PRODUCT_A]
+    }
+
+def counter_update(product_id, orders, units, revenue):
+    return UpdateOne(
+        {"product_id": product_id, "day": datetime(2025, 2, 24)},
+        {"$inc": {"orders": orders, "units": units, "revenue": revenue}},
+        upsert=True
+    )
+
+def test_counter_updates_per_product_and_day(sample_order):
+    """Um $inc por produto, no dia do pedido, contando as unidades repetidas"""
+    assert sales_counters.counter_updates(sample_order) == [
+        counter_update(PRODUCT_A, 1, 2, 2 * 89.97),
+        counter_update(PRODUCT_B, 1, 1, 89.97)
+    ]
+
+def test_counter_updates_undo_order(sample_order):
+    """sign=-1 gera os mesmos incrementos com sinal invertido"""
+    assert sales_counters.counter_updates(sample_order, -1) == [
+        counter_update(PRODUCT_A, -1, -2, -2 * 89.97),
+        counter_update(PRODUCT_B, -1, -1, -89.97)
+    ]
+
+def test_covers_whole_days():
+    """Só filtros alinhados a dias inteiros podem usar os contadores"""
+    assert sales_counters.covers_whole_days(None, None)
+    assert sales_counters.covers_whole_days(datetime(2025, 2, 1), datetime(2025, 2, 24, 23, 59, 59, 999000))
+    assert not sales_counters.covers_whole_days(datetime(2025, 2, 1, 12), None)
+    assert not sales_counters.covers_whole_days(None, datetime(2025, 2, 24, 12))
+
+def test_counter_failure_does_not_fail_saved_order(sample_order):
+    """Pedido gravado é devolvido mesmo se os contadores falharem; a falha fica na métrica"""
+    app = FastAPI()
+    app.include_router(orders.router, prefix="/api/v1/orders")
+    collection = MagicMock()
+    collection.insert_one = AsyncMock(return_value=MagicMock(inserted_id=sample_order["_id"]))
+    collection.find_one = AsyncMock(return_value=sample_order)
+    collection.find_one_and_delete = AsyncMock(return_value=sample_order)
+    counters_down = AsyncMock(side_effect=BulkWriteError({"writeErrors": []}))
+    metrics.reset()
+
+    with patch.object(orders, "get_collection", AsyncMock(return_value=collection)), \
+         patch.object(orders, "validate_products", AsyncMock(return_value=(89.97, []))), \
+         patch.object(settings, "ORDER_INGESTION_BUFFER_ENABLED", False), \
+         patch.object(sales_counters, "apply_order", counters_down):
+        client = TestClient(app)
+        created = client.post("/api/v1/orders/", json={
+            "date": "2025-02-24T15:30:00", "product_ids": [str(PRODUCT_A)], "total": 0
+        })
+        deleted = client.delete(f"/api/v1/orders/{sample_order['_id']}")
+
+    assert created.status_code == 200
+    assert created.json()["_id"] == str(sample_order["_id"])
+    assert deleted.status_code == 200
+    assert metrics.get_counter("sales_counters_apply_errors_total", source="create") == 1
+    assert metrics.get_counter("sales_counters_apply_errors_total", source="delete") == 1
+
+DAY_1 = datetime(2025, 2, 24)
+DAY_2 = datetime(2025, 2, 25)
+
+class FakeCursor:
+    """Cursor assíncrono sobre uma lista já ordenada"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    async def next(self):
+        if not self.rows:
+            raise StopAsyncIteration
+        return self.rows.pop(0)
+
+def expected_row(product_id, day, orders, units, revenue):
+    return {"_id": {"product_id": product_id, "day": day}, "orders": orders, "units": units, "revenue": revenue}
+
+def counter_row(product_id, day, orders, units, revenue):
+    return {"_id": ObjectId(), "product_id": product_id, "day": day,
+            "orders": orders, "units": units, "revenue": revenue}
+
+async def run_reconcile(expected, actual, **options):
+    """Roda o reconcile com os dois cursores e devolve o relatório e os lotes gravados"""
+    orders_collection = MagicMock()
+    orders_collection.aggregate.return_value = FakeCursor(expected)
+    counters_collection = MagicMock()
+    counters_collection.find.return_value.sort.return_value = FakeCursor(actual)
+    batches = []
+
+    async def bulk_write(operations, ordered):
+        batches.append(list(operations))
+        return MagicMock(upserted_count=0, modified_count=len(operations), deleted_count=0)
+
+    counters_collection.bulk_write = bulk_write
+
+    async def fake_get_collection(name, subsystem=None, budget=None):
+        return {"orders": orders_collection, sales_counters.COLLECTION: counters_collection}[name]
+
+    with patch.object(sales_counters, "get_collection", side_effect=fake_get_collection):
+        report = await sales_counters.reconcile(**options)
+    return report, batches, orders_collection, counters_collection
+
+@pytest.mark.asyncio
+async def test_reconcile_counters_in_sync():
+    """Contadores iguais (revenue dentro da tolerância) não geram escrita"""
+    report, batches, _, _ = await run_reconcile(
+        [expected_row(PRODUCT_B, DAY_1, 1, 1, 10.0), expected_row(PRODUCT_A, DAY_1, 2, 3, 30.0)],
+        [counter_row(PRODUCT_B, DAY_1, 1, 1, 10.0), counter_row(PRODUCT_A, DAY_1, 2, 3, 30.001)]
+    )
+
+    assert report["checked"] == 2
+    assert (report["missing"], report["mismatched"], report["extra"]) == (0, 0, 0)
+    assert batches == []
+
+@pytest.mark.asyncio
+async def test_reconcile_missing_after_counters_end():
+    """Esgotados os contadores, os valores esperados restantes são criados com upsert"""
+    report, batches, _, _ = await run_reconcile(
+        [expected_row(PRODUCT_B, DAY_1, 1, 1, 10.0), expected_row(PRODUCT_B, DAY_2, 1, 2, 40.0)],
+        [counter_row(PRODUCT_B, DAY_1, 1, 1, 10.0)]
+    )
+
+    assert (report["checked"], report["missing"]) == (1, 1)
+    assert batches == [[UpdateOne(
+        {"product_id": PRODUCT_B, "day": DAY_2},
+        {"$set": {"orders": 1, "units": 2, "revenue": 40.0}},
+        upsert=True
+    )]]
+    assert report["samples"][0]["type"] == "missing"
+
+@pytest.mark.asyncio
+async def test_reconcile_extra_after_orders_end_and_zeroed_leftovers():
+    """Contadores sem pedidos são removidos; os zerados não contam como drift"""
+    extra = counter_row(PRODUCT_A, DAY_1, 1, 1, 10.0)
+    zeroed = counter_row(PRODUCT_A, DAY_2, 0, 0, 0.0)
+    report, batches, _, _ = await run_reconcile(
+        [expected_row(PRODUCT_B, DAY_1, 1, 1, 10.0)],
+        [counter_row(PRODUCT_B, DAY_1, 1, 1, 10.0), extra, zeroed]
+    )
+
+    assert (report["checked"], report["extra"]) == (1, 1)
+    assert batches == [[DeleteOne({"_id": extra["_id"]}), DeleteOne({"_id": zeroed["_id"]})]]
+
+@pytest.mark.asyncio
+async def test_reconcile_mismatched_interleaved_keys():
+    """Chaves intercaladas dos dois lados: cada uma cai no caso certo"""
+    mismatched = counter_row(PRODUCT_B, DAY_2, 1, 1, 10.0)
+    report, batches, _, _ = await run_reconcile(
+        [expected_row(PRODUCT_B, DAY_1, 1, 1, 10.0), expected_row(PRODUCT_B, DAY_2, 2, 2, 20.0)],
+        [mismatched, counter_row(PRODUCT_A, DAY_1, 1, 1, 5.0)]
+    )
+
+    assert (report["checked"], report["missing"], report["mismatched"], report["extra"]) == (1, 1, 1, 1)
+    assert batches[0][1] == UpdateOne(
+        {"_id": mismatched["_id"]},
+        {"$set": {"orders": 2, "units": 2, "revenue": 20.0}}
+    )
+    assert report["fixed"] == 3
+
+@pytest.mark.asyncio
+async def test_reconcile_dry_run_only_reports():
+    report, batches, _, _ = await run_reconcile(
+        [expected_row(PRODUCT_B, DAY_1, 1, 1, 10.0)],
+        [counter_row(PRODUCT_A, DAY_1, 1, 1, 5.0)],
+        dry_run=True
+    )
+
+    assert (report["missing"], report["extra"], report["fixed"]) == (1, 1, 0)
+    assert batches == []
+
+@pytest.mark.asyncio
+async def test_reconcile_flushes_in_batches_and_filters_since():
+    """Correções são gravadas a cada batch_size e since restringe os dois lados"""
+    report, batches, orders_collection, counters_collection = await run_reconcile(
+        [expected_row(PRODUCT_B, DAY_2, 1, 1, 10.0), expected_row(PRODUCT_A, DAY_2, 1, 1, 10.0)],
+        [],
+        batch_size=1,
+        since=DAY_2
+    )
+
+    assert [len(batch) for batch in batches] == [1, 1]
+    assert report["missing"] == 2
+    assert orders_collection.aggregate.call_args.args[0][0] == {"$match": {"date": {"$gte": DAY_2}}}
+    counters_collection.find.assert_called_once_with({"day": {"$gte": DAY_2}})
@@ -0,0 +1,160 @@
+import pytest
+import sys
+import os
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.singleflight import SingleFlight, make_key
+from app.core import metrics
+from app.api.v1 import categories, products
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def test_make_key_normalizes_params():
+    """Ordem dos filtros e parâmetros ausentes não devem mudar a chave"""
+    date = datetime(2025, 2, 24)
+    assert make_key("sales", category_ids=["b", "a"], start_date=date, end_date=None) == \
+        make_key("sales", start_date=date, category_ids=["a", "b"])
+    assert make_key("sales", category_ids=["a"]) != make_key("sales", category_ids=["b"])
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Chamadas simultâneas com a mesma chave devem executar a função uma vez"""
+    group = SingleFlight("test")
+    calls = 0
+
+    async def query():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": 42}
+
+    results = await asyncio.gather(*[group.do("key", query) for _ in range(10)])
+
+    assert calls == 1
+    assert all(result == {"value": 42} for result in results)
+    assert metrics.get_counter("singleflight_coalesced_total", group="test") == 9
+
+    # Depois de concluída, uma nova chamada executa de novo
+    await group.do("key", query)
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    """Uma falha é entregue a todos os que esperavam, mas não fica armazenada"""
+    group = SingleFlight("test")
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("mongo indisponível")
+
+    results = await asyncio.gather(
+        group.do("key", failing), group.do("key", failing), return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+
+    async def ok():
+        return "ok"
+
+    assert await group.do("key", ok) == "ok"
+
+@pytest.mark.asyncio
+async def test_leader_cancellation_does_not_cancel_followers():
+    """Se o primeiro cliente desconectar, os demais ainda recebem o resultado"""
+    group = SingleFlight("test")
+
+    async def query():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    leader = asyncio.create_task(group.do("key", query))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(group.do("key", query))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "done"
+
+class SlowProducts:
+    """Coleção com um documento; a primeira leitura só termina quando liberada"""
+
+    def __init__(self, document):
+        self.document = document
+        self.release_first_read = asyncio.Event()
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        snapshot = dict(self.document)
+        if self.reads == 1:
+            await self.release_first_read.wait()
+        return snapshot
+
+    async def find_one_and_update(self, query, update, return_document):
+        previous = dict(self.document)
+        self.document.update(update["$set"])
+        return previous
+
+async def wait_for_reads(collection, reads):
+    while collection.reads < reads:
+        await asyncio.sleep(0)
+
+@pytest.mark.asyncio
+async def test_read_after_update_does_not_join_stale_read():
+    """Um GET logo após o PUT não recebe o resultado de uma leitura anterior à escrita"""
+    product_id = ObjectId()
+    collection = SlowProducts({"_id": product_id, "name": "Antigo", "description": "d", "price": 10.0})
+    app = FastAPI()
+    app.include_router(products.router, prefix="/api/v1/products")
+
+    with patch.object(products, "get_collection", AsyncMock(return_value=collection)), \
+         patch.object(products, "schedule_refresh_for_product", MagicMock()):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            stale = asyncio.create_task(client.get(f"/api/v1/products/{product_id}"))
+            await wait_for_reads(collection, 1)
+
+            updated = await client.put(f"/api/v1/products/{product_id}", json={
+                "name": "Novo", "description": "d", "price": 12.0
+            })
+            fresh = asyncio.create_task(client.get(f"/api/v1/products/{product_id}"))
+            # A nova leitura vai ao banco em vez de esperar a anterior
+            await asyncio.wait_for(wait_for_reads(collection, 2), timeout=1)
+            collection.release_first_read.set()
+
+            assert updated.status_code == 200
+            assert (await stale).json()["name"] == "Antigo"
+            assert (await fresh).json()["name"] == "Novo"
+
+def test_category_writes_invalidate_listing():
+    """Criar, alterar e remover categorias descarta as listagens em andamento"""
+    category_id = ObjectId()
+    document = {"_id": category_id, "name": "Livros", "description": "d"}
+    collection = MagicMock()
+    collection.insert_one = AsyncMock(return_value=MagicMock(inserted_id=category_id))
+    collection.update_one = AsyncMock(return_value=MagicMock(modified_count=1))
+    collection.find_one = AsyncMock(return_value=document)
+    job = {"status": "pending", "total": 0, "processed": 0}
+
+    app = FastAPI()
+    app.include_router(categories.router, prefix="/api/v1/categories")
+    with patch.object(categories, "get_collection", AsyncMock(return_value=collection)), \
+         patch.object(categories, "get_deletion_job", AsyncMock(return_value=None)), \
+         patch.object(categories, "create_deletion_job", AsyncMock(return_value=job)), \
+         patch.object(categories, "schedule_category_cleanup", MagicMock()):
+        client = TestClient(app)
+        assert client.post("/api/v1/categories/", json={"name": "Livros", "description": "d"}).status_code == 200
+        assert client.put(f"/api/v1/categories/{category_id}", json={"name": "Livros", "description": "d"}).status_code == 200
+        assert client.delete(f"/api/v1/categories/{category_id}").status_code == 202
+
+    assert metrics.get_counter("singleflight_invalidations_total", group="list_categories") == 3
@@ -0,0 +1,114 @@
+import pytest
+import sys
+import os
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.resilience import CircuitBreaker
+from app.api.v1 import orders
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+@pytest.fixture
+def exported():
+    """Tracing ligado, amostrando tudo, com os spans exportados numa lista"""
+    spans = []
+    exporter = MagicMock()
+    exporter.add.side_effect = spans.append
+    with patch.object(settings, "TRACING_ENABLED", True), \
+         patch.object(settings, "TRACING_SAMPLE_RATE", 1.0), \
+         patch("app.core.tracing.get_exporter", return_value=exporter):
+        yield spans
+
+def test_traceparent_roundtrip(exported):
+    parent = tracing.extract(f"00-{TRACE_ID}-{PARENT_ID}-01")
+    assert parent == tracing.SpanContext(TRACE_ID, PARENT_ID, True)
+    assert tracing.extract("00-" + "0" * 32 + f"-{PARENT_ID}-01") is None
+    assert tracing.extract("garbage") is None
+
+    with tracing.start_span("child", parent=parent) as span:
+        assert tracing.inject() == {"traceparent": f"00-{TRACE_ID}-{span.span_id}-01"}
+    assert exported[0].parent_id == PARENT_ID
+
+def test_unsampled_parent_is_not_exported(exported):
+    """A decisão de amostragem de quem iniciou o trace vale para os filhos"""
+    with tracing.start_span("root", parent=tracing.extract(f"00-{TRACE_ID}-{PARENT_ID}-00")):
+        with tracing.start_span("child"):
+            pass
+    assert exported == []
+
+def test_middleware_and_lambda_invoke_share_the_trace(exported):
+    """O span da requisição, o do invoke e o traceparent enviado à Lambda formam um único trace"""
+    app = FastAPI()
+    app.add_middleware(tracing.TracingMiddleware)
+    app.include_router(orders.router, prefix="/api/v1/orders")
+
+    lambda_client = MagicMock()
+    lambda_client.invoke.return_value = {"Payload": MagicMock(read=lambda: json.dumps({"statusCode": 200}))}
+    breaker = CircuitBreaker("lambda", failure_rate=0.5, min_calls=10, window_seconds=30, open_seconds=15)
+
+    with patch("app.api.v1.orders.get_lambda_client", return_value=lambda_client), \
+         patch("app.api.v1.orders.lambda_breaker", breaker):
+        response = TestClient(app).post(
+            "/api/v1/orders/test-lambda/123",
+            headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["x-trace-id"] == TRACE_ID
+
+    invoke_span, server_span = exported
+    assert server_span.name == "POST /api/v1/orders/test-lambda/{order_id}"
+    assert server_span.parent_id == PARENT_ID
+    assert invoke_span.name == "lambda.invoke"
+    assert invoke_span.parent_id == server_span.span_id
+
+    payload = json.loads(lambda_client.invoke.call_args.kwargs["Payload"])
+    assert payload["trace_context"]["traceparent"] == f"00-{TRACE_ID}-{invoke_span.span_id}-01"
+
+def test_mongo_listener_creates_child_spans(exported):
+    listener = tracing.MongoCommandListener()
+    event = SimpleNamespace(
+        command_name="find",
+        command={"find": "orders"},
+        database_name="ecommerce",
+        connection_id=("mongodb", 27017),
+        request_id=7,
+        failure={"errmsg": "operation exceeded time limit"}
+    )
+
+    listener.started(event)
+    assert listener._spans == {}
+
+    with tracing.start_span("GET /api/v1/orders/") as parent:
+        listener.started(event)
+        listener.failed(event)
+
+    mongo_span = exported[0]
+    assert mongo_span.name == "mongo.find"
+    assert mongo_span.parent_id == parent.span_id
+    assert mongo_span.attributes["db.mongodb.collection"] == "orders"
+    assert mongo_span.status == tracing.STATUS_ERROR
+
+def test_file_export_writes_otlp_json(tmp_path, exported):
+    with tracing.start_span("root", attributes={"http.status_code": 200}):
+        pass
+
+    path = tmp_path / "spans.jsonl"
+    with patch.object(settings, "TRACING_FILE_PATH", str(path)):
+        exporter = tracing.SpanExporter(tracing.write_to_file, batch_size=10, interval=60, max_queue=10)
+        exporter._spans = list(exported)
+        exporter.flush()
+
+    payload = json.loads(path.read_text().splitlines()[0])
+    span = payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "root"
+    assert span["attributes"] == [{"key": "http.status_code", "value": {"intValue": "200"}}]
@@ -1,35 +1,245 @@
+import argparse
+import compileall
+import fnmatch
+import json
 import os
+import py_compile
 import shutil
 import subprocess
+import sys
+import tempfile
+import time
 import zipfile
 
-def create_deployment_package():
-    # Criar diretório temporário
-    if os.path.exists('package'):
-        shutil.rmtree('package')
-    os.makedirs('package')
+# Já disponíveis no runtime Python da Lambda: não precisam ir no pacote
+RUNTIME_PROVIDED = ['boto3', 'botocore', 's3transfer', 'jmespath']
+
+# Módulos da função copiados para o pacote
+FUNCTION_MODULES = ['handler.py', 'notifications.py', 'tracing.py']
 
-    # Copiar handler.py
-    shutil.copy2('handler.py', 'package/handler.py')
+# Diretório de origem de cada artefato
+ARTIFACT_SOURCES = {'function.zip': 'package', 'layer.zip': 'layer'}
 
-    # Instalar dependências no diretório package
+# Arquivos e diretórios que não são usados em tempo de execução
+PRUNE_DIRS = ['__pycache__', 'tests', 'docs', 'examples', 'benchmarks']
+PRUNE_FILES = ['*.pyc', '*.pyo', '*.pyi', '*.c', '*.h', '*.pxd', '*.pyx', '*.md', '*.rst', 'py.typed']
+
+def install_dependencies(target):
     subprocess.check_call([
-        'pip',
+        sys.executable, '-m', 'pip',
         'install',
         '-r',
         'requirements.txt',
         '--target',
-        'package'
+        target,
+        '--no-cache-dir',
+        '--no-compile'
     ])
 
-    # Criar arquivo ZIP
-    with zipfile.ZipFile('function.zip', 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk('package'):
-            for file in files:
+def prune(target, keep_runtime_packages=False, keep_dist_info=False):
+    """Remove testes, caches, metadados e pacotes já presentes no runtime"""
+    removed = 0
+
+    for name in os.listdir(target):
+        path = os.path.join(target, name)
+        package = name.split('-')[0].lower()
+
+        if not keep_runtime_packages and package in RUNTIME_PROVIDED:
+            removed += directory_size(path)
+            remove(path)
+        elif not keep_dist_info and name.endswith(('.dist-info', '.egg-info')):
+            removed += directory_size(path)
+            remove(path)
+
+    for root, dirs, files in os.walk(target, topdown=True):
+        for directory in [d for d in dirs if d in PRUNE_DIRS]:
+            path = os.path.join(root, directory)
+            removed += directory_size(path)
+            shutil.rmtree(path)
+            dirs.remove(directory)
+
+        for file in files:
+            if any(fnmatch.fnmatch(file, pattern) for pattern in PRUNE_FILES):
+                path = os.path.join(root, file)
+                removed += os.path.getsize(path)
+                os.remove(path)
+
+    return removed
+
+def precompile(target):
+    """
+    Gera os .pyc no momento do build: o sistema de arquivos da Lambda é somente
+    leitura, então sem eles cada cold start recompila todos os módulos.
+    """
+    if sys.version_info[:2] != (3, 9):
+        print(f"Aviso: bytecode gerado com Python {sys.version_info.major}.{sys.version_info.minor}, "
+              f"mas o runtime da Lambda é python3.9", file=sys.stderr)
+
+    compileall.compile_dir(
+        target,
+        quiet=1,
+        optimize=0,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
+
+def remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, file))
+        for root, _, files in os.walk(path)
+        for file in files
+    )
+
+def create_zip(source, zip_name):
+    with zipfile.ZipFile(zip_name, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as zipf:
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for file in sorted(files):
                 file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, 'package')
+                arcname = os.path.relpath(file_path, source)
                 zipf.write(file_path, arcname)
 
+def measure_cold_start(zip_names, runs=3):
+    """
+    Simula um cold start localmente: descompacta os artefatos e importa
+    handler.process_order em um interpretador isolado, que só enxerga a
+    biblioteca padrão e os diretórios descompactados. Uma dependência
+    removida do pacote falha aqui em vez de ser importada do host.
+    Retorna o melhor tempo de descompactação e de import em milissegundos.
+    """
+    best_unzip = best_import = None
+
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as task_dir:
+            start = time.perf_counter()
+            paths = []
+            for zip_name in zip_names:
+                destination = os.path.join(task_dir, os.path.splitext(zip_name)[0])
+                with zipfile.ZipFile(zip_name) as zipf:
+                    zipf.extractall(destination)
+                paths.append(destination)
+                # Camadas são montadas em /opt/python
+                if os.path.isdir(os.path.join(destination, 'python')):
+                    paths[-1] = os.path.join(destination, 'python')
+            unzip_ms = (time.perf_counter() - start) * 1000
+
+            script = (
+                "import sys, time\n"
+                f"sys.path[:0] = {paths!r}\n"
+                "start = time.perf_counter()\n"
+                "from handler import process_order\n"
+                "print((time.perf_counter() - start) * 1000)\n"
+            )
+            # -I ignora PYTHONPATH e o site do usuário; -S não carrega o
+            # site-packages global do host
+            output = subprocess.check_output(
+                [sys.executable, '-I', '-S', '-B', '-c', script],
+                cwd=task_dir
+            )
+            import_ms = float(output.decode().strip().splitlines()[-1])
+
+        best_unzip = unzip_ms if best_unzip is None else min(best_unzip, unzip_ms)
+        best_import = import_ms if best_import is None else min(best_import, import_ms)
+
+    return best_unzip, best_import
+
+def create_deployment_package(args):
+    # Criar diretório temporário
+    for path in ['package', 'layer']:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    os.makedirs('package')
+
+    # Copiar os módulos da função
+    for module in FUNCTION_MODULES:
+        shutil.copy2(module, os.path.join('package', module))
+
+    # Com --layer as dependências vão para layer/python (montado em /opt/python)
+    dependencies_dir = os.path.join('layer', 'python') if args.layer else 'package'
+    os.makedirs(dependencies_dir, exist_ok=True)
+
+    # Instalar dependências
+    install_dependencies(dependencies_dir)
+    installed_size = directory_size(dependencies_dir)
+
+    removed = prune(dependencies_dir, args.keep_runtime_packages, args.keep_dist_info)
+
+    precompile('package')
+    if args.layer:
+        precompile(dependencies_dir)
+
+    # Criar arquivos ZIP
+    zip_names = ['function.zip', 'layer.zip'] if args.layer else ['function.zip']
+    for zip_name in zip_names:
+        create_zip(ARTIFACT_SOURCES[zip_name], zip_name)
+
+    report = {
+        'installed_bytes': installed_size,
+        'pruned_bytes': removed,
+        'artifacts': {
+            zip_name: {
+                'zip_bytes': os.path.getsize(zip_name),
+                'unzipped_bytes': directory_size(ARTIFACT_SOURCES[zip_name])
+            }
+            for zip_name in zip_names
+        }
+    }
+
+    if not args.skip_cold_start:
+        unzip_ms, import_ms = measure_cold_start(zip_names)
+        report['cold_start'] = {'unzip_ms': round(unzip_ms, 1), 'import_ms': round(import_ms, 1)}
+
+    return report
+
+def print_report(report):
+    print("\nRelatório do pacote:")
+    print(f"  Dependências instaladas: {report['installed_bytes'] / 1024 / 1024:.2f} MB")
+    print(f"  Removido pela limpeza:   {report['pruned_bytes'] / 1024 / 1024:.2f} MB")
+    for zip_name, sizes in report['artifacts'].items():
+        print(f"  {zip_name}: {sizes['zip_bytes'] / 1024 / 1024:.2f} MB compactado, "
+              f"{sizes['unzipped_bytes'] / 1024 / 1024:.2f} MB descompactado")
+    if 'cold_start' in report:
+        print(f"  Cold start local: descompactação {report['cold_start']['unzip_ms']} ms, "
+              f"import de handler.process_order {report['cold_start']['import_ms']} ms")
+
+def check_budget(report, args):
+    errors = []
+    total_zip_mb = sum(a['zip_bytes'] for a in report['artifacts'].values()) / 1024 / 1024
+    if args.max_size_mb and total_zip_mb > args.max_size_mb:
+        errors.append(f"pacote com {total_zip_mb:.2f} MB excede o limite de {args.max_size_mb} MB")
+    if args.max_import_ms and report.get('cold_start', {}).get('import_ms', 0) > args.max_import_ms:
+        errors.append(f"import de {report['cold_start']['import_ms']} ms excede o limite de {args.max_import_ms} ms")
+    return errors
+
 if __name__ == '__main__':
-    create_deployment_package()
-    print("Pacote de deployment criado com sucesso!")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Gera o pacote de deployment da Lambda')
+    parser.add_argument('--layer', action='store_true', help='Separar as dependências em layer.zip')
+    parser.add_argument('--keep-runtime-packages', action='store_true', help='Incluir boto3/botocore no pacote')
+    parser.add_argument('--keep-dist-info', action='store_true', help='Manter os metadados *.dist-info')
+    parser.add_argument('--skip-cold-start', action='store_true', help='Não medir o cold start localmente')
+    parser.add_argument('--max-size-mb', type=float, default=None, help='Falhar se os ZIPs passarem deste tamanho')
+    parser.add_argument('--max-import-ms', type=float, default=None, help='Falhar se o import passar deste tempo')
+    parser.add_argument('--json', action='store_true', help='Imprimir o relatório em JSON')
+
+    args = parser.parse_args()
+    report = create_deployment_package(args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    errors = check_budget(report, args)
+    if errors:
+        for error in errors:
+            print(f"Erro: {error}", file=sys.stderr)
+        sys.exit(1)
+
+    print("Pacote de deployment criado com sucesso!")
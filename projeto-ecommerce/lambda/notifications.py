@@ -0,0 +1,252 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Envio de notificações com transportes plugáveis, lotes por transporte,
+# concorrência limitada e retentativas com jitter. A rota de cada tipo de
+# notificação vem de NOTIFICATION_ROUTES (JSON), por exemplo:
+#   {"CUSTOMER_EMAIL": "ses:vendas@exemplo.com", "SALES_TEAM_ALERT": "https://hooks.exemplo.com/vendas"}
+# Especificações aceitas: "log", "file:/caminho.jsonl", "http(s)://..." e "ses:remetente".
+# Tipos sem rota usam NOTIFICATION_DEFAULT_TRANSPORT (padrão "log").
+
+class TransportError(Exception):
+    """sent indica quantas mensagens do lote foram entregues antes da falha"""
+
+    def __init__(self, message, sent=0):
+        super().__init__(message)
+        self.sent = sent
+
+class LogTransport:
+    """Apenas registra as mensagens no log (comportamento simulado original)"""
+    batch_size = 100
+
+    def __init__(self):
+        self.name = 'log'
+
+    def send_batch(self, messages):
+        for message in messages:
+            print(f"Notificação {message['type']} para {message['recipient']}: {message['subject']}", file=sys.stderr)
+
+class FileTransport:
+    """Acrescenta cada mensagem como uma linha JSON; útil como stub em testes locais"""
+    batch_size = 100
+    _lock = threading.Lock()
+
+    def __init__(self, path):
+        self.name = f'file:{path}'
+        self.path = path
+
+    def send_batch(self, messages):
+        lines = ''.join(json.dumps(message, default=str) + '\n' for message in messages)
+        with self._lock:
+            with open(self.path, 'a') as file:
+                file.write(lines)
+
+class HttpTransport:
+    """Webhook: um POST com o lote inteiro em JSON ({"notifications": [...]})"""
+
+    def __init__(self, url, batch_size=None, timeout=None):
+        self.name = url
+        self.url = url
+        self.batch_size = batch_size or int(os.environ.get('NOTIFICATION_HTTP_BATCH_SIZE', '25'))
+        self.timeout = timeout or float(os.environ.get('NOTIFICATION_HTTP_TIMEOUT_SECONDS', '5'))
+
+    def send_batch(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'notifications': messages}, default=str).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                if response.status >= 300:
+                    raise TransportError(f"HTTP {response.status}")
+        except TransportError:
+            raise
+        except Exception as e:
+            raise TransportError(str(e))
+
+class SesTransport:
+    """
+    E-mail via SES; boto3 já está no runtime e só é importado no primeiro envio.
+    O SES envia uma mensagem por chamada: numa falha, as já enviadas são
+    informadas para que a retentativa não as repita.
+    """
+    batch_size = 10
+
+    def __init__(self, sender):
+        self.name = f'ses:{sender}'
+        self.sender = sender
+        self._client = None
+
+    def send_batch(self, messages):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('ses')
+        for sent, message in enumerate(messages):
+            try:
+                self._client.send_email(
+                    Source=self.sender,
+                    Destination={'ToAddresses': [message['recipient']]},
+                    Message={
+                        'Subject': {'Data': message['subject']},
+                        'Body': {'Text': {'Data': message['message']}}
+                    }
+                )
+            except Exception as e:
+                raise TransportError(str(e), sent=sent)
+
+def create_transport(spec):
+    if spec == 'log':
+        return LogTransport()
+    if spec.startswith('file:'):
+        return FileTransport(spec[len('file:'):])
+    if spec.startswith(('http://', 'https://')):
+        return HttpTransport(spec)
+    if spec.startswith('ses:'):
+        return SesTransport(spec[len('ses:'):])
+    raise ValueError(f"Transporte de notificação desconhecido: {spec}")
+
+class NotificationDispatcher:
+    """
+    Agrupa as mensagens por transporte, divide em lotes de até batch_size e
+    envia os lotes em paralelo, com no máximo max_workers envios simultâneos.
+    Lotes que falham são repetidos com backoff exponencial e jitter completo,
+    reenviando só as mensagens que ainda não foram entregues.
+    """
+
+    def __init__(self, routes, default_transport, max_workers=8, max_attempts=3,
+                 base_delay=0.2, max_delay=2.0):
+        self.routes = routes
+        self.default_transport = default_transport
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def transport_for(self, message):
+        return self.routes.get(message['type'], self.default_transport)
+
+    def _send_with_retry(self, transport, batch):
+        """Devolve o resultado de cada mensagem do lote, na mesma ordem"""
+        results = []
+        pending = batch
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                transport.send_batch(pending)
+                sent = {'status': 'sent', 'attempts': attempt, 'transport': transport.name}
+                return results + [sent] * len(pending)
+            except Exception as e:
+                print(f"Falha no envio via {transport.name} (tentativa {attempt}): {str(e)}", file=sys.stderr)
+                delivered = getattr(e, 'sent', 0)
+                results += [{'status': 'sent', 'attempts': attempt, 'transport': transport.name}] * delivered
+                pending = pending[delivered:]
+                if attempt == self.max_attempts:
+                    failed = {'status': 'failed', 'attempts': attempt, 'transport': transport.name, 'error': str(e)}
+                    return results + [failed] * len(pending)
+                # Jitter completo evita que lotes que falharam juntos tentem de novo juntos
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+
+    def dispatch(self, messages):
+        """Envia as mensagens e devolve o resultado da entrega de cada uma, na mesma ordem"""
+        if not messages:
+            return []
+
+        groups = {}
+        for index, message in enumerate(messages):
+            transport = self.transport_for(message)
+            groups.setdefault(id(transport), (transport, []))[1].append(index)
+
+        jobs = []
+        for transport, indexes in groups.values():
+            for start in range(0, len(indexes), transport.batch_size):
+                chunk = indexes[start:start + transport.batch_size]
+                jobs.append((transport, chunk))
+
+        results = [None] * len(messages)
+        workers = min(self.max_workers, len(jobs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                (chunk, executor.submit(self._send_with_retry, transport, [messages[i] for i in chunk]))
+                for transport, chunk in jobs
+            ]
+            for chunk, future in futures:
+                for i, result in zip(chunk, future.result()):
+                    results[i] = result
+        return results
+
+_dispatcher = None
+
+def get_dispatcher():
+    """Criado uma vez por container e reaproveitado entre invocações"""
+    global _dispatcher
+    if _dispatcher is None:
+        transports = {}
+
+        def transport(spec):
+            if spec not in transports:
+                transports[spec] = create_transport(spec)
+            return transports[spec]
+
+        routes = json.loads(os.environ.get('NOTIFICATION_ROUTES', '{}'))
+        _dispatcher = NotificationDispatcher(
+            routes={kind: transport(spec) for kind, spec in routes.items()},
+            default_transport=transport(os.environ.get('NOTIFICATION_DEFAULT_TRANSPORT', 'log')),
+            max_workers=int(os.environ.get('NOTIFICATION_MAX_CONCURRENCY', '8')),
+            max_attempts=int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '3')),
+            base_delay=float(os.environ.get('NOTIFICATION_RETRY_BASE_SECONDS', '0.2')),
+            max_delay=float(os.environ.get('NOTIFICATION_RETRY_MAX_SECONDS', '2'))
+        )
+    return _dispatcher
+
+def critical_types():
+    return set(filter(None, os.environ.get('NOTIFICATION_CRITICAL_TYPES', 'CUSTOMER_EMAIL').split(',')))
+
+def defer(messages):
+    """
+    Entrega as mensagens não críticas em uma invocação assíncrona (Event) da
+    própria função: a resposta não espera por elas e, ao contrário de uma
+    thread solta, o envio não congela quando o container é suspenso.
+    """
+    import boto3
+
+    function_name = os.environ.get('NOTIFICATION_DEFER_FUNCTION') or os.environ['AWS_LAMBDA_FUNCTION_NAME']
+    client_options = {}
+    if os.environ.get('AWS_ENDPOINT_URL'):
+        client_options['endpoint_url'] = os.environ['AWS_ENDPOINT_URL']
+
+    boto3.client('lambda', **client_options).invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'deferred_notifications': messages}, default=str)
+    )
+
+def deliver(messages):
+    """
+    Envia as notificações e anota o resultado em cada uma (campo "delivery").
+    Com NOTIFICATION_DEFER_NON_CRITICAL=true, só as críticas são aguardadas.
+    """
+    deferred = []
+    if os.environ.get('NOTIFICATION_DEFER_NON_CRITICAL', 'false').lower() == 'true':
+        critical = critical_types()
+        deferred = [m for m in messages if m['type'] not in critical]
+        if deferred:
+            try:
+                defer(deferred)
+                for message in deferred:
+                    message['delivery'] = {'status': 'deferred'}
+            except Exception as e:
+                # Sem a invocação assíncrona, envia junto com as críticas
+                print(f"Não foi possível adiar notificações: {str(e)}", file=sys.stderr)
+                deferred = []
+
+    pending = [m for m in messages if not any(m is d for d in deferred)]
+    for message, result in zip(pending, get_dispatcher().dispatch(pending)):
+        message['delivery'] = result
+    return messages
@@ -0,0 +1,169 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import notifications
+from notifications import FileTransport, HttpTransport, NotificationDispatcher, SesTransport
+
+def message(kind, recipient='cliente@exemplo.com'):
+    return {'type': kind, 'recipient': recipient, 'subject': f'Pedido {kind}', 'message': 'Pedido recebido'}
+
+class Webhook:
+    """Servidor HTTP local que registra os lotes recebidos e responde com os status configurados"""
+
+    def __init__(self, statuses=None, delay=0):
+        self.statuses = list(statuses or [])
+        self.delay = delay
+        self.batches = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with webhook._lock:
+                    webhook.active += 1
+                    webhook.max_active = max(webhook.max_active, webhook.active)
+                    webhook.batches.append(body['notifications'])
+                    status = webhook.statuses.pop(0) if webhook.statuses else 200
+                time.sleep(webhook.delay)
+                with webhook._lock:
+                    webhook.active -= 1
+                self.send_response(status)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hook'
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def read_lines(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+def test_messages_are_batched_per_transport(tmp_path):
+    """Cada transporte recebe lotes de até batch_size com as suas mensagens"""
+    path = str(tmp_path / 'notifications.jsonl')
+    with Webhook() as webhook:
+        dispatcher = NotificationDispatcher(
+            routes={'SALES_TEAM_ALERT': HttpTransport(webhook.url, batch_size=2)},
+            default_transport=FileTransport(path),
+            base_delay=0
+        )
+        messages = [message('SALES_TEAM_ALERT', f'vendas{i}@exemplo.com') for i in range(5)] + [message('CUSTOMER_EMAIL')]
+
+        results = dispatcher.dispatch(messages)
+
+    assert sorted(len(batch) for batch in webhook.batches) == [1, 2, 2]
+    assert sorted(m['recipient'] for batch in webhook.batches for m in batch) == [f'vendas{i}@exemplo.com' for i in range(5)]
+    assert [m['type'] for m in read_lines(path)] == ['CUSTOMER_EMAIL']
+    assert [r['transport'] for r in results] == [webhook.url] * 5 + [f'file:{path}']
+    assert all(r == {'status': 'sent', 'attempts': 1, 'transport': r['transport']} for r in results)
+
+def test_concurrency_is_bounded_by_max_workers():
+    """Os lotes vão em paralelo, mas nunca mais que max_workers ao mesmo tempo"""
+    with Webhook(delay=0.1) as webhook:
+        dispatcher = NotificationDispatcher(
+            routes={}, default_transport=HttpTransport(webhook.url, batch_size=1), max_workers=2, base_delay=0
+        )
+        start = time.perf_counter()
+        dispatcher.dispatch([message('SALES_TEAM_ALERT') for _ in range(6)])
+        elapsed = time.perf_counter() - start
+
+    assert len(webhook.batches) == 6
+    assert webhook.max_active == 2
+    # Seis lotes de 0,1s em duas filas: cerca de 0,3s, não 0,6s
+    assert elapsed < 0.55
+
+def test_failed_batch_is_retried_then_reported():
+    """Um 500 é repetido; após max_attempts a falha fica no resultado de cada mensagem do lote"""
+    with Webhook(statuses=[500, 200]) as recovering:
+        dispatcher = NotificationDispatcher(
+            routes={}, default_transport=HttpTransport(recovering.url, batch_size=10), base_delay=0
+        )
+        assert dispatcher.dispatch([message('SALES_TEAM_ALERT')]) == [
+            {'status': 'sent', 'attempts': 2, 'transport': recovering.url}
+        ]
+
+    with Webhook(statuses=[500] * 3) as failing:
+        dispatcher = NotificationDispatcher(
+            routes={}, default_transport=HttpTransport(failing.url, batch_size=10), max_attempts=3, base_delay=0
+        )
+        results = dispatcher.dispatch([message('SALES_TEAM_ALERT'), message('SALES_TEAM_ALERT')])
+
+    assert len(failing.batches) == 3
+    assert [r['status'] for r in results] == ['failed', 'failed']
+    assert all(r['attempts'] == 3 and 'error' in r for r in results)
+
+def test_ses_retry_does_not_resend_delivered_messages():
+    """Numa falha no meio do lote, só as mensagens ainda não enviadas são repetidas"""
+    transport = SesTransport('vendas@exemplo.com')
+    transport._client = MagicMock()
+    sent = []
+    failures = [RuntimeError('Throttling')]
+
+    def send_email(Destination, **kwargs):
+        recipient = Destination['ToAddresses'][0]
+        if recipient == 'b@exemplo.com' and failures:
+            raise failures.pop()
+        sent.append(recipient)
+
+    transport._client.send_email.side_effect = send_email
+    dispatcher = NotificationDispatcher(routes={}, default_transport=transport, base_delay=0)
+
+    results = dispatcher.dispatch([message('CUSTOMER_EMAIL', f'{r}@exemplo.com') for r in 'abc'])
+
+    assert sent == ['a@exemplo.com', 'b@exemplo.com', 'c@exemplo.com']
+    assert [r['attempts'] for r in results] == [1, 2, 2]
+    assert all(r['status'] == 'sent' for r in results)
+
+@pytest.fixture
+def defer_enabled(tmp_path, monkeypatch):
+    """Adiamento ligado e o dispatcher gravando as mensagens aguardadas num arquivo"""
+    path = str(tmp_path / 'notifications.jsonl')
+    monkeypatch.setenv('NOTIFICATION_DEFER_NON_CRITICAL', 'true')
+    monkeypatch.setenv('NOTIFICATION_CRITICAL_TYPES', 'CUSTOMER_EMAIL')
+    monkeypatch.setattr(notifications, '_dispatcher', NotificationDispatcher(
+        routes={}, default_transport=FileTransport(path), base_delay=0
+    ))
+    return path
+
+def test_non_critical_messages_are_deferred(defer_enabled):
+    """Só as críticas são enviadas na hora; as demais vão numa única invocação assíncrona"""
+    messages = [message('CUSTOMER_EMAIL'), message('SALES_TEAM_ALERT'), message('INVENTORY_UPDATE')]
+
+    with patch.object(notifications, 'defer') as defer:
+        notifications.deliver(messages)
+
+    defer.assert_called_once_with(messages[1:])
+    assert [m['delivery']['status'] for m in messages] == ['sent', 'deferred', 'deferred']
+    assert [m['type'] for m in read_lines(defer_enabled)] == ['CUSTOMER_EMAIL']
+
+def test_defer_failure_sends_everything_now(defer_enabled):
+    """Se a invocação assíncrona falhar, todas as mensagens são enviadas na hora"""
+    messages = [message('CUSTOMER_EMAIL'), message('SALES_TEAM_ALERT')]
+
+    with patch.object(notifications, 'defer', side_effect=RuntimeError('lambda indisponível')):
+        notifications.deliver(messages)
+
+    assert [m['delivery']['status'] for m in messages] == ['sent', 'sent']
+    assert [m['type'] for m in read_lines(defer_enabled)] == ['CUSTOMER_EMAIL', 'SALES_TEAM_ALERT']
@@ -0,0 +1,185 @@
+import json
+import os
+import random
+import re
+import sys
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+
+# Continuação na Lambda do trace iniciado pela API: o traceparent chega em
+# event['trace_context'] e os spans (handler, etapas e comandos Mongo) são
+# exportados como OTLP/JSON ao fim da invocação, já que a Lambda é congelada
+# entre chamadas e não pode manter uma thread de exportação.
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+
+TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+def tracing_enabled():
+    return os.environ.get('TRACING_ENABLED', 'false').lower() == 'true'
+
+class Span:
+    def __init__(self, name, kind, parent, attributes):
+        if parent is not None:
+            self.trace_id = parent['trace_id']
+            self.parent_id = parent['span_id']
+            self.sampled = parent['sampled']
+        else:
+            self.trace_id = os.urandom(16).hex()
+            self.parent_id = None
+            self.sampled = tracing_enabled() and random.random() < float(os.environ.get('TRACING_SAMPLE_RATE', '0.1'))
+        self.span_id = os.urandom(8).hex()
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.status = 0
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def context(self):
+        return {'trace_id': self.trace_id, 'span_id': self.span_id, 'sampled': self.sampled}
+
+    def record_error(self, error):
+        self.status = STATUS_ERROR
+        self.status_message = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self.sampled:
+            _finished.append(self)
+
+_current = ContextVar('current_span', default=None)
+_finished = []
+
+def extract(event):
+    """Pai remoto a partir de event['trace_context']['traceparent']"""
+    traceparent = (event.get('trace_context') or {}).get('traceparent', '')
+    match = TRACEPARENT_PATTERN.match(traceparent.strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return {'trace_id': trace_id, 'span_id': span_id, 'sampled': bool(int(flags, 16) & 1)}
+
+@contextmanager
+def start_span(name, kind=KIND_INTERNAL, parent=None, attributes=None):
+    current = _current.get()
+    span = Span(name, kind, parent or (current.context() if current else None), attributes or {})
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as error:
+        span.record_error(error)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def otlp_payload(spans):
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{
+                'key': 'service.name',
+                'value': {'stringValue': os.environ.get('TRACING_SERVICE_NAME', 'hub-xp-orders-lambda')}
+            }]},
+            'scopeSpans': [{
+                'scope': {'name': 'tracing'},
+                'spans': [
+                    {
+                        'traceId': span.trace_id,
+                        'spanId': span.span_id,
+                        **({'parentSpanId': span.parent_id} if span.parent_id else {}),
+                        'name': span.name,
+                        'kind': span.kind,
+                        'startTimeUnixNano': str(span.start_ns),
+                        'endTimeUnixNano': str(span.end_ns),
+                        'attributes': [
+                            {'key': key, 'value': _attribute_value(value)}
+                            for key, value in span.attributes.items() if value is not None
+                        ],
+                        'status': {'code': span.status, **({'message': span.status_message} if span.status_message else {})}
+                    }
+                    for span in spans
+                ]
+            }]
+        }]
+    }
+
+def flush():
+    """Exporta os spans da invocação; falhas de exportação não afetam a resposta"""
+    if not _finished:
+        return
+    spans = _finished[:]
+    del _finished[:]
+    body = json.dumps(otlp_payload(spans))
+
+    try:
+        if os.environ.get('TRACING_EXPORTER', 'file') == 'otlp':
+            request = urllib.request.Request(
+                os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'),
+                data=body.encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            with urllib.request.urlopen(request, timeout=float(os.environ.get('TRACING_EXPORT_TIMEOUT_SECONDS', '2'))):
+                pass
+        else:
+            # /tmp é o único diretório gravável da Lambda
+            with open(os.environ.get('TRACING_FILE_PATH', '/tmp/traces.jsonl'), 'a', encoding='utf-8') as output:
+                output.write(body + '\n')
+    except Exception as e:
+        print(f"Erro ao exportar spans: {str(e)}", file=sys.stderr)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Um span por comando Mongo, filho do span atual"""
+
+    def __init__(self):
+        self._spans = {}
+
+    def started(self, event):
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            return
+        collection = event.command.get(event.command_name)
+        self._spans[(event.connection_id, event.request_id)] = Span(
+            f"mongo.{event.command_name}",
+            KIND_CLIENT,
+            parent.context(),
+            {
+                'db.system': 'mongodb',
+                'db.name': event.database_name,
+                'db.operation': event.command_name,
+                'db.mongodb.collection': collection if isinstance(collection, str) else None
+            }
+        )
+
+    def succeeded(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.end()
+
+    def failed(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.record_error(str(event.failure.get('errmsg', event.failure)))
+            span.end()
+
+mongo_listener = MongoCommandListener()
+
+def mongo_event_listeners():
+    return [mongo_listener] if tracing_enabled() else []